@@ -21,13 +21,37 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import json
+import threading
+import time
 from sqlalchemy import create_engine
+from snowflake_pool import is_session_error, pool_from_env
 import warnings
 warnings.filterwarnings('ignore')
 
 # Load environment variables from .env file
 load_dotenv()
 
+PRODUCT_COLUMNS = ['Barcode', 'ProductID', 'ProductName', 'LotNumber', 'Quantity', 'Exp_Date']
+
+# Bulk writes: executemany in batches of BULK_BATCH_ROWS; from BULK_STAGE_MIN_ROWS rows
+# on, Parquet files are staged and loaded with COPY INTO (write_pandas)
+BULK_BATCH_ROWS = int(os.getenv('SNOWFLAKE_BULK_BATCH_ROWS', '1000'))
+BULK_STAGE_MIN_ROWS = int(os.getenv('SNOWFLAKE_BULK_STAGE_MIN_ROWS', '10000'))
+BULK_STAGE_BATCH_ROWS = int(os.getenv('SNOWFLAKE_BULK_STAGE_BATCH_ROWS', '100000'))
+
+# Distinct barcodes per IN list in search_barcodes
+BARCODE_LOOKUP_CHUNK = int(os.getenv('SNOWFLAKE_BARCODE_CHUNK', '1000'))
+
+# write_pandas needs pyarrow; without it the connector fails at call time with one of these
+MISSING_DEPENDENCY_MARKERS = ("pyarrow", "optional dependency")
+
+
+def is_missing_dependency(error):
+    """True for write_pandas errors caused by a missing optional dependency (pyarrow)"""
+    if isinstance(error, ImportError) or type(error).__name__ == 'MissingDependencyError':
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in MISSING_DEPENDENCY_MARKERS)
 
 
 class SnowflakeConnection:
@@ -35,8 +59,11 @@ class SnowflakeConnection:
     Snowflake connection manager using .env configuration
     """
     
-    def __init__(self):
-        """Initialize with credentials from .env file"""
+    def __init__(self, barcode_cache=None):
+        """
+        Initialize with credentials from .env file
+        barcode_cache: optional BarcodeCache in front of check_barcode_exists
+        """
         self.config = {
             'account': os.getenv('SNOWFLAKE_ACCOUNT'),
             'user': os.getenv('SNOWFLAKE_USER'),
@@ -46,9 +73,11 @@ class SnowflakeConnection:
             'schema': os.getenv('SNOWFLAKE_SCHEMA', 'PUBLIC')
         }
         
-        self.connection = None
-        self.cursor = None
+        # Each query checks out its own connection and cursor (see snowflake_pool)
+        self.pool = None
         self.engine = None
+        self._connect_lock = threading.Lock()
+        self.barcode_cache = barcode_cache
         
         # Validate configuration
         self._validate_config()
@@ -73,9 +102,12 @@ class SnowflakeConnection:
         try:
             print("\n🔌 Connecting to Snowflake...")
             
-            # Create main connection
-            self.connection = snowflake.connector.connect(**self.config)
-            self.cursor = self.connection.cursor()
+            # Create the connection pool and open its first connections
+            if self.pool is not None:
+                self.pool.close()
+            pool = pool_from_env(lambda: snowflake.connector.connect(**self.config))
+            pool.prefill()
+            self.pool = pool
             
             # Create SQLAlchemy engine for pandas operations
             connection_string = (f"snowflake://{self.config['user']}:{self.config['password']}"
@@ -84,7 +116,7 @@ class SnowflakeConnection:
             
             self.engine = create_engine(connection_string)
             
-            print("✅ Successfully connected to Snowflake!")
+            print(f"✅ Successfully connected to Snowflake! (pool of {pool.min_size}-{pool.max_size} connections)")
             return True
             
         except Exception as e:
@@ -94,70 +126,179 @@ class SnowflakeConnection:
     def disconnect(self):
         """Close all connections"""
         try:
-            if self.cursor:
-                self.cursor.close()
-            if self.connection:
-                self.connection.close()
+            if self.pool:
+                self.pool.close()
+                self.pool = None
             if self.engine:
                 self.engine.dispose()
             print("🔌 Disconnected from Snowflake")
         except Exception as e:
             print(f"⚠️  Error during disconnect: {e}")
     
-    def execute_query(self, sql, fetch=True, params=None):
+    def execute_query(self, sql, fetch=True, params=None, timeout=None):
         """
-        Execute SQL query with optional parameters and auto-reconnect
+        Execute SQL query with optional parameters on a pooled connection
         
         Args:
             sql: SQL query string
             fetch: Whether to fetch results
             params: Optional parameters for the query
+            timeout: Optional statement timeout in seconds; the connector cancels
+                the query in Snowflake when it runs longer
             
         Returns:
             Query results if fetch=True, None otherwise
         """
+        if not self._ensure_connected():
+            return None
         try:
-            if params:
-                self.cursor.execute(sql, params)
-            else:
-                self.cursor.execute(sql)
-            
-            if fetch:
-                results = self.cursor.fetchall()
-                return results
-            else:
-                return None
-                
+            return self._run_query(sql, fetch, params, timeout)
         except Exception as e:
-            error_message = str(e)
-            # Check if it's an authentication/token expiration error
-            if "390114" in error_message or "Authentication token has expired" in error_message or "Invalid access token" in error_message:
-                print("⚠️  Snowflake token expired. Reconnecting...")
-                self.disconnect()
-                if self.connect():
-                    print("✅ Reconnected successfully. Retrying query...")
-                    # Retry the query once after reconnection
-                    try:
-                        if params:
-                            self.cursor.execute(sql, params)
-                        else:
-                            self.cursor.execute(sql)
-                        
-                        if fetch:
-                            results = self.cursor.fetchall()
-                            return results
-                        else:
-                            return None
-                    except Exception as retry_error:
-                        print(f"❌ Query failed after reconnection: {retry_error}")
-                        return None
-                else:
-                    print("❌ Failed to reconnect to Snowflake")
+            # The pool already discarded the connection of an expired session: retry once on a fresh one
+            if is_session_error(e):
+                print("⚠️  Snowflake session expired. Retrying on a new connection...")
+                try:
+                    return self._run_query(sql, fetch, params, timeout)
+                except Exception as retry_error:
+                    print(f"❌ Query failed after reconnection: {retry_error}")
                     return None
+            print(f"❌ Query execution failed: {e}")
+            print(f"   SQL: {sql[:100]}...")
+            return None
+    
+    def _ensure_connected(self):
+        """Connect on first use; False when Snowflake is unreachable"""
+        if self.pool is None:
+            with self._connect_lock:
+                if self.pool is None and not self.connect():
+                    return False
+        return True
+    
+    def _run_query(self, sql, fetch, params, timeout=None):
+        options = {'timeout': timeout} if timeout else {}
+        with self.pool.cursor() as cursor:
+            if params:
+                cursor.execute(sql, params, **options)
             else:
-                print(f"❌ Query execution failed: {e}")
-                print(f"   SQL: {sql[:100]}...")
-                return None
+                cursor.execute(sql, **options)
+            return cursor.fetchall() if fetch else None
+    
+    def bulk_insert(self, table_name, columns, rows, timeout=None):
+        """
+        Insert many rows with few round trips
+        
+        Fewer than BULK_STAGE_MIN_ROWS rows go through executemany in batches of
+        BULK_BATCH_ROWS (the connector sends each batch as one multi-row INSERT);
+        larger inputs are written as Parquet, staged and loaded with COPY INTO
+        (write_pandas) in batches of BULK_STAGE_BATCH_ROWS. Every batch is one
+        statement: a failed batch inserts nothing and does not stop the others.
+        When write_pandas is missing or fails for lack of pyarrow, the remaining
+        rows go through executemany instead.
+        
+        Args:
+            table_name: Target table
+            columns: Column names, in the order of the values of every row
+            rows: List of tuples
+            timeout: Optional statement timeout in seconds for every executemany batch
+        
+        Returns:
+            dict: {
+                'table', 'method': 'executemany' or 'write_pandas' (the last one used),
+                'rows', 'inserted', 'failed': row counts,
+                'batches': int,
+                'failed_batches': list of {'batch', 'first_row', 'rows', 'error'},
+                'elapsed_s', 'rows_per_s'
+            }
+        """
+        table = table_name.upper()
+        rows = [tuple(row) for row in rows]
+        start = time.perf_counter()
+        
+        method, batch_size = 'executemany', BULK_BATCH_ROWS
+        if len(rows) >= BULK_STAGE_MIN_ROWS:
+            try:
+                from snowflake.connector.pandas_tools import write_pandas
+                method, batch_size = 'write_pandas', BULK_STAGE_BATCH_ROWS
+            except ImportError:
+                print("⚠️  write_pandas unavailable (snowflake-connector-python[pandas]), using executemany")
+        
+        insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        def insert_batch(batch):
+            return self._insert_batch(insert_sql, batch, timeout)
+        if method == 'write_pandas':
+            def write_batch(batch):
+                return self._stage_batch(write_pandas, table, columns, batch)
+        else:
+            write_batch = insert_batch
+        
+        connected = bool(rows) and self._ensure_connected()
+        inserted = 0
+        failed_batches = []
+        number = first = 0
+        while first < len(rows):
+            batch = rows[first:first + batch_size]
+            try:
+                if not connected:
+                    raise ConnectionError("Not connected to Snowflake")
+                try:
+                    inserted += write_batch(batch)
+                except Exception as e:
+                    # The pool already discarded the connection of an expired session: retry once on a fresh one
+                    if not is_session_error(e):
+                        raise
+                    print("⚠️  Snowflake session expired. Retrying batch on a new connection...")
+                    inserted += write_batch(batch)
+            except Exception as e:
+                if method == 'write_pandas' and is_missing_dependency(e):
+                    # Nothing of this batch was staged: send it and the rest through executemany
+                    print(f"⚠️  write_pandas unavailable ({e}), using executemany")
+                    method, batch_size, write_batch = 'executemany', BULK_BATCH_ROWS, insert_batch
+                    continue
+                print(f"❌ Batch {number} ({len(batch)} rows from row {first}) into {table} failed: {e}")
+                failed_batches.append({'batch': number, 'first_row': first, 'rows': len(batch), 'error': str(e)})
+            number += 1
+            first += len(batch)
+        
+        elapsed = time.perf_counter() - start
+        failed = sum(batch['rows'] for batch in failed_batches)
+        report = {
+            'table': table,
+            'method': method,
+            'rows': len(rows),
+            'inserted': inserted,
+            'failed': failed,
+            'batches': number,
+            'failed_batches': failed_batches,
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_s': round(inserted / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        status = "✅" if not failed_batches else "⚠️ "
+        print(f"{status} Inserted {inserted}/{len(rows)} row(s) into {table} via {method} "
+              f"({number} batch(es), {report['rows_per_s']} rows/s)")
+        return report
+    
+    def _insert_batch(self, insert_sql, batch, timeout=None):
+        options = {'timeout': timeout} if timeout else {}
+        with self.pool.cursor() as cursor:
+            cursor.executemany(insert_sql, batch, **options)
+            rowcount = cursor.rowcount
+        return rowcount if rowcount is not None and rowcount >= 0 else len(batch)
+    
+    def _stage_batch(self, write_pandas, table, columns, batch):
+        df = pd.DataFrame(batch, columns=columns)
+        with self.pool.connection() as connection:
+            success, _, nrows, _ = write_pandas(connection, df, table, quote_identifiers=False)
+        if not success:
+            raise RuntimeError(f"COPY INTO {table} did not load the staged batch")
+        return nrows
+    
+    def _invalidate_barcodes(self, barcodes):
+        if self.barcode_cache is not None:
+            self.barcode_cache.invalidate([str(barcode) for barcode in barcodes])
+    
+    def pool_stats(self):
+        """Connection pool metrics (None before connect)"""
+        return self.pool.stats() if self.pool is not None else None
     
     def query_to_dataframe(self, sql):
         """Execute query and return as pandas DataFrame"""
@@ -184,7 +325,7 @@ class SnowflakeConnection:
             print(f"❌ Upload failed: {e}")
             return False
     
-    def add_product_data(self, product_data):
+    def add_product_data(self, product_data, timeout=None):
         """
         Add new product data to the PRODUCT_DATA table
         
@@ -194,9 +335,10 @@ class SnowflakeConnection:
                 - List of tuples: [(barcode1, product_id1, ...), (barcode2, product_id2, ...)]
                 - Dictionary: {'barcode': '...', 'product_id': '...', etc.}
                 - List of dictionaries: [{'barcode': '...', 'product_id': '...'}, {...}]
+            timeout: Optional statement timeout in seconds for every insert batch
         
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if every row was inserted, False otherwise (see bulk_insert)
         """
         try:
             # Handle different input formats
@@ -225,22 +367,12 @@ class SnowflakeConnection:
                 # Single tuple
                 data_tuples = [product_data]
             
-            # Insert SQL
-            insert_sql = """
-            INSERT INTO PRODUCT_DATA (
-                Barcode, ProductID, ProductName, LotNumber, Quantity, Exp_Date
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            
-            # Execute insertions
-            success_count = 0
-            for data_tuple in data_tuples:
-                result = self.execute_query(insert_sql, fetch=False, params=data_tuple)
-                if result is not None or True:  # execute_query returns None for non-fetch operations
-                    success_count += 1
-            
-            print(f"✅ Successfully added {success_count} product record(s) to PRODUCT_DATA")
-            return True
+            try:
+                report = self.bulk_insert('PRODUCT_DATA', PRODUCT_COLUMNS, data_tuples, timeout=timeout)
+            finally:
+                # Failed batches may still have been written: drop every barcode
+                self._invalidate_barcodes(data_tuple[0] for data_tuple in data_tuples)
+            return not report['failed_batches']
             
         except Exception as e:
             print(f"❌ Failed to add product data: {e}")
@@ -256,7 +388,7 @@ class SnowflakeConnection:
             columns (list): Column names (required if using tuples)
         
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if every row was inserted, False otherwise (see bulk_insert)
         """
         try:
             # Handle different input formats
@@ -276,34 +408,28 @@ class SnowflakeConnection:
                     raise ValueError("Column names must be provided when using tuple format")
                 data_tuples = [data]
             
-            # Build INSERT SQL
-            columns_str = ', '.join(columns)
-            placeholders = ', '.join(['%s'] * len(columns))
-            insert_sql = f"""
-            INSERT INTO {table_name.upper()} ({columns_str})
-            VALUES ({placeholders})
-            """
-            
-            # Execute insertions
-            success_count = 0
-            for data_tuple in data_tuples:
-                result = self.execute_query(insert_sql, fetch=False, params=data_tuple)
-                if result is not None or True:
-                    success_count += 1
-            
-            print(f"✅ Successfully added {success_count} record(s) to {table_name.upper()}")
-            return True
+            try:
+                report = self.bulk_insert(table_name, columns, data_tuples)
+            finally:
+                upper_columns = [column.upper() for column in columns]
+                if table_name.upper() == 'PRODUCT_DATA' and 'BARCODE' in upper_columns:
+                    barcode_index = upper_columns.index('BARCODE')
+                    self._invalidate_barcodes(data_tuple[barcode_index] for data_tuple in data_tuples)
+            return not report['failed_batches']
             
         except Exception as e:
             print(f"❌ Failed to add data to {table_name}: {e}")
             return False
     
-    def check_barcode_exists(self, barcode):
+    def check_barcode_exists(self, barcode, timeout=None, use_cache=True):
         """
         Check if a barcode already exists in the PRODUCT_DATA table
         
         Args:
             barcode (str): The barcode to search for
+            timeout: Optional statement timeout in seconds
+            use_cache: Answer from barcode_cache when it holds the barcode; results
+                read from the database are stored in it either way
         
         Returns:
             dict: {
@@ -312,6 +438,13 @@ class SnowflakeConnection:
                 'count': int
             }
         """
+        cache = self.barcode_cache
+        if cache is not None and use_cache:
+            cached = cache.get(barcode)
+            if cached is not None:
+                return cached
+        generation = cache.generation if cache is not None else None
+        
         try:
             # Query to check if barcode exists and get product info
             search_query = """
@@ -327,7 +460,7 @@ class SnowflakeConnection:
             WHERE Barcode = %s
             """
             
-            result = self.execute_query(search_query, fetch=True, params=(barcode,))
+            result = self.execute_query(search_query, fetch=True, params=(barcode,), timeout=timeout)
             
             if result and len(result) > 0:
                 # Barcode exists - return product information
@@ -348,7 +481,7 @@ class SnowflakeConnection:
                 print(f"   Quantity: {product_info['quantity']}")
                 print(f"   Expires in: {product_info['days_until_expiration']} days")
                 
-                return {
+                response = {
                     'exists': True,
                     'product_info': product_info,
                     'count': len(result)
@@ -356,11 +489,16 @@ class SnowflakeConnection:
             else:
                 # Barcode doesn't exist
                 print(f"❌ Barcode {barcode} not found in database")
-                return {
+                response = {
                     'exists': False,
                     'product_info': None,
                     'count': 0
                 }
+            
+            # A failed query (None) is reported as not found but never cached
+            if cache is not None and result is not None:
+                cache.put(barcode, response, generation)
+            return response
                 
         except Exception as e:
             print(f"❌ Error checking barcode {barcode}: {e}")
@@ -370,48 +508,75 @@ class SnowflakeConnection:
                 'count': 0
             }
     
-    def search_barcodes(self, barcodes):
+    def search_barcodes(self, barcodes, timeout=None):
         """
         Search for multiple barcodes at once
         
+        All barcodes are resolved with one query per BARCODE_LOOKUP_CHUNK distinct
+        barcodes (an IN list of binds) instead of one query per barcode.
+        
         Args:
             barcodes (list): List of barcodes to search for
+            timeout: Optional statement timeout in seconds for every chunk query
         
         Returns:
             dict: {
-                'found': list of product info dicts,
+                'found': list of product info dicts, in input order,
                 'not_found': list of barcodes not found,
                 'summary': dict with counts
             }
+            None if a lookup query failed
         """
         try:
             if isinstance(barcodes, str):
                 barcodes = [barcodes]
             
-            found_products = []
-            not_found_barcodes = []
-            
             print(f"\n🔍 Searching for {len(barcodes)} barcode(s)...")
             
-            for barcode in barcodes:
-                result = self.check_barcode_exists(barcode)
-                if result['exists']:
-                    found_products.append(result['product_info'])
-                else:
-                    not_found_barcodes.append(barcode)
+            # Each distinct barcode is looked up once; a barcode stored with several
+            # lots keeps its first row, as check_barcode_exists does
+            distinct = list(dict.fromkeys(barcodes))
+            products = {}
+            for first in range(0, len(distinct), BARCODE_LOOKUP_CHUNK):
+                chunk = distinct[first:first + BARCODE_LOOKUP_CHUNK]
+                search_query = f"""
+                SELECT 
+                    Barcode,
+                    ProductID,
+                    ProductName,
+                    LotNumber,
+                    Quantity,
+                    Exp_Date,
+                    DATEDIFF('day', CURRENT_DATE(), Exp_Date) as days_until_expiration
+                FROM PRODUCT_DATA 
+                WHERE Barcode IN ({', '.join(['%s'] * len(chunk))})
+                """
+                result = self.execute_query(search_query, fetch=True, params=tuple(chunk), timeout=timeout)
+                if result is None:
+                    return None
+                for row in result:
+                    products.setdefault(row[0], {
+                        'barcode': row[0],
+                        'product_id': row[1],
+                        'product_name': row[2],
+                        'lot_number': row[3],
+                        'quantity': row[4],
+                        'exp_date': row[5],
+                        'days_until_expiration': row[6]
+                    })
+            
+            found_products = [products[barcode] for barcode in barcodes if barcode in products]
+            not_found_barcodes = [barcode for barcode in barcodes if barcode not in products]
             
             summary = {
                 'total_searched': len(barcodes),
                 'found_count': len(found_products),
                 'not_found_count': len(not_found_barcodes),
-                'success_rate': round((len(found_products) / len(barcodes)) * 100, 2)
+                'success_rate': round((len(found_products) / len(barcodes)) * 100, 2) if barcodes else 0
             }
             
-            print(f"\n📊 Search Summary:")
-            print(f"   Total searched: {summary['total_searched']}")
-            print(f"   Found: {summary['found_count']}")
-            print(f"   Not found: {summary['not_found_count']}")
-            print(f"   Success rate: {summary['success_rate']}%")
+            print(f"📊 Search Summary: {summary['found_count']} found, {summary['not_found_count']} not found "
+                  f"({summary['success_rate']}%)")
             
             return {
                 'found': found_products,
@@ -421,11 +586,7 @@ class SnowflakeConnection:
             
         except Exception as e:
             print(f"❌ Error in batch barcode search: {e}")
-            return {
-                'found': [],
-                'not_found': barcodes,
-                'summary': {'total_searched': len(barcodes), 'found_count': 0, 'not_found_count': len(barcodes), 'success_rate': 0}
-            }
+            return None
     
     def update_existing_product(self, barcode, **kwargs):
         """
@@ -449,8 +610,8 @@ class SnowflakeConnection:
             }
         """
         try:
-            # First check if the product exists
-            check_result = self.check_barcode_exists(barcode)
+            # First check if the product exists (fresh row: the old values are reported)
+            check_result = self.check_barcode_exists(barcode, use_cache=False)
             if not check_result['exists']:
                 print(f"❌ Cannot update: Barcode {barcode} not found in database")
                 return {
@@ -509,9 +670,10 @@ class SnowflakeConnection:
             
             # Execute the update
             result = self.execute_query(update_sql, fetch=False, params=update_values)
+            self._invalidate_barcodes([barcode])
             
             # Verify the update was successful
-            new_check = self.check_barcode_exists(barcode)
+            new_check = self.check_barcode_exists(barcode, use_cache=False)
             if new_check['exists']:
                 new_product = new_check['product_info']
                 
@@ -574,8 +736,8 @@ class SnowflakeConnection:
             dict: Update result with old and new quantities
         """
         try:
-            # Check if product exists
-            check_result = self.check_barcode_exists(barcode)
+            # Check if product exists (fresh row: the new quantity may depend on it)
+            check_result = self.check_barcode_exists(barcode, use_cache=False)
             if not check_result['exists']:
                 print(f"❌ Cannot update quantity: Barcode {barcode} not found")
                 return {'success': False, 'error': 'Product not found'}
@@ -832,6 +994,8 @@ def demonstrate_barcode_search(sf):
     ]
     
     batch_result = sf.search_barcodes(search_barcodes)
+    if batch_result is None:
+        batch_result = {'found': [], 'not_found': search_barcodes}
     
     # Display found products
     if batch_result['found']:
@@ -1,30 +1,72 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
+from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
+import logging
 import warnings
 import joblib
 import pickle
 import os
 warnings.filterwarnings('ignore')
 
-class AirlineConsumptionPredictor:
-    def __init__(self, csv_file_path):
+try:
+    from .category_encoding import compile_encoding_tables
+    from .consumption_predictor import ConsumptionPredictor
+    from .feature_cache import DEFAULT_CACHE_DIR, PREPROCESSING_CONFIG, FeatureCache, cache_key
+    from . import model_bundle
+    from .segment_models import (DEFAULT_MIN_SEGMENT_ROWS, DEFAULT_SEGMENT_ESTIMATORS, SEGMENT_FEATURES,
+                                 SEGMENTS_DIRNAME, fit_segment_models, save_segments)
+    from .tuning import DEFAULT_LEADERBOARD, successive_halving
+except ImportError:
+    from category_encoding import compile_encoding_tables
+    from consumption_predictor import ConsumptionPredictor
+    from feature_cache import DEFAULT_CACHE_DIR, PREPROCESSING_CONFIG, FeatureCache, cache_key
+    import model_bundle
+    from segment_models import (DEFAULT_MIN_SEGMENT_ROWS, DEFAULT_SEGMENT_ESTIMATORS, SEGMENT_FEATURES,
+                                SEGMENTS_DIRNAME, fit_segment_models, save_segments)
+    from tuning import DEFAULT_LEADERBOARD, successive_halving
+
+# Plots are written to files (headless); see _plotting()
+DEFAULT_PLOT_DIR = "model_plots"
+
+
+def _plotting():
+    """
+    Import matplotlib (Agg backend, no display needed) and seaborn on first use,
+    so loading this module for training or prediction does not pay for them
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+def _save_figure(plt, output_dir, filename):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, filename)
+    plt.savefig(path, dpi=100, bbox_inches='tight')
+    plt.close()
+    print(f"   - Figure saved to {path}")
+    return path
+
+
+class AirlineConsumptionPredictor(ConsumptionPredictor):
+    def __init__(self, csv_file_path=None, unknown_policy='null', engine='auto'):
         """
         Initialize the predictor with the dataset path
+        unknown_policy: how predictions treat unseen categories ('null', 'raise' or 'zero')
+        engine: inference engine, one of consumption_predictor.ENGINES
         """
+        super().__init__(unknown_policy=unknown_policy, engine=engine)
         self.csv_file_path = csv_file_path
         self.df = None
         self.df_processed = None
-        self.label_encoders = {}
+        self.df_final = None
         self.scaler = StandardScaler()
-        self.model = None
-        self.feature_importance = None
         
     def load_and_explore_data(self):
         """
@@ -57,55 +99,13 @@ class AirlineConsumptionPredictor:
         print("STARTING DATA PREPROCESSING")
         print("="*50)
         
-        # Create a copy for processing
-        self.df_processed = self.df.copy()
-        
-        # 1. Handle missing values and data cleaning
-        print("\n1. Data Cleaning...")
-        
-        # Remove rows with zero consumption (not meaningful for prediction)
-        initial_rows = len(self.df_processed)
-        self.df_processed = self.df_processed[self.df_processed['Quantity_Consumed'] > 0]
-        print(f"   - Removed {initial_rows - len(self.df_processed)} rows with zero consumption")
-        
-        # Clean crew feedback (remove problematic entries if needed)
-        problematic_feedback = ['drawer incomplete', 'ran out early', 'low demand']
-        clean_data = self.df_processed[~self.df_processed['Crew_Feedback'].isin(problematic_feedback)]
-        problematic_data = self.df_processed[self.df_processed['Crew_Feedback'].isin(problematic_feedback)]
-        
-        print(f"   - Found {len(problematic_data)} rows with operational issues")
-        print(f"   - Keeping all data for analysis (can be filtered later)")
-        
-        # 2. Feature Engineering
-        print("\n2. Feature Engineering...")
-        
-        # Add consumption efficiency metrics
-        self.df_processed['Consumption_Rate'] = (
-            self.df_processed['Quantity_Consumed'] / 
-            self.df_processed['Standard_Specification_Qty']
-        )
-        
-        self.df_processed['Return_Rate'] = (
-            self.df_processed['Quantity_Returned'] / 
-            self.df_processed['Standard_Specification_Qty']
-        )
-        
-        # Add per-passenger consumption
-        self.df_processed['Consumption_Per_Passenger'] = (
-            self.df_processed['Quantity_Consumed'] / 
-            self.df_processed['Passenger_Count']
-        )
-        
-        # Add binary features for operational issues
-        self.df_processed['Has_Issues'] = self.df_processed['Crew_Feedback'].isin(problematic_feedback).astype(int)
-        
-        print(f"   - Added consumption rate, return rate, and per-passenger metrics")
-        print(f"   - Will use actual Product Names instead of categories")
+        # Steps 1-2: cleaning and feature engineering
+        self.df_processed = self._clean_and_derive(self.df)
         
         # 3. Encode categorical variables
         print("\n3. Encoding Categorical Variables...")
         
-        categorical_features = ['Origin', 'Flight_Type', 'Service_Type', 'Product_Name']
+        categorical_features = PREPROCESSING_CONFIG['categorical_features']
         
         for feature in categorical_features:
             le = LabelEncoder()
@@ -113,17 +113,16 @@ class AirlineConsumptionPredictor:
             self.label_encoders[feature] = le
             print(f"   - Encoded {feature}: {dict(zip(le.classes_, le.transform(le.classes_)))}")
         
+        self.encoding_tables = compile_encoding_tables(self.label_encoders)
+        
         # 4. Select features for the model
         print("\n4. Feature Selection...")
         
         # Define feature columns for the model - EXCLUDING Standard_Specification_Qty 
         # to predict actual demand based on flight characteristics
-        self.feature_columns = [
-            'Origin_encoded', 'Flight_Type_encoded', 'Service_Type_encoded', 
-            'Passenger_Count', 'Product_Name_encoded', 'Unit_Cost', 'Has_Issues'
-        ]
+        self.feature_columns = list(PREPROCESSING_CONFIG['feature_columns'])
         
-        self.target_column = 'Quantity_Consumed'
+        self.target_column = PREPROCESSING_CONFIG['target_column']
         
         print(f"   - Selected features: {self.feature_columns}")
         print(f"   - Target variable: {self.target_column}")
@@ -133,12 +132,13 @@ class AirlineConsumptionPredictor:
         # 5. Create final dataset
         print("\n5. Creating Final Dataset...")
         
-        # Ensure no missing values in selected features
-        self.df_final = self.df_processed[self.feature_columns + [self.target_column]].copy()
+        # Ensure no missing values in selected features (reference columns are only reported on)
+        model_columns = self.feature_columns + [self.target_column]
+        self.df_final = self.df_processed[model_columns + PREPROCESSING_CONFIG['reference_columns']].copy()
         
         # Remove any remaining NaN values
         initial_rows = len(self.df_final)
-        self.df_final = self.df_final.dropna()
+        self.df_final = self.df_final.dropna(subset=model_columns)
         print(f"   - Removed {initial_rows - len(self.df_final)} rows with missing values")
         
         print(f"\nFinal dataset shape: {self.df_final.shape}")
@@ -147,14 +147,116 @@ class AirlineConsumptionPredictor:
         
         return self.df_final
     
-    def create_visualizations(self):
+    def _clean_and_derive(self, df):
+        """
+        Data cleaning and feature engineering (no encoders are fitted)
+        Returns a new frame with the rate, per-passenger and Has_Issues columns
+        """
+        # Create a copy for processing
+        df_processed = df.copy()
+        
+        # 1. Handle missing values and data cleaning
+        print("\n1. Data Cleaning...")
+        
+        # Remove rows with zero consumption (not meaningful for prediction)
+        initial_rows = len(df_processed)
+        df_processed = df_processed[
+            df_processed['Quantity_Consumed'] > PREPROCESSING_CONFIG['min_quantity_consumed']
+        ]
+        print(f"   - Removed {initial_rows - len(df_processed)} rows with zero consumption")
+        
+        # Clean crew feedback (remove problematic entries if needed)
+        problematic_feedback = PREPROCESSING_CONFIG['problematic_feedback']
+        problematic_data = df_processed[df_processed['Crew_Feedback'].isin(problematic_feedback)]
+        
+        print(f"   - Found {len(problematic_data)} rows with operational issues")
+        print(f"   - Keeping all data for analysis (can be filtered later)")
+        
+        # 2. Feature Engineering
+        print("\n2. Feature Engineering...")
+        
+        # Add consumption efficiency metrics
+        df_processed['Consumption_Rate'] = (
+            df_processed['Quantity_Consumed'] / 
+            df_processed['Standard_Specification_Qty']
+        )
+        
+        df_processed['Return_Rate'] = (
+            df_processed['Quantity_Returned'] / 
+            df_processed['Standard_Specification_Qty']
+        )
+        
+        # Add per-passenger consumption
+        df_processed['Consumption_Per_Passenger'] = (
+            df_processed['Quantity_Consumed'] / 
+            df_processed['Passenger_Count']
+        )
+        
+        # Add binary features for operational issues
+        df_processed['Has_Issues'] = df_processed['Crew_Feedback'].isin(problematic_feedback).astype(int)
+        
+        print(f"   - Added consumption rate, return rate, and per-passenger metrics")
+        print(f"   - Will use actual Product Names instead of categories")
+        return df_processed
+    
+    def prepare_features(self, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+        """
+        Load and preprocess the dataset, or reuse the cached result of a previous run
+        on the same CSV bytes and PREPROCESSING_CONFIG (see feature_cache.py)
+        Returns the final model table like preprocess_data
+        """
+        if not use_cache:
+            self.load_and_explore_data()
+            return self.preprocess_data()
+        
+        cache = FeatureCache(cache_dir)
+        key = cache_key(self.csv_file_path)
+        cached = cache.load(key)
+        if cached is not None:
+            self._restore_features(cached)
+            print(f"✅ Preprocessed features loaded from cache '{cache_dir}' ({len(self.df_final)} rows, key {key})")
+            return self.df_final
+        
+        self.load_and_explore_data()
+        self.preprocess_data()
+        cache.save(
+            key,
+            {column: self.df_final[column].values for column in self.df_final.columns},
+            self.df_final.index.values,
+            {feature: encoder.classes_ for feature, encoder in self.label_encoders.items()},
+            source_path=self.csv_file_path
+        )
+        print(f"   - Preprocessed features cached in '{cache_dir}' (key {key})")
+        return self.df_final
+    
+    def _restore_features(self, cached):
+        """Rebuild the model table and the fitted encoders from a feature cache entry"""
+        self.df_final = pd.DataFrame(cached.columns, index=cached.index)[cached.header['columns']]
+        self.feature_columns = list(PREPROCESSING_CONFIG['feature_columns'])
+        self.target_column = PREPROCESSING_CONFIG['target_column']
+        self.label_encoders = {}
+        for feature, classes in cached.encoder_classes.items():
+            encoder = LabelEncoder()
+            encoder.classes_ = np.asarray(classes, dtype=object)
+            self.label_encoders[feature] = encoder
+        self.encoding_tables = compile_encoding_tables(self.label_encoders)
+    
+    def create_visualizations(self, output_dir=DEFAULT_PLOT_DIR):
         """
         Create visualizations to understand the data better
+        The figure is written to <output_dir>/data_exploration.png; returns its path
         """
         print("\n" + "="*50)
         print("CREATING DATA VISUALIZATIONS")
         print("="*50)
         
+        if self.df_processed is None:
+            # Features came from the feature cache: rebuild the plotted columns from the CSV,
+            # leaving the cached model table and encoders as they are
+            print("   - Features came from the feature cache: deriving the plotted columns from the CSV")
+            self.df_processed = self._clean_and_derive(pd.read_csv(self.csv_file_path))
+        
+        plt, sns = _plotting()
         plt.figure(figsize=(20, 15))
         
         # 1. Target variable distribution
@@ -238,7 +340,7 @@ class AirlineConsumptionPredictor:
         plt.title('Flight Type Distribution')
         
         plt.tight_layout()
-        plt.show()
+        figure_path = _save_figure(plt, output_dir, 'data_exploration.png')
         
         # Summary statistics by key categories
         print("\nSummary Statistics by Categories:")
@@ -254,6 +356,8 @@ class AirlineConsumptionPredictor:
         print("\n4. By Product Name (Top 10):")
         product_stats = self.df_processed.groupby('Product_Name')['Quantity_Consumed'].agg(['mean', 'std', 'count']).sort_values('mean', ascending=False)
         print(product_stats.head(10))
+        
+        return figure_path
     
     def train_random_forest(self, test_size=0.2, random_state=42):
         """
@@ -287,6 +391,7 @@ class AirlineConsumptionPredictor:
         )
         
         self.model.fit(X_train, y_train)
+        self._compile_engine()
         
         # Make predictions
         y_pred_train = self.model.predict(X_train)
@@ -338,7 +443,7 @@ class AirlineConsumptionPredictor:
         print("• Identifies demand patterns by route and service type")
         
         # Calculate demand vs supply insights
-        self.df_final['Demand_vs_Supply'] = self.df_final['Quantity_Consumed'] / self.df_processed.loc[self.df_final.index, 'Standard_Specification_Qty']
+        self.df_final['Demand_vs_Supply'] = self.df_final['Quantity_Consumed'] / self.df_final['Standard_Specification_Qty']
         avg_utilization = self.df_final['Demand_vs_Supply'].mean()
         print(f"\nAverage demand utilization: {avg_utilization:.2%}")
         print(f"This suggests typical demand is {avg_utilization:.1%} of stocked quantity")
@@ -350,48 +455,41 @@ class AirlineConsumptionPredictor:
         
         return self.model
     
-    def hyperparameter_tuning(self):
+    def hyperparameter_tuning(self, time_budget_s=600, n_workers=None, leaderboard_path=DEFAULT_LEADERBOARD):
         """
-        Perform hyperparameter tuning using GridSearchCV
+        Perform budget-bounded hyperparameter tuning (successive halving over n_estimators, see tuning.py)
+        Trials are recorded in leaderboard_path, so a rerun resumes where the last one stopped
         """
         print("\n" + "="*50)
         print("HYPERPARAMETER TUNING")
         print("="*50)
         
-        # Define parameter grid
-        param_grid = {
-            'n_estimators': [100, 200, 300],
-            'max_depth': [10, 20, None],
-            'min_samples_split': [2, 5, 10],
-            'min_samples_leaf': [1, 2, 4],
-            'max_features': ['auto', 'sqrt', 'log2']
-        }
-        
         # Prepare data
         X = self.df_final[self.feature_columns]
         y = self.df_final[self.target_column]
         
-        # Grid search
-        print("Performing Grid Search (this may take a while)...")
-        grid_search = GridSearchCV(
-            RandomForestRegressor(random_state=42, n_jobs=-1),
-            param_grid,
-            cv=3,  # Reduced for faster execution
-            scoring='r2',
-            n_jobs=-1,
-            verbose=1
+        print(f"Successive halving search (budget {time_budget_s}s, leaderboard '{leaderboard_path}')...")
+        result = successive_halving(
+            X.values, y.values,
+            time_budget_s=time_budget_s,
+            n_workers=n_workers,
+            leaderboard_path=leaderboard_path
         )
         
-        grid_search.fit(X, y)
-        
-        print(f"\nBest parameters: {grid_search.best_params_}")
-        print(f"Best cross-validation score: {grid_search.best_score_:.4f}")
+        print(f"\nBest parameters: {result.best_params} with {result.best_n_estimators} trees")
+        print(f"Best cross-validation score: {result.best_score:.4f}")
+        print(f"Trials: {len(result.trials)} ({result.resumed_trials} resumed from the leaderboard) "
+              f"in {result.elapsed_s:.1f}s{' - budget exhausted' if result.budget_exhausted else ''}")
         
-        # Train final model with best parameters
-        self.model_tuned = grid_search.best_estimator_
-        
-        # Evaluate tuned model
+        # Evaluate the best parameters on the same hold-out split as the baseline
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        self.model_tuned = RandomForestRegressor(
+            n_estimators=result.best_n_estimators,
+            random_state=42,
+            n_jobs=-1,
+            **result.best_params
+        )
+        self.model_tuned.fit(X_train, y_train)
         
         y_pred_tuned = self.model_tuned.predict(X_test)
         tuned_r2 = r2_score(y_test, y_pred_tuned)
@@ -403,14 +501,48 @@ class AirlineConsumptionPredictor:
         
         return self.model_tuned
     
-    def create_model_visualizations(self):
+    def train_segment_models(self, segment_by=SEGMENT_FEATURES, min_rows=DEFAULT_MIN_SEGMENT_ROWS,
+                             n_estimators=DEFAULT_SEGMENT_ESTIMATORS, n_workers=None, random_state=42):
+        """
+        Train a smaller specialist forest per segment (Origin and/or Service_Type, see segment_models.py)
+        Segments with fewer than min_rows training rows keep using the global model.
+        Uses the training split of train_random_forest when it ran, the whole dataset otherwise
+        """
+        print("\n" + "="*50)
+        print(f"TRAINING SEGMENT MODELS ({' x '.join(segment_by)})")
+        print("="*50)
+        
+        if getattr(self, 'X_train', None) is not None:
+            X, y = self.X_train, self.y_train
+        else:
+            X, y = self.df_final[self.feature_columns], self.df_final[self.target_column]
+        
+        self.segment_router = fit_segment_models(
+            X.values, y.values, self.feature_columns,
+            segment_by=segment_by, min_rows=min_rows, n_estimators=n_estimators,
+            n_workers=n_workers, random_state=random_state
+        )
+        
+        print(f"   - {len(self.segment_router.forests)} segment models "
+              f"({n_estimators} trees each, segments with >= {min_rows} rows)")
+        for key, info in sorted(self.segment_router.segment_info.items()):
+            names = [self.encoding_tables[feature].classes.tolist()[code]
+                     for feature, code in zip(self.segment_router.segment_by, key)]
+            print(f"     • {' / '.join(names)}: {info['train_rows']} training rows")
+        print(f"   - Other segments fall back to the global model")
+        
+        return self.segment_router
+    
+    def create_model_visualizations(self, output_dir=DEFAULT_PLOT_DIR):
         """
         Create visualizations for model performance
+        The figure is written to <output_dir>/model_performance.png; returns its path
         """
         print("\n" + "="*50)
         print("MODEL PERFORMANCE VISUALIZATIONS")
         print("="*50)
         
+        plt, _ = _plotting()
         plt.figure(figsize=(15, 10))
         
         # 1. Feature Importance
@@ -461,34 +593,7 @@ class AirlineConsumptionPredictor:
         plt.title('Test Residuals Distribution')
         
         plt.tight_layout()
-        plt.show()
-    
-    def predict_consumption(self, origin, flight_type, service_type, passenger_count, 
-                          product_name, unit_cost, has_issues=0):
-        """
-        Predict consumption for new data based on flight characteristics
-        Note: No longer requires standard_qty as input - predicts actual demand
-        """
-        # Encode categorical variables
-        try:
-            origin_encoded = self.label_encoders['Origin'].transform([origin])[0]
-            flight_type_encoded = self.label_encoders['Flight_Type'].transform([flight_type])[0]
-            service_type_encoded = self.label_encoders['Service_Type'].transform([service_type])[0]
-            product_name_encoded = self.label_encoders['Product_Name'].transform([product_name])[0]
-        except ValueError as e:
-            print(f"Error: Unknown category value - {e}")
-            return None
-        
-        # Create feature array (without standard_qty)
-        features = np.array([[
-            origin_encoded, flight_type_encoded, service_type_encoded,
-            passenger_count, product_name_encoded, unit_cost, has_issues
-        ]])
-        
-        # Make prediction
-        prediction = self.model.predict(features)[0]
-        
-        return max(0, round(prediction))  # Ensure non-negative and integer result
+        return _save_figure(plt, output_dir, 'model_performance.png')
     
     def save_model(self, model_dir="airline_model"):
         """
@@ -527,74 +632,23 @@ class AirlineConsumptionPredictor:
             print(f"   - Label encoders: {encoders_path}")
             print(f"   - Metadata: {metadata_path}")
             
-            return True
-            
-        except Exception as e:
-            print(f"❌ Error saving model: {e}")
-            return False
-    
-    def load_model(self, model_dir="airline_model"):
-        """
-        Load a previously saved model and all necessary components
-        """
-        model_path = os.path.join(model_dir, "random_forest_model.pkl")
-        encoders_path = os.path.join(model_dir, "label_encoders.pkl")
-        metadata_path = os.path.join(model_dir, "model_metadata.pkl")
-        
-        # Check if all required files exist
-        required_files = [model_path, encoders_path, metadata_path]
-        missing_files = [f for f in required_files if not os.path.exists(f)]
-        
-        if missing_files:
-            print(f"❌ Error: Missing required files: {missing_files}")
-            return False
-        
-        try:
-            # Load the model
-            self.model = joblib.load(model_path)
-            
-            # Load label encoders
-            with open(encoders_path, 'rb') as f:
-                self.label_encoders = pickle.load(f)
-            
-            # Load metadata
-            with open(metadata_path, 'rb') as f:
-                metadata = pickle.load(f)
-                self.feature_columns = metadata['feature_columns']
-                self.target_column = metadata['target_column']
-                if metadata['feature_importance'] is not None:
-                    self.feature_importance = pd.DataFrame(metadata['feature_importance'])
+            if self.segment_router is not None:
+                n_segments = save_segments(os.path.join(model_dir, SEGMENTS_DIRNAME),
+                                           self.segment_router, self.encoding_tables)
+                print(f"   - Segment models: {n_segments} in {os.path.join(model_dir, SEGMENTS_DIRNAME)}")
             
-            print(f"✅ Model loaded successfully from '{model_dir}' directory!")
-            print(f"   - Features: {self.feature_columns}")
-            print(f"   - Available categories:")
-            for feature, encoder in self.label_encoders.items():
-                print(f"     • {feature}: {list(encoder.classes_)}")
-            
-            return True
+            return self.save_bundle(os.path.join(model_dir, model_bundle.BUNDLE_FILENAME))
             
         except Exception as e:
-            print(f"❌ Error loading model: {e}")
+            print(f"❌ Error saving model: {e}")
             return False
-    
-    @classmethod
-    def load_trained_model(cls, model_dir="airline_model"):
-        """
-        Class method to create a new instance with a pre-trained model
-        Usage: predictor = AirlineConsumptionPredictor.load_trained_model("my_model")
-        """
-        # Create instance without CSV file (for prediction only)
-        instance = cls(csv_file_path=None)
-        
-        if instance.load_model(model_dir):
-            return instance
-        else:
-            return None
 
 def main():
     """
     Main function to run the complete analysis
     """
+    logging.basicConfig(level=logging.INFO)
+    
     # Initialize the predictor
     #csv_path = r"(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv"
     current_dir = os.path.dirname(__file__)
@@ -603,11 +657,8 @@ def main():
     print(f"Using dataset path: {relative_path}")
     predictor = AirlineConsumptionPredictor(relative_path)
     
-    # Load and explore data
-    df = predictor.load_and_explore_data()
-    
-    # Preprocess data
-    df_processed = predictor.preprocess_data()
+    # Load, explore and preprocess data (reused from the feature cache when the CSV is unchanged)
+    df_processed = predictor.prepare_features()
     
     # Create visualizations
     predictor.create_visualizations()
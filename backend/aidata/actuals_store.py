@@ -0,0 +1,142 @@
+"""
+Append-only store of post-flight actuals
+
+Every row is one product on one flight with what was really consumed and
+returned, in the columns of the training CSV (plus the ingestion time), so
+the retrainer can concatenate it with the original dataset. Serving workers
+only append; the CSV module is enough for that, pandas is imported only to
+read the store back for training.
+"""
+
+import csv
+import io
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock still serialises appends
+    fcntl = None
+
+DATASET_COLUMNS = [
+    'Flight_ID', 'Origin', 'Date', 'Flight_Type', 'Service_Type', 'Passenger_Count',
+    'Product_ID', 'Product_Name', 'Standard_Specification_Qty', 'Quantity_Returned',
+    'Quantity_Consumed', 'Unit_Cost', 'Crew_Feedback'
+]
+STORE_COLUMNS = DATASET_COLUMNS + ['Ingested_At']
+
+REQUIRED_COLUMNS = ('Flight_ID', 'Origin', 'Flight_Type', 'Service_Type', 'Passenger_Count',
+                    'Product_Name', 'Quantity_Consumed', 'Quantity_Returned', 'Unit_Cost')
+
+DEFAULT_STORE_PATH = os.getenv("ACTUALS_STORE_PATH", "actuals_store.csv")
+
+
+class InvalidActualsError(ValueError):
+    """A submitted actuals record is missing fields or holds impossible quantities"""
+
+
+def normalise_record(record, ingested_at):
+    """Store row for one actuals record (dict keyed by dataset column names)"""
+    missing = [column for column in REQUIRED_COLUMNS if record.get(column) in (None, '')]
+    if missing:
+        raise InvalidActualsError(f"Missing fields: {', '.join(missing)}")
+    consumed = int(record['Quantity_Consumed'])
+    returned = int(record['Quantity_Returned'])
+    if consumed < 0 or returned < 0 or int(record['Passenger_Count']) <= 0:
+        raise InvalidActualsError("Quantities must be >= 0 and Passenger_Count > 0")
+
+    row = {column: record.get(column) for column in DATASET_COLUMNS}
+    # What was loaded is what came back plus what was consumed
+    if row['Standard_Specification_Qty'] in (None, ''):
+        row['Standard_Specification_Qty'] = consumed + returned
+    row['Date'] = row['Date'] or ingested_at[:10]
+    row['Crew_Feedback'] = row['Crew_Feedback'] or ''
+    row['Product_ID'] = row['Product_ID'] or ''
+    row['Ingested_At'] = ingested_at
+    return row
+
+
+class ActualsStore:
+    """
+    CSV file of actuals, safe for concurrent appends from several threads
+    and (on POSIX) several worker processes
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counted = (0, 0)  # (bytes already counted, rows in them)
+
+    def append(self, records):
+        """
+        Validate and append records (dicts keyed by dataset column names)
+        All records are written in one locked write, or none if one is invalid
+        Returns the number of rows appended
+        """
+        ingested_at = datetime.now().isoformat(timespec='seconds')
+        rows = [normalise_record(record, ingested_at) for record in records]
+        if not rows:
+            return 0
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=STORE_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, 'a', newline='') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Size after the lock: another worker may have written the header meanwhile
+                if os.fstat(f.fileno()).st_size == 0:
+                    csv.writer(f).writerow(STORE_COLUMNS)
+                f.write(buffer.getvalue())
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return len(rows)
+
+    def count(self):
+        """
+        Rows in the store (header excluded)
+        Only the bytes appended since the last call are parsed; csv.reader
+        keeps a quoted Crew_Feedback with a newline in it as one row
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with self._lock, open(self.path, 'rb') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                offset, rows = self._counted
+                if os.fstat(f.fileno()).st_size < offset:  # store replaced or truncated
+                    offset, rows = 0, 0
+                f.seek(offset)
+                data = f.read()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            new_rows = sum(1 for _ in csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+            if offset == 0 and new_rows:
+                new_rows -= 1  # header
+            self._counted = (offset + len(data), rows + new_rows)
+            return self._counted[1]
+
+    def read_frame(self):
+        """The whole store as a DataFrame in ingestion order (empty if there is no store yet)"""
+        import pandas as pd
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        return pd.read_csv(self.path, keep_default_na=False, na_values=[''])
+
+    def stats(self):
+        exists = os.path.exists(self.path)
+        return {
+            'path': self.path,
+            'rows': self.count(),
+            'last_modified': datetime.fromtimestamp(os.path.getmtime(self.path)).isoformat() if exists else None,
+        }
@@ -0,0 +1,79 @@
+"""
+Lookup tables for the categorical model inputs
+
+A fitted LabelEncoder validates its input and searches its classes on every
+transform call, which costs more than the forest itself for a single row.
+The tables below are compiled once when a model is loaded: a plain dict for
+scalar lookups and a sorted-array search for whole columns. Values the
+encoder never saw get UNKNOWN_CODE instead of raising.
+"""
+
+import numpy as np
+
+UNKNOWN_CODE = -1
+
+# How a predictor treats rows holding an UNKNOWN_CODE:
+#   'null'  - no prediction for the row (None / masked entry)
+#   'raise' - raise UnknownCategoryError
+#   'zero'  - predict 0 units for the row
+UNKNOWN_POLICIES = ('null', 'raise', 'zero')
+
+
+class UnknownCategoryError(ValueError):
+    """
+    Raised under the 'raise' policy when an input category was not seen in training
+    """
+
+    def __init__(self, unknown_values):
+        self.unknown_values = unknown_values
+        details = "; ".join(f"{feature}: {values}" for feature, values in unknown_values.items())
+        super().__init__(f"Unknown category value(s) - {details}")
+
+
+def validate_unknown_policy(policy):
+    if policy not in UNKNOWN_POLICIES:
+        raise ValueError(f"Unknown category policy must be one of {UNKNOWN_POLICIES}, got '{policy}'")
+    return policy
+
+
+class CategoryTable:
+    """
+    Category -> code table equivalent to a fitted LabelEncoder
+    """
+
+    def __init__(self, classes):
+        self.classes = np.asarray(classes)
+        self.codes = {value: code for code, value in enumerate(self.classes.tolist())}
+        # Sorted string view of the classes for vectorised lookups in encode()
+        class_strings = self.classes.astype(str)
+        self._sorter = np.argsort(class_strings, kind='stable')
+        self._sorted = class_strings[self._sorter]
+
+    @classmethod
+    def from_label_encoder(cls, encoder):
+        return cls(encoder.classes_)
+
+    def lookup(self, value):
+        """Code for a single value, UNKNOWN_CODE if it was not seen in training"""
+        return self.codes.get(value, UNKNOWN_CODE)
+
+    def encode(self, values):
+        """Codes for a whole column, UNKNOWN_CODE where the value was not seen in training"""
+        values = np.asarray(values)
+        if values.dtype.kind != 'U':
+            values = values.astype(str)
+        if len(self._sorted) == 0:
+            return np.full(values.shape, UNKNOWN_CODE, dtype=np.int64)
+        positions = np.searchsorted(self._sorted, values)
+        positions[positions == len(self._sorted)] = 0
+        found = self._sorted[positions] == values
+        return np.where(found, self._sorter[positions], UNKNOWN_CODE).astype(np.int64)
+
+    def __len__(self):
+        return len(self.classes)
+
+
+def compile_encoding_tables(label_encoders):
+    """Build one CategoryTable per fitted LabelEncoder"""
+    return {feature: CategoryTable.from_label_encoder(encoder)
+            for feature, encoder in label_encoders.items()}
@@ -0,0 +1,492 @@
+"""
+Inference side of the airline consumption model
+
+ConsumptionPredictor loads a saved model (memory-mapped bundle or legacy
+pickle directory) and serves predictions. It only needs NumPy and the model
+format modules, so importing it keeps worker cold starts small; sklearn,
+joblib and pandas are imported only when a legacy pickle directory is loaded.
+Training and plotting live in Random_Forest_Regression.AirlineConsumptionPredictor,
+which extends this class.
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+
+try:
+    from .category_encoding import (UNKNOWN_CODE, CategoryTable, UnknownCategoryError,
+                                    compile_encoding_tables, validate_unknown_policy)
+    from .forest_engine import export_forest
+    from . import model_bundle
+    from .segment_models import SEGMENTS_DIRNAME, load_segments
+except ImportError:
+    from category_encoding import (UNKNOWN_CODE, CategoryTable, UnknownCategoryError,
+                                   compile_encoding_tables, validate_unknown_policy)
+    from forest_engine import export_forest
+    import model_bundle
+    from segment_models import SEGMENTS_DIRNAME, load_segments
+
+# Inference engines: sklearn's predict, the flattened NumPy forest, or the flat
+# forest for small batches (where joblib dispatch dominates) and sklearn above
+ENGINES = ('sklearn', 'flat', 'auto')
+FLAT_ENGINE_MAX_ROWS = 500
+
+# Demand quantiles returned by predict_consumption_quantiles by default (P50/P90/P95)
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95)
+
+
+class ConsumptionPredictor:
+    def __init__(self, unknown_policy='null', engine='auto'):
+        """
+        unknown_policy: how predictions treat unseen categories ('null', 'raise' or 'zero')
+        engine: inference engine, one of ENGINES
+        """
+        self.label_encoders = {}
+        self.encoding_tables = {}
+        self.unknown_policy = validate_unknown_policy(unknown_policy)
+        self.model = None
+        self.model_version = None
+        self.flat_forest = None
+        self.bundle = None
+        self.prediction_grid = None
+        self._uncertainty_forest = None
+        self.engine = self._validate_engine(engine)
+        self.prediction_cache = None
+        self.segment_router = None
+        self.feature_columns = None
+        self.target_column = None
+        self.feature_importance = None
+
+    def predict_consumption(self, origin, flight_type, service_type, passenger_count, 
+                          product_name, unit_cost, has_issues=0, unknown_policy=None):
+        """
+        Predict consumption for new data based on flight characteristics
+        Note: No longer requires standard_qty as input - predicts actual demand
+        Unknown categories follow unknown_policy (defaults to self.unknown_policy):
+        'null' returns None, 'zero' returns 0, 'raise' raises UnknownCategoryError
+        """
+        policy = validate_unknown_policy(unknown_policy or self.unknown_policy)
+
+        # Encode categorical variables with the compiled lookup tables
+        codes = {
+            'Origin': self.encoding_tables['Origin'].lookup(origin),
+            'Flight_Type': self.encoding_tables['Flight_Type'].lookup(flight_type),
+            'Service_Type': self.encoding_tables['Service_Type'].lookup(service_type),
+            'Product_Name': self.encoding_tables['Product_Name'].lookup(product_name),
+        }
+        if UNKNOWN_CODE in codes.values():
+            if policy == 'raise':
+                values = {'Origin': origin, 'Flight_Type': flight_type,
+                          'Service_Type': service_type, 'Product_Name': product_name}
+                raise UnknownCategoryError({feature: [values[feature]] for feature, code in codes.items()
+                                            if code == UNKNOWN_CODE})
+            return 0 if policy == 'zero' else None
+        
+        # Create feature array (without standard_qty)
+        features = np.array([[
+            codes['Origin'], codes['Flight_Type'], codes['Service_Type'],
+            passenger_count, codes['Product_Name'], unit_cost, has_issues
+        ]])
+        
+        # Make prediction
+        prediction = self._predict_rows(features)[0]
+        
+        return max(0, round(prediction))  # Ensure non-negative and integer result
+
+    def predict_consumption_batch(self, origin, flight_type, service_type, passenger_count,
+                                  product_name, unit_cost, has_issues=0, unknown_policy=None,
+                                  deduplicate=False, use_cache=True):
+        """
+        Predict consumption for many rows with a single model.predict call
+        Every argument is either a scalar shared by all rows (e.g. the flight fields)
+        or an array-like with one value per row (e.g. the product list), so a whole
+        flight - or many flights - can be passed as columns
+        Returns a NumPy int array with one prediction per row. Rows with unknown
+        categories follow unknown_policy: 'null' masks them (np.ma.MaskedArray),
+        'zero' predicts 0 and 'raise' raises UnknownCategoryError
+        deduplicate: run the forest once per distinct feature row (worth it for
+        schedules where the same route/product rows repeat)
+        use_cache: False keeps bulk traffic (fleet schedules) out of the shared
+        prediction cache
+        """
+        policy = validate_unknown_policy(unknown_policy or self.unknown_policy)
+        features, unknown, categories = self._encode_batch(
+            origin, flight_type, service_type, passenger_count, product_name, unit_cost, has_issues
+        )
+
+        if unknown.any() and policy == 'raise':
+            raise self._unknown_category_error(categories)
+
+        # Only rows with known categories go through the forest
+        predictions = np.zeros(len(features), dtype=int)
+        known = ~unknown
+        if known.any():
+            known_features = features if known.all() else features[known]
+            if deduplicate:
+                unique_features, inverse = np.unique(known_features, axis=0, return_inverse=True)
+                raw_predictions = self._predict_rows(unique_features, use_cache)[inverse.ravel()]
+            else:
+                raw_predictions = self._predict_rows(known_features, use_cache)
+            predictions[known] = np.maximum(0, np.rint(raw_predictions)).astype(int)
+
+        if unknown.any() and policy == 'null':
+            return np.ma.masked_array(predictions, mask=unknown)
+        return predictions
+
+    def predict_consumption_quantiles(self, origin, flight_type, service_type, passenger_count,
+                                      product_name, unit_cost, has_issues=0,
+                                      quantiles=DEFAULT_QUANTILES, unknown_policy=None):
+        """
+        Point prediction plus demand quantiles across the trees of the forest
+        Arguments broadcast like predict_consumption_batch. The outputs of every
+        tree for every row come from one vectorized traversal of the flattened
+        forest, so the quantiles cost about the same as the point prediction
+        Returns (predictions, quantile_units): int arrays shaped (n_rows,) and
+        (len(quantiles), n_rows); unknown categories follow unknown_policy
+        ('null' masks both arrays, 'zero' gives 0, 'raise' raises UnknownCategoryError)
+        """
+        quantiles = np.atleast_1d(np.asarray(quantiles, dtype=float))
+        if ((quantiles <= 0) | (quantiles >= 1)).any():
+            raise ValueError(f"Quantiles must be between 0 and 1 (exclusive), got {quantiles.tolist()}")
+
+        policy = validate_unknown_policy(unknown_policy or self.unknown_policy)
+        features, unknown, categories = self._encode_batch(
+            origin, flight_type, service_type, passenger_count, product_name, unit_cost, has_issues
+        )
+        if unknown.any() and policy == 'raise':
+            raise self._unknown_category_error(categories)
+
+        predictions = np.zeros(len(features), dtype=int)
+        quantile_units = np.zeros((len(quantiles), len(features)), dtype=int)
+        known = ~unknown
+        if known.any():
+            known_rows = np.flatnonzero(known)
+            # Segment rows take the quantiles of their segment forest's trees
+            for rows, per_tree in self._per_tree_groups(features[known_rows]):
+                raw_predictions = np.add.reduce(per_tree, axis=0) / len(per_tree)
+                predictions[known_rows[rows]] = np.maximum(0, np.rint(raw_predictions)).astype(int)
+                quantile_units[:, known_rows[rows]] = np.maximum(
+                    0, np.rint(np.quantile(per_tree, quantiles, axis=0))).astype(int)
+
+        if unknown.any() and policy == 'null':
+            return (np.ma.masked_array(predictions, mask=unknown),
+                    np.ma.masked_array(quantile_units, mask=np.broadcast_to(unknown, quantile_units.shape)))
+        return predictions, quantile_units
+
+    @staticmethod
+    def _unknown_category_error(categories):
+        return UnknownCategoryError({
+            feature: sorted(set(values[codes == UNKNOWN_CODE].tolist()))
+            for feature, (values, codes) in categories.items()
+            if (codes == UNKNOWN_CODE).any()
+        })
+
+    def _per_tree_groups(self, features):
+        """
+        Output of every tree for encoded rows, as [(row indices, array (n_trees, n_rows))]
+        with one entry per serving forest (segment forests, then the global forest)
+        """
+        groups = (self.segment_router.partition(features) if self.segment_router is not None
+                  else [(None, np.arange(len(features)))])
+        return [(rows, (forest if forest is not None else self._per_tree_forest()).predict_per_tree(features[rows]))
+                for forest, rows in groups]
+
+    def _per_tree_forest(self):
+        """Flattened forest for per-tree outputs, exported on first use under the sklearn engine"""
+        if self.flat_forest is not None:
+            return self.flat_forest
+        if self._uncertainty_forest is None:
+            self._uncertainty_forest = export_forest(self.model)
+        return self._uncertainty_forest
+
+    @staticmethod
+    def _validate_engine(engine):
+        if engine not in ENGINES:
+            raise ValueError(f"Engine must be one of {ENGINES}, got '{engine}'")
+        return engine
+
+    def set_engine(self, engine):
+        """
+        Select the inference engine ('sklearn', 'flat' or 'auto')
+        The flat engine gives the same predictions as model.predict
+        """
+        self.engine = self._validate_engine(engine)
+        self._compile_engine()
+
+    def _compile_engine(self):
+        self._uncertainty_forest = None
+        if self.model is None and self.bundle is not None:
+            return  # a bundle only holds the flat forest, which serves every engine
+        if self.engine != 'sklearn' and self.model is not None:
+            self.flat_forest = export_forest(self.model)
+        else:
+            self.flat_forest = None
+
+    def _predict_features(self, features):
+        """
+        Raw forest output for an encoded feature matrix: rows of a segment with a
+        specialist forest go to it, everything else to the global forest
+        """
+        if self.segment_router is not None:
+            return self.segment_router.predict(features, self._predict_global)
+        return self._predict_global(features)
+
+    def _predict_global(self, features):
+        """
+        Raw output of the global forest, using the selected engine
+        A bundle holds no sklearn model, so every batch size goes to the flat
+        forest, which switches to its per-tree walk for large batches
+        """
+        if self.flat_forest is None:
+            return self.model.predict(features)
+        if self.model is None or self.engine == 'flat' or len(features) <= FLAT_ENGINE_MAX_ROWS:
+            return self.flat_forest.predict(features)
+        return self.model.predict(features)
+
+    def attach_grid(self, grid):
+        """
+        Serve on-grid rows from a precomputed PredictionGrid (see prediction_grid);
+        rows with an off-grid unit cost or passenger count still use the forest.
+        Raises GridMismatchError if the grid was built for another model. None detaches.
+        """
+        if grid is not None:
+            grid.check_compatible(self)
+        self.prediction_grid = grid
+
+    def _predict_rows(self, features, use_cache=True):
+        """
+        Raw predictions for encoded rows: grid lookups when a grid is attached,
+        the (cached, unless use_cache is False) forest for everything else
+        """
+        predict = self._predict_cached if use_cache else self._predict_features
+        grid = self.prediction_grid
+        if grid is None:
+            return predict(features)
+        predictions, on_grid = grid.lookup(features)
+        if not on_grid.all():
+            off_grid = ~on_grid
+            predictions[off_grid] = predict(features[off_grid])
+        return predictions
+
+    def _predict_cached(self, features):
+        """
+        Raw forest predictions, served from the prediction cache when one is
+        attached; only the cache misses reach the forest
+        """
+        cache = self.prediction_cache
+        if cache is None:
+            return self._predict_features(features)
+
+        rows = features.tolist()
+        cached = cache.get_many(rows, self.model_version)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        predictions = np.array([0.0 if value is None else value for value in cached])
+        if missing:
+            computed = self._predict_features(features[missing])
+            predictions[missing] = computed
+            cache.put_many([rows[i] for i in missing], computed.tolist(), self.model_version)
+        return predictions
+
+    def _encode_batch(self, origin, flight_type, service_type, passenger_count,
+                      product_name, unit_cost, has_issues):
+        """
+        Broadcast the input columns and build the model feature matrix
+        Returns (features, unknown row mask, {feature: (values, codes)})
+        """
+        columns = np.broadcast_arrays(*[
+            np.atleast_1d(np.asarray(column)) for column in
+            (origin, flight_type, service_type, passenger_count, product_name, unit_cost, has_issues)
+        ])
+        origins, flight_types, service_types, passengers, products, unit_costs, issues = columns
+
+        categories = {
+            'Origin': (origins, self.encoding_tables['Origin'].encode(origins)),
+            'Flight_Type': (flight_types, self.encoding_tables['Flight_Type'].encode(flight_types)),
+            'Service_Type': (service_types, self.encoding_tables['Service_Type'].encode(service_types)),
+            'Product_Name': (products, self.encoding_tables['Product_Name'].encode(products)),
+        }
+
+        # Same column order as the single-row feature array
+        features = np.column_stack([
+            categories['Origin'][1], categories['Flight_Type'][1], categories['Service_Type'][1],
+            passengers, categories['Product_Name'][1], unit_costs, issues
+        ]).astype(float)
+
+        unknown = np.zeros(len(features), dtype=bool)
+        for _, codes in categories.values():
+            unknown |= codes == UNKNOWN_CODE
+
+        return features, unknown, categories
+
+    def load_model(self, model_dir="airline_model"):
+        """
+        Load a previously saved model and all necessary components
+        """
+        model_path = os.path.join(model_dir, "random_forest_model.pkl")
+        encoders_path = os.path.join(model_dir, "label_encoders.pkl")
+        metadata_path = os.path.join(model_dir, "model_metadata.pkl")
+        
+        # Check if all required files exist
+        required_files = [model_path, encoders_path, metadata_path]
+        missing_files = [f for f in required_files if not os.path.exists(f)]
+        
+        if missing_files:
+            print(f"❌ Error: Missing required files: {missing_files}")
+            return False
+        
+        try:
+            # Pickles hold sklearn objects: only this legacy path pays for those imports
+            import joblib
+            import pickle
+            
+            # Load the model
+            self.model = joblib.load(model_path)
+            self._compile_engine()
+            
+            # Load label encoders
+            with open(encoders_path, 'rb') as f:
+                self.label_encoders = pickle.load(f)
+            self.encoding_tables = compile_encoding_tables(self.label_encoders)
+            
+            # Load metadata
+            with open(metadata_path, 'rb') as f:
+                metadata = pickle.load(f)
+                self.feature_columns = metadata['feature_columns']
+                self.target_column = metadata['target_column']
+                self.feature_importance = metadata['feature_importance']
+            
+            print(f"✅ Model loaded successfully from '{model_dir}' directory!")
+            print(f"   - Features: {self.feature_columns}")
+            print(f"   - Available categories:")
+            for feature, encoder in self.label_encoders.items():
+                print(f"     • {feature}: {list(encoder.classes_)}")
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error loading model: {e}")
+            return False
+    
+    def save_bundle(self, bundle_path):
+        """
+        Save the model as a single memory-mappable bundle file (see model_bundle)
+        """
+        flat_forest = self.flat_forest if self.flat_forest is not None else (
+            export_forest(self.model) if self.model is not None else None)
+        if flat_forest is None:
+            print("Error: No trained model to save. Please train the model first.")
+            return False
+        
+        try:
+            feature_importance = self.feature_importance
+            if hasattr(feature_importance, 'to_dict'):
+                feature_importance = feature_importance.to_dict('records')
+            metadata = {
+                'feature_columns': self.feature_columns,
+                'target_column': self.target_column,
+                'feature_importance': feature_importance,
+                'created_at': datetime.now().isoformat(timespec='seconds')
+            }
+            encoder_classes = {feature: table.classes.tolist()
+                               for feature, table in self.encoding_tables.items()}
+            checksum = model_bundle.save_bundle(bundle_path, flat_forest, encoder_classes, metadata)
+            print(f"   - Bundle: {bundle_path} (sha256 {checksum[:12]})")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Error saving model bundle: {e}")
+            return False
+    
+    def load_bundle(self, bundle_path, verify=True):
+        """
+        Load a model bundle; the forest arrays stay memory-mapped and are shared
+        between processes. Predictions use the flat engine (no sklearn model is loaded)
+        """
+        try:
+            bundle = model_bundle.load_bundle(bundle_path, verify=verify)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Error loading model bundle: {e}")
+            return False
+        
+        self.bundle = bundle
+        self.model = None
+        self.flat_forest = bundle.flat_forest
+        self.label_encoders = {}
+        self.encoding_tables = {feature: CategoryTable(classes)
+                                for feature, classes in bundle.encoder_classes.items()}
+        self.feature_columns = bundle.metadata['feature_columns']
+        self.target_column = bundle.metadata['target_column']
+        # Kept as a list of {'feature', 'importance'} records (no pandas needed)
+        self.feature_importance = bundle.metadata.get('feature_importance')
+        
+        print(f"✅ Model bundle loaded from '{bundle_path}' "
+              f"(format v{bundle.format_version}, {bundle.mapped_bytes / (1024 * 1024):.1f} MB mapped)")
+        return True
+    
+    @classmethod
+    def load_trained_model(cls, model_dir="airline_model", unknown_policy='null', engine='auto', segments=True,
+                           variant='full'):
+        """
+        Class method to create a new instance with a pre-trained model
+        model_dir: a bundle file, a directory holding model.bundle, or a legacy
+        pickle directory (used when there is no bundle or it cannot be loaded)
+        segments: also load the per-segment models saved in the directory
+        variant: 'compact' serves compact.bundle (see model_compression) when it
+        was built from the current full model, the full model otherwise
+        Usage: predictor = ConsumptionPredictor.load_trained_model("my_model")
+        """
+        # Create instance without CSV file (for prediction only)
+        instance = cls(unknown_policy=unknown_policy, engine=engine)
+        
+        bundle_path = cls._variant_bundle_path(model_dir, model_bundle.validate_variant(variant))
+        if not (bundle_path is not None and instance.load_bundle(bundle_path)) and not (
+                os.path.isdir(model_dir) and instance.load_model(model_dir)):
+            return None
+        
+        if segments and os.path.isdir(model_dir):
+            instance.load_segment_models(model_dir)
+        return instance
+    
+    @staticmethod
+    def _variant_bundle_path(model_dir, variant):
+        """
+        Bundle file to load for a variant; falls back to the full model when the
+        variant is missing or was compressed from an older full model
+        """
+        full_path = model_bundle.resolve_bundle_path(model_dir)
+        if variant == 'full' or os.path.isfile(model_dir):
+            return full_path
+        path = model_bundle.resolve_bundle_path(model_dir, variant)
+        if path is None:
+            print(f"⚠️ No {variant} model in '{model_dir}', serving the full model")
+            return full_path
+        if full_path is None:
+            return path
+        try:
+            # Headers only: the arrays stay unread until the chosen bundle is loaded
+            source_checksum = model_bundle.load_bundle(path, verify=False).metadata.get('source_checksum')
+            current_checksum = model_bundle.load_bundle(full_path, verify=False).checksum
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not read the {variant} model ({e}), serving the full model")
+            return full_path
+        if source_checksum != current_checksum:
+            print(f"⚠️ The {variant} model was built from an older full model, serving the full model")
+            return full_path
+        return path
+    
+    def load_segment_models(self, model_dir):
+        """
+        Attach the per-segment forests saved in <model_dir>/segments, if any (see segment_models)
+        Returns True when a segment router was attached
+        """
+        segments_dir = os.path.join(model_dir, SEGMENTS_DIRNAME)
+        try:
+            router = load_segments(segments_dir, self.encoding_tables, self.feature_columns)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Segment models not loaded, serving the global model only: {e}")
+            router = None
+        self.segment_router = router
+        if router is not None:
+            print(f"✅ {len(router.forests)} segment models loaded ({', '.join(router.segment_by)})")
+        return router is not None
@@ -0,0 +1,148 @@
+"""
+Content-addressed cache for the preprocessing stage of training
+
+preprocess_data re-reads the CSV, derives the rate columns and refits the
+label encoders on every run. Its output only depends on the bytes of the
+source file and on the preprocessing config, so it is stored under a key
+hashing both: the model table (feature, target and reference columns, one
+.npy per column inside an uncompressed .npz) plus a JSON header with the
+encoder classes. A retrain or CV experiment on unchanged data loads that
+instead of preprocessing again; editing the CSV or PREPROCESSING_CONFIG
+changes the key and forces a rebuild.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Everything preprocess_data decides; bump 'version' when its logic changes
+PREPROCESSING_CONFIG = {
+    'version': 1,
+    'min_quantity_consumed': 0,
+    'problematic_feedback': ['drawer incomplete', 'ran out early', 'low demand'],
+    'categorical_features': ['Origin', 'Flight_Type', 'Service_Type', 'Product_Name'],
+    'feature_columns': [
+        'Origin_encoded', 'Flight_Type_encoded', 'Service_Type_encoded',
+        'Passenger_Count', 'Product_Name_encoded', 'Unit_Cost', 'Has_Issues'
+    ],
+    'target_column': 'Quantity_Consumed',
+    # Kept next to the features for reporting (demand vs stocked quantity), not fitted on
+    'reference_columns': ['Standard_Specification_Qty'],
+}
+
+DEFAULT_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "feature_cache")
+
+_TABLE_FILENAME = "table.npz"
+_HEADER_FILENAME = "header.json"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source_path, config=PREPROCESSING_CONFIG):
+    """Key of the preprocessed output: hash of the source bytes and of the config"""
+    digest = hashlib.sha256()
+    digest.update(file_digest(source_path).encode())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()[:24]
+
+
+class CachedFeatures:
+    """Preprocessed model table loaded from the cache"""
+
+    def __init__(self, key, columns, index, encoder_classes, header):
+        self.key = key
+        self.columns = columns
+        self.index = index
+        self.encoder_classes = encoder_classes
+        self.header = header
+
+
+class FeatureCache:
+    """
+    Directory of preprocessed tables, one subdirectory per cache key
+    Entries are written to a temporary directory and renamed into place, so a
+    crashed run never leaves a half-written entry behind
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """CachedFeatures for key, or None (a miss) when absent or unreadable"""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, _HEADER_FILENAME)) as f:
+                header = json.load(f)
+            with np.load(os.path.join(entry_dir, _TABLE_FILENAME), allow_pickle=False) as table:
+                columns = {name: table[name] for name in header['columns']}
+                index = table['__index__']
+        except FileNotFoundError:
+            self.misses += 1
+            logger.info(f"Feature cache miss: {key}")
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            self.misses += 1
+            logger.warning(f"Feature cache entry {key} unreadable ({e}), rebuilding")
+            return None
+
+        self.hits += 1
+        logger.info(f"Feature cache hit: {key} ({header['n_rows']} rows, built {header['created_at']})")
+        return CachedFeatures(key, columns, index, header['encoder_classes'], header)
+
+    def save(self, key, columns, index, encoder_classes, source_path=None):
+        """
+        Store a preprocessed table
+        columns: {name: 1-D array}, all of the same length; encoder_classes: {feature: [classes]}
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}.", dir=self.cache_dir)
+        try:
+            arrays = {name: np.asarray(values) for name, values in columns.items()}
+            arrays['__index__'] = np.asarray(index)
+            np.savez(os.path.join(tmp_dir, _TABLE_FILENAME), **arrays)
+            header = {
+                'key': key,
+                'columns': list(columns),
+                'n_rows': int(len(index)),
+                'encoder_classes': {feature: [str(c) for c in classes]
+                                    for feature, classes in encoder_classes.items()},
+                'source': os.path.abspath(source_path) if source_path else None,
+                'created_at': datetime.now().isoformat(),
+            }
+            with open(os.path.join(tmp_dir, _HEADER_FILENAME), 'w') as f:
+                json.dump(header, f, indent=2)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.info(f"Feature cache stored: {key} ({len(index)} rows)")
+        return entry_dir
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self):
+        return {'cache_dir': self.cache_dir, 'hits': self.hits, 'misses': self.misses}
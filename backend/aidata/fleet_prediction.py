@@ -0,0 +1,289 @@
+"""
+Streaming consumption predictions for full flight schedules
+
+A schedule uses the Flight_ID, Origin, Flight_Type, Service_Type,
+Passenger_Count, Product_Name and Unit_Cost columns of the consumption dataset,
+sent as CSV (with header) or NDJSON (one object per row). Rows are parsed
+incrementally, grouped into bounded chunks, deduplicated and predicted in a
+worker pool, and one NDJSON record per flight is streamed back, so memory stays
+flat however long the schedule is.
+
+Rows of a flight are expected to be contiguous, as in the dataset; a flight
+whose rows are interleaved with other flights is reported once per run.
+
+The request body is spooled (spool_body) before the response starts: while a
+StreamingResponse runs, Starlette listens on receive() for a disconnect, and
+reading the body at the same time races it for the body messages. Bodies
+beyond SPOOL_MAX_MEMORY bytes go to a temporary file.
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+import os
+import tempfile
+
+import numpy as np
+
+SCHEDULE_COLUMNS = ('Flight_ID', 'Origin', 'Flight_Type', 'Service_Type',
+                    'Passenger_Count', 'Product_Name', 'Unit_Cost')
+SCHEDULE_FORMATS = ('csv', 'ndjson')
+
+DEFAULT_CHUNK_ROWS = 5000
+
+SPOOL_MAX_MEMORY = int(os.getenv("FLEET_SPOOL_MAX_MEMORY", str(8 << 20)))
+SPOOL_READ_BYTES = 1 << 16
+
+
+class ScheduleFormatError(ValueError):
+    """The schedule cannot be parsed at all (e.g. missing columns in the CSV header)"""
+
+
+class ScheduleParser:
+    """
+    Incremental CSV/NDJSON parser: feed() raw bytes as they arrive and get back
+    the complete rows, as tuples in SCHEDULE_COLUMNS order, plus row errors
+    """
+
+    def __init__(self, fmt):
+        if fmt not in SCHEDULE_FORMATS:
+            raise ScheduleFormatError(f"Schedule format must be one of {SCHEDULE_FORMATS}, got '{fmt}'")
+        self.fmt = fmt
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._column_index = None
+        self.line_number = 0
+
+    def feed(self, data):
+        self._buffer += self._decoder.decode(data)
+        *lines, self._buffer = self._buffer.split('\n')
+        return self._parse_lines(lines)
+
+    def finish(self):
+        self._buffer += self._decoder.decode(b'', final=True)
+        lines, self._buffer = [self._buffer], ''
+        return self._parse_lines(lines)
+
+    def _parse_lines(self, lines):
+        rows, errors = [], []
+        for line in lines:
+            self.line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = self._parse_csv(line) if self.fmt == 'csv' else self._parse_ndjson(line)
+            except ScheduleFormatError:
+                raise
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                errors.append({'line': self.line_number, 'error': f"Invalid row: {e}"})
+                continue
+            if row is not None:
+                rows.append(row)
+        return rows, errors
+
+    def _parse_csv(self, line):
+        values = next(csv.reader([line]))
+        if self._column_index is None:
+            header = [value.strip() for value in values]
+            missing = [column for column in SCHEDULE_COLUMNS if column not in header]
+            if missing:
+                raise ScheduleFormatError(f"CSV header is missing columns: {missing}")
+            self._column_index = [header.index(column) for column in SCHEDULE_COLUMNS]
+            return None
+        return self._typed_row([values[i].strip() for i in self._column_index])
+
+    def _parse_ndjson(self, line):
+        record = json.loads(line)
+        return self._typed_row([record[column] for column in SCHEDULE_COLUMNS])
+
+    @staticmethod
+    def _typed_row(values):
+        flight_id, origin, flight_type, service_type, passengers, product, unit_cost = values
+        return (str(flight_id), origin, flight_type, service_type,
+                int(passengers), product, float(unit_cost))
+
+
+def predict_chunk(predictor, rows):
+    """
+    Predict one chunk of schedule rows with a single deduplicated batch call
+    Bypasses the prediction cache so a large schedule cannot evict the
+    interactive /api/predict entries
+    Returns (rows, predicted units as a list with None for unknown categories, distinct rows)
+    """
+    columns = list(zip(*rows))
+    predictions = predictor.predict_consumption_batch(
+        origin=np.array(columns[1], dtype=object),
+        flight_type=np.array(columns[2], dtype=object),
+        service_type=np.array(columns[3], dtype=object),
+        passenger_count=np.array(columns[4]),
+        product_name=np.array(columns[5], dtype=object),
+        unit_cost=np.array(columns[6]),
+        has_issues=0,
+        unknown_policy='null',
+        deduplicate=True,
+        use_cache=False
+    )
+    distinct_rows = len({row[1:] for row in rows})
+    return rows, predictions.tolist(), distinct_rows
+
+
+class FlightAssembler:
+    """
+    Groups consecutive predicted rows by Flight_ID and builds one result per
+    flight, in the same shape as the /api/predict response
+    """
+
+    def __init__(self):
+        self._flight_id = None
+        self._rows = []
+        self._units = []
+
+    def add(self, rows, units):
+        """Add predicted rows; returns the flights completed by them"""
+        completed = []
+        for row, predicted in zip(rows, units):
+            if self._flight_id is not None and row[0] != self._flight_id:
+                completed.append(self._build())
+            self._flight_id = row[0]
+            self._rows.append(row)
+            self._units.append(predicted)
+        return completed
+
+    def flush(self):
+        return [self._build()] if self._rows else []
+
+    def _build(self):
+        first = self._rows[0]
+        products = []
+        total_units = 0
+        total_cost = 0.0
+        for row, predicted in zip(self._rows, self._units):
+            product_cost = predicted * row[6] if predicted is not None else None
+            if predicted is not None:
+                total_units += predicted
+                total_cost += product_cost
+            products.append({
+                'product_name': row[5],
+                'unit_cost': row[6],
+                'predicted_units': predicted,
+                'total_cost': round(product_cost, 2) if product_cost is not None else None,
+            })
+        passenger_count = first[4]
+        result = {
+            'flight_info': {
+                'flight_id': first[0],
+                'origin': first[1],
+                'flight_type': first[2],
+                'service_type': first[3],
+                'passenger_count': passenger_count,
+            },
+            'products': products,
+            'totals': {
+                'total_units': total_units,
+                'total_cost': round(total_cost, 2),
+                'units_per_passenger': round(total_units / passenger_count, 2) if passenger_count > 0 else 0,
+                'cost_per_passenger': round(total_cost / passenger_count, 2) if passenger_count > 0 else 0,
+            },
+        }
+        self._flight_id = None
+        self._rows = []
+        self._units = []
+        return result
+
+
+async def spool_body(byte_stream, max_memory=SPOOL_MAX_MEMORY):
+    """
+    Read a request body to the end into a temporary file, kept in memory up to
+    max_memory bytes; returns the file positioned at the start
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        async for data in byte_stream:
+            spooled.write(data)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+
+async def iter_spooled(spooled, chunk_size=SPOOL_READ_BYTES):
+    """Async iterator over a spooled body; closes the file once exhausted"""
+    try:
+        while True:
+            data = spooled.read(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        spooled.close()
+
+
+def _ndjson(record):
+    return (json.dumps(record) + '\n').encode('utf-8')
+
+
+async def stream_fleet_predictions(byte_stream, predictor, fmt, executor,
+                                   chunk_rows=DEFAULT_CHUNK_ROWS, max_pending_chunks=2):
+    """
+    Async generator of NDJSON lines: one record per flight, {"line", "error"}
+    records for rows that could not be parsed and a final {"summary"} record
+    byte_stream: async iterator of raw request body bytes
+    executor: worker pool the chunk inference runs in
+    """
+    loop = asyncio.get_running_loop()
+    parser = ScheduleParser(fmt)
+    assembler = FlightAssembler()
+    pending = []   # in-flight chunk futures, oldest first
+    chunk = []
+    summary = {'rows': 0, 'flights': 0, 'distinct_rows': 0, 'unknown_rows': 0, 'errors': 0}
+
+    def submit(rows):
+        pending.append(loop.run_in_executor(executor, predict_chunk, predictor, rows))
+
+    async def drain(limit):
+        # Await the oldest chunks so results are emitted in input order
+        lines = []
+        while len(pending) > limit:
+            rows, units, distinct_rows = await pending.pop(0)
+            summary['distinct_rows'] += distinct_rows
+            summary['unknown_rows'] += sum(1 for predicted in units if predicted is None)
+            for flight in assembler.add(rows, units):
+                summary['flights'] += 1
+                lines.append(_ndjson(flight))
+        return lines
+
+    async def consume(rows, errors):
+        nonlocal chunk
+        lines = [_ndjson(error) for error in errors]
+        summary['errors'] += len(errors)
+        summary['rows'] += len(rows)
+        chunk.extend(rows)
+        while len(chunk) >= chunk_rows:
+            submit(chunk[:chunk_rows])
+            chunk = chunk[chunk_rows:]
+            lines.extend(await drain(max_pending_chunks))
+        return lines
+
+    try:
+        async for data in byte_stream:
+            for line in await consume(*parser.feed(data)):
+                yield line
+        for line in await consume(*parser.finish()):
+            yield line
+    except ScheduleFormatError as e:
+        for future in pending:
+            future.cancel()
+        yield _ndjson({'error': str(e)})
+        return
+
+    if chunk:
+        submit(chunk)
+    for line in await drain(0):
+        yield line
+    for flight in assembler.flush():
+        summary['flights'] += 1
+        yield _ndjson(flight)
+    yield _ndjson({'summary': summary})
@@ -0,0 +1,185 @@
+"""
+Flattened NumPy inference engine for the trained Random Forest
+
+export_forest() copies every tree of a fitted RandomForestRegressor into one
+set of contiguous arrays (feature, threshold, left, right, value per node).
+FlatForest.predict() then walks all trees for all rows at once with array
+indexing, avoiding sklearn's joblib dispatch and per-estimator Python
+overhead, while returning exactly the same values as model.predict.
+
+Large batches are walked one tree at a time instead, every row of a block
+stepping down one level per pass over preallocated buffers: the per-tree
+working set stays in cache where one walker per (tree, row) pair does not.
+"""
+
+import numpy as np
+
+# Batches of at least this many rows take the per-tree walk
+LEVEL_WALK_MIN_ROWS = 4096
+# Rows walked together per tree in the per-tree walk
+LEVEL_WALK_BLOCK_ROWS = 16384
+
+
+class FlatForest:
+    """
+    All trees of a forest stored as flat node arrays
+    Node ids are global: tree t owns nodes roots[t] .. roots[t+1]-1. Leaves point
+    to themselves (left == right == own id), which is how they are recognised.
+    The arrays may be read-only views (e.g. of a memory-mapped model bundle).
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, is_leaf=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.is_leaf = left == np.arange(len(left)) if is_leaf is None else is_leaf
+        self._level_walk_arrays = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in
+                   (self.feature, self.threshold, self.left, self.right, self.value, self.roots))
+
+    def apply(self, X):
+        """
+        Leaf node id reached by every row in every tree, shape (n_trees, n_rows)
+        """
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        if n_rows >= LEVEL_WALK_MIN_ROWS:
+            return self._apply_per_tree(X)
+        X_flat = X.ravel()
+
+        # One walker per (tree, row) pair; walkers drop out once they reach a leaf
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            values = X_flat[row_offsets[active] + self.feature[current]]
+            current = np.where(values <= self.threshold[current], self.left[current], self.right[current])
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(self.n_trees, n_rows)
+
+    def _level_walk(self):
+        """
+        Arrays of the per-tree walk, derived once: depth of every tree, feature
+        ids, float32 thresholds and the children as (right, left) pairs
+        """
+        if self._level_walk_arrays is None:
+            # Rounding each threshold down to the largest float32 not above it
+            # keeps x <= threshold exact for float32 x
+            threshold = self.threshold.astype(np.float32)
+            rounded_up = threshold.astype(np.float64) > self.threshold
+            threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+            children = np.empty(2 * self.n_nodes, dtype=np.intp)
+            children[0::2] = self.right
+            children[1::2] = self.left
+
+            depth = np.zeros(self.n_nodes, dtype=np.int64)
+            frontier, level = np.asarray(self.roots, dtype=np.intp), 0
+            while frontier.size:
+                depth[frontier] = level
+                frontier = frontier[~self.is_leaf[frontier]]
+                frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+                level += 1
+            tree_depths = np.maximum.reduceat(depth, np.asarray(self.roots, dtype=np.intp))
+
+            self._level_walk_arrays = (tree_depths, self.feature.astype(np.intp), threshold, children)
+        return self._level_walk_arrays
+
+    def _apply_per_tree(self, X):
+        """apply() for large batches: each tree walks a block of rows level by level"""
+        tree_depths, feature, threshold, children = self._level_walk()
+        n_rows, n_features = X.shape
+        nodes = np.empty((self.n_trees, n_rows), dtype=np.intp)
+        for start in range(0, n_rows, LEVEL_WALK_BLOCK_ROWS):
+            X_block = X[start:start + LEVEL_WALK_BLOCK_ROWS]
+            n_block = len(X_block)
+            X_flat = X_block.ravel()
+            row_offsets = np.arange(n_block, dtype=np.intp) * n_features
+            index = np.empty(n_block, dtype=np.intp)
+            values = np.empty(n_block, dtype=np.float32)
+            thresholds = np.empty(n_block, dtype=np.float32)
+            goes_left = np.empty(n_block, dtype=bool)
+            for tree, (root, depth) in enumerate(zip(self.roots, tree_depths)):
+                current = nodes[tree, start:start + n_block]
+                current[:] = root
+                # Leaves point to themselves, so rows that stop early stay put
+                for _ in range(depth):
+                    np.take(feature, current, out=index)
+                    index += row_offsets
+                    np.take(X_flat, index, out=values)
+                    np.take(threshold, current, out=thresholds)
+                    np.less_equal(values, thresholds, out=goes_left)
+                    np.multiply(current, 2, out=index)
+                    index += goes_left
+                    np.take(children, index, out=current)
+        return nodes
+
+    def predict_per_tree(self, X):
+        """Prediction of every tree for every row, shape (n_trees, n_rows)"""
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        """Forest prediction, identical to RandomForestRegressor.predict"""
+        per_tree = self.predict_per_tree(X)
+        # A running sum adds the trees one after another, the accumulation
+        # order sklearn uses; np.add.reduce switches to pairwise summation
+        # when the trees are contiguous (a single row) and can differ in the last bit
+        return np.cumsum(per_tree, axis=0)[-1] / self.n_trees
+
+
+def export_forest(model):
+    """
+    Compile a fitted single-output RandomForestRegressor into a FlatForest
+    """
+    estimators = model.estimators_
+    trees = [estimator.tree_ for estimator in estimators]
+
+    sizes = np.array([tree.node_count for tree in trees], dtype=np.int64)
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    n_nodes = int(sizes.sum())
+
+    feature = np.empty(n_nodes, dtype=np.int64)
+    threshold = np.empty(n_nodes, dtype=np.float64)
+    left = np.empty(n_nodes, dtype=np.int64)
+    right = np.empty(n_nodes, dtype=np.int64)
+    value = np.empty(n_nodes, dtype=np.float64)
+
+    for tree, offset in zip(trees, roots):
+        nodes = slice(offset, offset + tree.node_count)
+        own_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+        is_leaf = tree.children_left == -1
+
+        feature[nodes] = np.where(is_leaf, 0, tree.feature)
+        threshold[nodes] = np.where(is_leaf, np.inf, tree.threshold)
+        left[nodes] = np.where(is_leaf, own_ids, tree.children_left + offset)
+        right[nodes] = np.where(is_leaf, own_ids, tree.children_right + offset)
+        value[nodes] = tree.value[:, 0, 0]
+
+    return FlatForest(
+        feature=feature,
+        threshold=threshold,
+        left=left,
+        right=right,
+        value=value,
+        roots=roots,
+        max_depth=max(tree.max_depth for tree in trees),
+        n_features=model.n_features_in_,
+    )
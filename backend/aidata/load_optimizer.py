@@ -0,0 +1,173 @@
+"""
+Budget-constrained loading plans
+
+For every product of a flight the forest gives a demand distribution: the
+outputs of its trees (segment forest or global forest) are treated as equally
+likely demand samples. Loading k units of a product sells min(D, k), so the
+k-th unit is sold with probability P(D >= k) and is worth margin * P(D >= k).
+That value never increases with k, so filling each flight's budget with the
+units of best value per unit of budget (cost or weight) gives the plan that
+maximises expected margin (up to the last unit that does not fit).
+
+All products of all flights are planned together: survival curves are built
+for every row with one searchsorted, candidate units are ranked per flight
+with one lexsort and the budget is applied with a grouped cumulative sum, so a
+day's schedule is planned without per-product Python loops.
+"""
+
+import os
+
+import numpy as np
+
+try:
+    from .category_encoding import validate_unknown_policy
+except ImportError:
+    from category_encoding import validate_unknown_policy
+
+BUDGET_TYPES = ('cost', 'weight')
+
+MAX_PLAN_CELLS = int(os.getenv("LOAD_PLAN_MAX_CELLS", "20000000"))
+
+
+class PlanTooLargeError(ValueError):
+    """Rows x candidate units exceeds MAX_PLAN_CELLS"""
+
+
+def demand_survival(per_tree, max_units):
+    """
+    P(demand >= k) for k = 1..max_units from per-tree outputs shaped (n_trees, n_rows)
+    Tree outputs are rounded to whole units; returns (n_rows, max_units)
+    """
+    n_trees, n_rows = per_tree.shape
+    demand = np.clip(np.rint(per_tree.T), 0, max_units)
+    # Offset every row into its own band so one searchsorted serves all rows
+    band = max_units + 2
+    offsets = np.arange(n_rows, dtype=np.float64) * band
+    flat = (np.sort(demand, axis=1) + offsets[:, None]).ravel()
+    queries = np.arange(1, max_units + 1, dtype=np.float64)[None, :] + offsets[:, None]
+    below = np.searchsorted(flat, queries.ravel(), side='left').reshape(n_rows, max_units)
+    below -= (np.arange(n_rows) * n_trees)[:, None]
+    return (n_trees - below) / n_trees
+
+
+def allocate(survival, margin, unit_size, flight_index, budget):
+    """
+    Greedy allocation of units under a budget per flight
+    survival: (n_rows, max_units) P(demand >= k); margin, unit_size: per row
+    flight_index: flight of every row (0..n_flights-1); budget: per flight
+    Returns the units planned per row
+    """
+    n_rows, max_units = survival.shape
+    value = survival * margin[:, None]
+    candidate = value > 0
+    rows = np.nonzero(candidate)[0]
+    value = value[candidate]
+    size = unit_size[rows]
+    with np.errstate(divide='ignore'):
+        ratio = np.where(size > 0, value / np.where(size > 0, size, 1), np.inf)
+
+    flights = flight_index[rows]
+    # Best value per unit of budget first within every flight; the sort is stable
+    # so units of one product stay in k order when their ratios tie
+    order = np.lexsort((-ratio, flights))
+    size, flights, rows = size[order], flights[order], rows[order]
+    spent = np.cumsum(size)
+    starts = np.flatnonzero(np.r_[True, flights[1:] != flights[:-1]]) if len(flights) else np.array([], dtype=int)
+    spent_before = np.repeat(spent[starts] - size[starts], np.diff(np.r_[starts, len(flights)]))
+    taken = (spent - spent_before) <= budget[flights] + 1e-9
+    return np.bincount(rows[taken], minlength=n_rows)
+
+
+def plan_load(predictor, flight_index, origin, flight_type, service_type, passenger_count, product_name,
+              unit_cost, margin, budget, unit_weight=None, budget_type='cost', max_units=None,
+              has_issues=0, unknown_policy='raise', max_cells=MAX_PLAN_CELLS):
+    """
+    Loading plan for one or more flights
+    Row arguments are scalars or per-row arrays (one row per product on a flight);
+    flight_index maps every row to its flight's entry in budget
+    budget_type: 'cost' spends unit_cost, 'weight' spends unit_weight
+    max_units: optional cap per row (e.g. the cart capacity for the product), None for no cap
+    Returns per-row arrays: units, predicted_units, expected_sales, expected_margin,
+    fill_probability (P(demand <= units)), plus 'unknown' under the 'null' policy
+    """
+    policy = validate_unknown_policy(unknown_policy)
+    if budget_type not in BUDGET_TYPES:
+        raise ValueError(f"budget_type must be one of {BUDGET_TYPES}, got {budget_type!r}")
+
+    flight_index = np.asarray(flight_index, dtype=np.int64).ravel()
+    n_rows = len(flight_index)
+    budget = np.asarray(budget, dtype=np.float64).ravel()
+    if n_rows == 0:
+        raise ValueError("A loading plan needs at least one product")
+    if flight_index.min() < 0 or flight_index.max() >= len(budget):
+        raise ValueError("flight_index must point into budget")
+    if (budget < 0).any():
+        raise ValueError("Budgets must be >= 0")
+
+    costs = np.broadcast_to(np.asarray(unit_cost, dtype=np.float64), (n_rows,))
+    margins = np.broadcast_to(np.asarray(margin, dtype=np.float64), (n_rows,))
+    if budget_type == 'weight':
+        if unit_weight is None:
+            raise ValueError("budget_type 'weight' needs unit_weight for every product")
+        sizes = np.broadcast_to(np.asarray(unit_weight, dtype=np.float64), (n_rows,))
+    else:
+        sizes = costs
+    if (sizes < 0).any() or (margins < 0).any():
+        raise ValueError(f"Margins and unit {budget_type}s must be >= 0")
+
+    features, unknown, categories = predictor._encode_batch(
+        origin, flight_type, service_type, passenger_count, product_name, costs, has_issues
+    )
+    if unknown.any() and policy == 'raise':
+        raise predictor._unknown_category_error(categories)
+
+    known_rows = np.flatnonzero(~unknown)
+    groups = predictor._per_tree_groups(features[known_rows]) if len(known_rows) else []
+    top = max((int(np.rint(per_tree.max())) for _, per_tree in groups), default=0)
+    top = max(top, 1)
+    if max_units is not None:
+        # None entries (NaN once converted) leave that row uncapped
+        cap = np.broadcast_to(np.asarray(max_units, dtype=np.float64), (n_rows,))
+        cap = np.where(np.isnan(cap), np.inf, cap)
+        top = max(1, min(top, int(cap.max()))) if np.isfinite(cap).all() else top
+    if n_rows * top > max_cells:
+        raise PlanTooLargeError(f"Plan of {n_rows} rows x {top} units exceeds the limit of {max_cells} cells")
+
+    # Unknown rows keep an all-zero survival curve and get no units
+    survival = np.zeros((n_rows, top), dtype=np.float64)
+    predicted = np.zeros(n_rows, dtype=np.int64)
+    for rows, per_tree in groups:
+        target = known_rows[rows]
+        survival[target] = demand_survival(per_tree, top)
+        predicted[target] = np.maximum(0, np.rint(per_tree.mean(axis=0))).astype(np.int64)
+    loadable = survival
+    if max_units is not None:
+        loadable = np.where(np.arange(top)[None, :] < cap[:, None], survival, 0)
+
+    units = allocate(loadable, margins, sizes, flight_index, budget)
+    cumulative = np.cumsum(survival, axis=1)
+    expected_sales = np.where(units > 0, cumulative[np.arange(n_rows), np.maximum(units - 1, 0)], 0.0)
+    # P(D <= units) = 1 - P(D >= units + 1); units == top covers every sample
+    next_unit = np.minimum(units, top - 1)
+    fill = np.where(units >= top, 1.0, 1 - survival[np.arange(n_rows), next_unit])
+
+    result = {
+        'units': units,
+        'predicted_units': predicted,
+        'expected_sales': expected_sales,
+        'expected_margin': expected_sales * margins,
+        'fill_probability': fill,
+        'spent': units * sizes,
+    }
+    if unknown.any() and policy == 'null':
+        result['unknown'] = unknown
+    return result
+
+
+def flight_totals(plan, flight_index, budget):
+    """Per-flight sums of a plan: budget used, units, expected sales and margin"""
+    n_flights = len(budget)
+    totals = {name: np.bincount(flight_index, weights=plan[name], minlength=n_flights)
+              for name in ('spent', 'units', 'expected_sales', 'expected_margin')}
+    totals['budget'] = np.asarray(budget, dtype=np.float64)
+    return totals
@@ -0,0 +1,225 @@
+"""
+Single-file, memory-mapped model bundle
+
+The legacy model directory holds three pickles that every process unpickles
+into its own heap. A bundle stores the same model as one file:
+
+    magic (8 bytes) | header length (uint64 LE) | JSON header | arrays
+
+The JSON header carries the format version, the encoder classes, the model
+metadata and the dtype/shape/offset of every FlatForest array, plus a SHA-256
+checksum of the array section. Arrays start on 64-byte boundaries and are
+loaded as read-only views of a memory map, so loading costs a few
+milliseconds and every worker process serving the same file shares the same
+physical pages through the OS page cache.
+
+Bundles are always written to a temporary file and renamed into place:
+processes still mapping the previous file keep reading the old inode.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+try:
+    from .forest_engine import FlatForest
+except ImportError:
+    from forest_engine import FlatForest
+
+BUNDLE_FILENAME = "model.bundle"
+COMPACT_BUNDLE_FILENAME = "compact.bundle"
+# Serving variants of one model directory: the full forest and its compressed copy (see model_compression)
+VARIANT_FILENAMES = {'full': BUNDLE_FILENAME, 'compact': COMPACT_BUNDLE_FILENAME}
+MODEL_VARIANTS = tuple(VARIANT_FILENAMES)
+BUNDLE_MAGIC = b"AIRMODEL"
+BUNDLE_FORMAT_VERSION = 1
+
+FOREST_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'is_leaf')
+_ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sQ')
+
+
+class BundleFormatError(ValueError):
+    """The file is not a model bundle, uses an unsupported version or fails its checksum"""
+
+
+class ModelBundle:
+    """
+    Contents of a loaded bundle
+    forest arrays are read-only views of the memory map held in self._mmap
+    """
+
+    def __init__(self, path, flat_forest, encoder_classes, metadata, format_version, checksum, mapped_bytes, _mmap=None):
+        self.path = path
+        self.flat_forest = flat_forest
+        self.encoder_classes = encoder_classes
+        self.metadata = metadata
+        self.format_version = format_version
+        self.checksum = checksum
+        self.mapped_bytes = mapped_bytes
+        self._mmap = _mmap
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def validate_variant(variant):
+    if variant not in VARIANT_FILENAMES:
+        raise ValueError(f"Unknown model variant {variant!r}; expected one of {MODEL_VARIANTS}")
+    return variant
+
+
+def resolve_bundle_path(model_path, variant='full'):
+    """
+    Bundle file for a model path: the path itself if it is a file, the
+    variant's bundle (model.bundle for 'full') for a directory; None if no bundle exists
+    """
+    if os.path.isfile(model_path):
+        return model_path
+    candidate = os.path.join(model_path, VARIANT_FILENAMES[validate_variant(variant)])
+    return candidate if os.path.isfile(candidate) else None
+
+
+def save_bundle(path, flat_forest, encoder_classes, metadata):
+    """
+    Write a bundle atomically
+    encoder_classes: {feature: list of classes}; metadata: JSON-serialisable dict
+    Returns the hex checksum of the array section
+    """
+    arrays = {name: np.ascontiguousarray(getattr(flat_forest, name)) for name in FOREST_ARRAYS}
+
+    # Array offsets are relative to the start of the (aligned) array section
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    payload = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        payload[start:start + array.nbytes] = array.tobytes()
+    checksum = hashlib.sha256(payload).hexdigest()
+
+    header = json.dumps({
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'checksum': checksum,
+        'arrays': layout,
+        'forest': {'max_depth': flat_forest.max_depth, 'n_features': flat_forest.n_features},
+        'encoder_classes': {feature: [_json_value(value) for value in classes]
+                            for feature, classes in encoder_classes.items()},
+        'metadata': metadata,
+    }).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREAMBLE.pack(BUNDLE_MAGIC, len(header)))
+            f.write(header)
+            f.write(b'\0' * (data_start - _PREAMBLE.size - len(header)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return checksum
+
+
+def _json_value(value):
+    # numpy scalars coming from LabelEncoder.classes_ are not JSON serialisable
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def load_bundle(path, verify=True):
+    """
+    Memory-map a bundle and return a ModelBundle
+    verify: check the SHA-256 of the array section (reads every page once)
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped) < _PREAMBLE.size:
+        raise BundleFormatError(f"'{path}' is too small to be a model bundle")
+    magic, header_length = _PREAMBLE.unpack_from(mapped, 0)
+    if magic != BUNDLE_MAGIC:
+        raise BundleFormatError(f"'{path}' is not a model bundle")
+    try:
+        header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_length].decode('utf-8'))
+    except ValueError as e:
+        raise BundleFormatError(f"Corrupt bundle header in '{path}': {e}")
+    if header.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise BundleFormatError(
+            f"Unsupported bundle format version {header.get('format_version')} "
+            f"(expected {BUNDLE_FORMAT_VERSION})")
+
+    data_start = _align(_PREAMBLE.size + header_length)
+    if verify:
+        checksum = hashlib.sha256(memoryview(mapped)[data_start:]).hexdigest()
+        if checksum != header['checksum']:
+            raise BundleFormatError(f"Checksum mismatch in '{path}'")
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(spec['shape'])
+
+    flat_forest = FlatForest(
+        feature=arrays['feature'],
+        threshold=arrays['threshold'],
+        left=arrays['left'],
+        right=arrays['right'],
+        value=arrays['value'],
+        roots=arrays['roots'],
+        max_depth=header['forest']['max_depth'],
+        n_features=header['forest']['n_features'],
+        is_leaf=arrays['is_leaf'],
+    )
+    return ModelBundle(
+        path=path,
+        flat_forest=flat_forest,
+        encoder_classes=header['encoder_classes'],
+        metadata=header['metadata'],
+        format_version=header['format_version'],
+        checksum=header['checksum'],
+        mapped_bytes=len(mapped),
+        _mmap=mapped,
+    )
+
+
+def main():
+    """
+    Convert a legacy model directory into a bundle
+    Usage: python -m aidata.model_bundle <model_dir> [bundle_path]
+    """
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return 1
+
+    try:
+        from .consumption_predictor import ConsumptionPredictor
+    except ImportError:
+        from consumption_predictor import ConsumptionPredictor
+
+    model_dir = sys.argv[1]
+    bundle_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(model_dir, BUNDLE_FILENAME)
+    predictor = ConsumptionPredictor()
+    if not predictor.load_model(model_dir) or not predictor.save_bundle(bundle_path):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Compact forest for latency-critical serving
+
+The production forest has fully grown trees: the bundle is large and every
+prediction walks deep paths (FlatForest.apply runs one step per tree level).
+This tool builds smaller candidates from the served model and publishes the
+best one as the 'compact' serving variant (from backend/):
+
+    python -m aidata.model_compression --model-dir airline_consumption_model --tolerance 0.02
+
+prune:   the first N trees of the full forest cut at depth D (internal nodes
+         already hold the mean of their samples, so a cut node becomes a leaf
+         with that value; no refitting)
+distill: a small forest (N trees, depth D) fitted on the full model's
+         predictions for the training rows plus passenger-count jittered copies
+
+Candidates are scored on the holdout of train_random_forest (the same 80/20
+split of the dataset) against the full model. The smallest candidate (fewest
+nodes, which bounds bundle size, load time and the work of every walk) whose
+holdout MAE is within --tolerance of the full model's is written to
+<model-dir>/compact.bundle, with the checksum of the full bundle it came from
+so a retrained full model never serves a stale compact copy. Serving picks it
+with MODEL_VARIANT=compact.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+
+try:
+    from .consumption_predictor import ConsumptionPredictor
+    from .feature_cache import DEFAULT_CACHE_DIR
+    from .forest_engine import FlatForest, export_forest
+    from . import model_bundle
+    from .Random_Forest_Regression import AirlineConsumptionPredictor
+except ImportError:
+    from consumption_predictor import ConsumptionPredictor
+    from feature_cache import DEFAULT_CACHE_DIR
+    from forest_engine import FlatForest, export_forest
+    import model_bundle
+    from Random_Forest_Regression import AirlineConsumptionPredictor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = "airline_consumption_model"
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv')
+
+PRUNE_TREES = (10, 25, 50)
+PRUNE_DEPTHS = (8, 12, 16, None)
+DISTILL_TREES = (10, 25)
+DISTILL_DEPTHS = (8, 12, 16)
+DEFAULT_TOLERANCE = 0.02
+
+
+def prune_forest(forest, n_trees=None, max_depth=None):
+    """
+    FlatForest with the first n_trees trees of forest, each cut at max_depth
+    Nodes at max_depth become leaves predicting their stored mean
+    """
+    n_trees = forest.n_trees if n_trees is None else min(n_trees, forest.n_trees)
+    end = int(forest.roots[n_trees]) if n_trees < forest.n_trees else forest.n_nodes
+    left, right = np.asarray(forest.left[:end]), np.asarray(forest.right[:end])
+    is_leaf = np.asarray(forest.is_leaf[:end])
+
+    # Level by level over all trees at once; nodes never reached stay at depth -1
+    depth = np.full(end, -1, dtype=np.int64)
+    frontier = np.asarray(forest.roots[:n_trees], dtype=np.int64)
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        if max_depth is not None and level == max_depth:
+            break
+        internal = frontier[~is_leaf[frontier]]
+        frontier = np.concatenate([left[internal], right[internal]])
+        level += 1
+
+    keep = depth >= 0
+    new_id = np.cumsum(keep) - 1
+    leaf = is_leaf[keep] | (depth[keep] == max_depth if max_depth is not None else False)
+    own_ids = np.arange(int(keep.sum()), dtype=np.int64)
+    return FlatForest(
+        feature=np.where(leaf, 0, np.asarray(forest.feature[:end])[keep]),
+        threshold=np.where(leaf, np.inf, np.asarray(forest.threshold[:end])[keep]),
+        left=np.where(leaf, own_ids, new_id[left[keep]]),
+        right=np.where(leaf, own_ids, new_id[right[keep]]),
+        value=np.asarray(forest.value[:end])[keep].copy(),
+        roots=new_id[np.asarray(forest.roots[:n_trees])],
+        max_depth=int(depth.max()),
+        n_features=forest.n_features,
+        is_leaf=leaf,
+    )
+
+
+def distill_forest(teacher, X_train, feature_columns, n_trees, max_depth, augment=2, random_state=42):
+    """
+    FlatForest of a small RandomForestRegressor fitted on the teacher's predictions
+    The training rows are repeated augment times with Passenger_Count jittered
+    within its observed range, so the student sees more of the teacher's surface
+    """
+    rng = np.random.default_rng(random_state)
+    passengers = feature_columns.index('Passenger_Count')
+    low, high = X_train[:, passengers].min(), X_train[:, passengers].max()
+    copies = [X_train]
+    for _ in range(augment):
+        jittered = X_train.copy()
+        jittered[:, passengers] = rng.integers(int(low), int(high) + 1, len(X_train))
+        copies.append(jittered)
+    X = np.vstack(copies)
+    student = RandomForestRegressor(n_estimators=n_trees, max_depth=max_depth, random_state=random_state, n_jobs=1)
+    student.fit(X, teacher.predict(X))
+    return export_forest(student)
+
+
+def holdout_split(model_dir, dataset_path=DEFAULT_DATASET, feature_cache_dir=DEFAULT_CACHE_DIR):
+    """
+    (teacher, X_train, X_test, y_test): the served full model and the 80/20 split
+    train_random_forest used, encoded with the model's own categories
+    """
+    teacher = ConsumptionPredictor.load_trained_model(model_dir, engine='flat', segments=False)
+    if teacher is None:
+        raise FileNotFoundError(f"No model to compress in '{model_dir}'")
+
+    data = AirlineConsumptionPredictor(dataset_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data.prepare_features(cache_dir=feature_cache_dir)
+    for feature, table in teacher.encoding_tables.items():
+        if data.encoding_tables[feature].classes.tolist() != table.classes.tolist():
+            raise ValueError(f"The model's {feature} categories differ from '{dataset_path}'; "
+                             f"compress with the dataset it was trained on")
+    X = data.df_final[teacher.feature_columns].values.astype(np.float64)
+    y = data.df_final[teacher.target_column].values.astype(np.float64)
+    X_train, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    return teacher, X_train, X_test, y_test
+
+
+def _latency_ms(fn, repeats, warmup=3):
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings[i] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def measure(forest, X_test, y_test, work_dir, name, repeats=200):
+    """Accuracy, size, bundle load time and latency of one forest"""
+    predictions = forest.predict(X_test)
+    path = os.path.join(work_dir, f"{name}.bundle")
+    model_bundle.save_bundle(path, forest, {}, {})
+    load_ms = np.median(_latency_ms(lambda: model_bundle.load_bundle(path), 10, warmup=1))
+    row = _latency_ms(lambda: forest.predict(X_test[:1]), repeats)
+    batch = _latency_ms(lambda: forest.predict(X_test), max(10, repeats // 10))
+    return {
+        'n_trees': forest.n_trees,
+        'max_depth': forest.max_depth,
+        'nodes': forest.n_nodes,
+        'size_kb': round(os.path.getsize(path) / 1024, 1),
+        'load_ms': round(float(load_ms), 3),
+        'row_p99_ms': round(float(np.percentile(row, 99)), 4),
+        'batch_p99_ms': round(float(np.percentile(batch, 99)), 4),
+        'mae': round(float(mean_absolute_error(y_test, predictions)), 4),
+        'r2': round(float(r2_score(y_test, predictions)), 4),
+    }
+
+
+def build_candidates(teacher, X_train, feature_columns, prune_trees=PRUNE_TREES, prune_depths=PRUNE_DEPTHS,
+                     distill_trees=DISTILL_TREES, distill_depths=DISTILL_DEPTHS):
+    """[(name, method, FlatForest)] for every pruning and distillation setting"""
+    full = teacher.flat_forest
+    candidates = []
+    for n_trees in prune_trees:
+        for max_depth in prune_depths:
+            if n_trees >= full.n_trees and (max_depth is None or max_depth >= full.max_depth):
+                continue
+            candidates.append((f"prune-t{n_trees}-d{max_depth or 'full'}", 'prune',
+                               prune_forest(full, n_trees, max_depth)))
+    for n_trees in distill_trees:
+        for max_depth in distill_depths:
+            candidates.append((f"distill-t{n_trees}-d{max_depth}", 'distill',
+                               distill_forest(full, X_train, feature_columns, n_trees, max_depth)))
+    return candidates
+
+
+def _write_full_bundle(teacher, model_dir):
+    """
+    Bundle of a teacher loaded from legacy pickles, written next to them: the
+    compact bundle records its checksum, which serving compares to pick a fresh variant
+    """
+    path = os.path.join(model_dir, model_bundle.BUNDLE_FILENAME)
+    with contextlib.redirect_stdout(io.StringIO()):
+        saved = teacher.save_bundle(path)
+    if not saved:
+        raise OSError(f"Could not write the full model bundle '{path}'")
+    logger.info(f"✅ Full model bundle written to '{path}' from the legacy pickles")
+    return model_bundle.load_bundle(path)
+
+
+def compress(model_dir=DEFAULT_MODEL_DIR, dataset_path=DEFAULT_DATASET, tolerance=DEFAULT_TOLERANCE,
+             feature_cache_dir=DEFAULT_CACHE_DIR, repeats=200, publish=True):
+    """
+    Score every candidate against the full model and publish the smallest one within tolerance
+    Returns the report: {'full', 'candidates', 'selected', 'published'}
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        teacher, X_train, X_test, y_test = holdout_split(model_dir, dataset_path, feature_cache_dir)
+    candidates = build_candidates(teacher, X_train, teacher.feature_columns)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        full = measure(teacher.flat_forest, X_test, y_test, work_dir, 'full', repeats)
+        scored = []
+        for name, method, forest in candidates:
+            scores = measure(forest, X_test, y_test, work_dir, name, repeats)
+            scores.update({
+                'name': name,
+                'method': method,
+                'mae_delta_pct': round((scores['mae'] / full['mae'] - 1) * 100, 2) if full['mae'] else 0.0,
+                'r2_delta': round(scores['r2'] - full['r2'], 4),
+                'size_ratio': round(scores['size_kb'] / full['size_kb'], 3),
+            })
+            scores['within_tolerance'] = scores['mae'] <= full['mae'] * (1 + tolerance)
+            scored.append((scores, forest))
+
+    passing = [(scores, forest) for scores, forest in scored if scores['within_tolerance']]
+    report = {
+        'tolerance': tolerance,
+        'holdout_rows': len(y_test),
+        'full': full,
+        'candidates': [scores for scores, _ in scored],
+        'selected': None,
+        'published': None,
+    }
+    if not passing:
+        logger.warning(f"⚠️ No candidate within {tolerance:.1%} of the full model's holdout MAE")
+        return report
+
+    selected, forest = min(passing, key=lambda item: (item[0]['nodes'], item[0]['mae']))
+    report['selected'] = selected['name']
+    if publish:
+        bundle = teacher.bundle or _write_full_bundle(teacher, model_dir)
+        metadata = dict(bundle.metadata, variant='compact', source_checksum=bundle.checksum,
+                        compression={key: selected[key] for key in
+                                     ('name', 'method', 'n_trees', 'max_depth', 'mae', 'r2',
+                                      'mae_delta_pct', 'r2_delta')},
+                        full_holdout={'mae': full['mae'], 'r2': full['r2']})
+        path = os.path.join(model_dir, model_bundle.COMPACT_BUNDLE_FILENAME)
+        model_bundle.save_bundle(path, forest, bundle.encoder_classes, metadata)
+        report['published'] = path
+        logger.info(f"✅ Compact model {selected['name']} published to '{path}' "
+                    f"({selected['size_kb']:.0f} KB vs {full['size_kb']:.0f} KB, "
+                    f"MAE {selected['mae_delta_pct']:+.2f}%)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--feature-cache', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="accepted relative holdout MAE increase over the full model")
+    parser.add_argument('--repeats', type=int, default=200, help="single-row predictions timed per candidate")
+    parser.add_argument('--dry-run', action='store_true', help="report only, do not write compact.bundle")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = compress(args.model_dir, args.dataset, args.tolerance, args.feature_cache,
+                          args.repeats, publish=not args.dry_run)
+    except Exception as e:
+        logger.error(f"❌ Compression failed: {type(e).__name__}: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    full = report['full']
+    print(f"Full model: {full['n_trees']} trees, depth {full['max_depth']}, {full['size_kb']:.0f} KB, "
+          f"load {full['load_ms']:.2f} ms, row p99 {full['row_p99_ms']:.3f} ms, "
+          f"MAE {full['mae']:.3f}, R² {full['r2']:.4f} ({report['holdout_rows']} holdout rows)")
+    print(f"{'Candidate':<22} {'KB':>8} {'load ms':>8} {'row p99':>9} {'batch p99':>10} | "
+          f"{'MAE':>7} {'ΔMAE %':>7} {'R²':>7} {'ΔR²':>8}")
+    print("-" * 100)
+    for c in report['candidates']:
+        marker = '*' if c['name'] == report['selected'] else ('' if c['within_tolerance'] else ' x')
+        print(f"{c['name']:<22} {c['size_kb']:>8.1f} {c['load_ms']:>8.2f} {c['row_p99_ms']:>7.3f}ms "
+              f"{c['batch_p99_ms']:>8.3f}ms | {c['mae']:>7.3f} {c['mae_delta_pct']:>+7.2f} "
+              f"{c['r2']:>7.4f} {c['r2_delta']:>+8.4f} {marker}")
+    print("-" * 100)
+    if report['selected'] is None:
+        print(f"No candidate within {report['tolerance']:.1%} of the full model's MAE (x = outside tolerance)")
+    else:
+        print(f"Selected {report['selected']} (*){'' if report['published'] else ' (dry run, not written)'}; "
+              f"serve it with MODEL_VARIANT=compact")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Process-wide registry for the trained consumption model
+
+Loads each model version once per process, warms it up with a dummy prediction
+and serves it to every request. A background thread watches the model directory
+and swaps in a new version when the files change; requests that already hold
+the previous predictor keep using it until they finish.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    from .consumption_predictor import ConsumptionPredictor
+    from .model_bundle import BUNDLE_FILENAME, VARIANT_FILENAMES, validate_variant
+    from .prediction_grid import GRID_FILENAME, PredictionGrid
+    from .segment_models import MANIFEST_FILENAME, SEGMENTS_DIRNAME
+except ImportError:
+    from consumption_predictor import ConsumptionPredictor
+    from model_bundle import BUNDLE_FILENAME, VARIANT_FILENAMES, validate_variant
+    from prediction_grid import GRID_FILENAME, PredictionGrid
+    from segment_models import MANIFEST_FILENAME, SEGMENTS_DIRNAME
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ("random_forest_model.pkl", "label_encoders.pkl", "model_metadata.pkl")
+
+
+def model_signature(model_dir, variant='full', prediction_grid=False):
+    """
+    Fingerprint of the model files (name, size, mtime): the bundle when the
+    directory has one, the legacy pickles otherwise, plus the variant's bundle,
+    the segment manifest and (prediction_grid=True) the prediction grid when present
+    Returns None while any of the required files is missing
+    """
+    names = (BUNDLE_FILENAME,) if os.path.isfile(os.path.join(model_dir, BUNDLE_FILENAME)) else MODEL_FILES
+    variant_file = VARIANT_FILENAMES[variant]
+    if variant_file != BUNDLE_FILENAME and os.path.isfile(os.path.join(model_dir, variant_file)):
+        names = names + (variant_file,)
+    segment_manifest = os.path.join(SEGMENTS_DIRNAME, MANIFEST_FILENAME)
+    if os.path.isfile(os.path.join(model_dir, segment_manifest)):
+        names = names + (segment_manifest,)
+    if prediction_grid and os.path.isfile(os.path.join(model_dir, GRID_FILENAME)):
+        names = names + (GRID_FILENAME,)
+    parts = []
+    for name in names:
+        path = os.path.join(model_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def forest_native_nbytes(model):
+    """
+    Bytes held by the fitted trees outside the Python heap
+    (sklearn keeps node and value arrays in C memory that tracemalloc cannot see)
+    """
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators:
+        return 0
+    node_itemsize = estimators[0].tree_.__getstate__()['nodes'].itemsize
+    return sum(est.tree_.node_count * node_itemsize + est.tree_.value.nbytes
+               for est in estimators)
+
+
+def model_private_nbytes(predictor):
+    """
+    Private memory of a loaded predictor, from the sizes of its arrays: the sklearn
+    forest, a flat forest compiled from it and the prediction grid (bundle and
+    segment forests are memory-mapped, shared page cache)
+    """
+    nbytes = forest_native_nbytes(predictor.model)
+    if predictor.bundle is None and predictor.flat_forest is not None:
+        nbytes += predictor.flat_forest.nbytes
+    if predictor.prediction_grid is not None:
+        nbytes += predictor.prediction_grid.nbytes
+    return nbytes
+
+
+class LoadedModel:
+    """
+    A predictor together with its version and load statistics
+    """
+
+    def __init__(self, predictor, version, load_time_s, memory_bytes, warmup_time_s, mapped_bytes=0):
+        self.predictor = predictor
+        self.version = version
+        self.load_time_s = load_time_s
+        self.memory_bytes = memory_bytes
+        self.mapped_bytes = mapped_bytes
+        self.warmup_time_s = warmup_time_s
+        self.loaded_at = datetime.now()
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(timespec='seconds'),
+            'load_time_ms': round(self.load_time_s * 1000, 2),
+            'warmup_time_ms': round(self.warmup_time_s * 1000, 2),
+            'memory_bytes': self.memory_bytes,
+            'memory_mb': round(self.memory_bytes / (1024 * 1024), 2),
+            'format': 'bundle' if self.mapped_bytes else 'pickle',
+            'variant': self.predictor.bundle.metadata.get('variant', 'full') if self.predictor.bundle else 'full',
+            'prediction_grid': self.predictor.prediction_grid is not None,
+            'segment_models': len(self.predictor.segment_router.forests) if self.predictor.segment_router else 0,
+            'mapped_mb': round(self.mapped_bytes / (1024 * 1024), 2),
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the current model version for the whole process
+    Usage:
+        registry = ModelRegistry("airline_consumption_model", prediction_cache=PredictionCache())
+        registry.load()
+        registry.start_watching()
+        predictor = registry.get_predictor()
+    variant: 'full' or 'compact' (the compressed forest, when one matches the full model)
+    trace_memory: measure each load with tracemalloc (debugging only: it traces
+    every allocation of the whole process while the model loads)
+    """
+
+    def __init__(self, model_dir, poll_interval=5.0, prediction_cache=None, use_prediction_grid=False,
+                 variant='full', trace_memory=False):
+        self.model_dir = model_dir
+        self.variant = validate_variant(variant)
+        self.poll_interval = poll_interval
+        self.prediction_cache = prediction_cache
+        self.use_prediction_grid = use_prediction_grid
+        self.trace_memory = trace_memory
+        self._current = None
+        self._lock = threading.Lock()
+        self._watch_thread = None
+        self._stop_event = threading.Event()
+        self.reload_count = 0
+        self.last_error = None
+        self._failed_version = None
+
+    def get_predictor(self):
+        """Current predictor, or None if no model has been loaded yet"""
+        current = self._current
+        return current.predictor if current is not None else None
+
+    @property
+    def version(self):
+        current = self._current
+        return current.version if current is not None else None
+
+    def load(self):
+        """
+        Load the model directory if its version differs from the one being served
+        Returns True when a model is available after the call
+        """
+        with self._lock:
+            version = model_signature(self.model_dir, self.variant, self.use_prediction_grid)
+            if version is None:
+                self.last_error = f"Missing model files in '{self.model_dir}'"
+                logger.warning(f"⚠️ {self.last_error}")
+                return self._current is not None
+
+            if self._current is not None and self._current.version == version:
+                return True
+
+            loaded = self._load_version(version)
+            if loaded is None:
+                self._failed_version = version
+                return self._current is not None
+
+            # Single reference swap: in-flight requests keep the old predictor,
+            # and their cache traffic is ignored once the cache moves to the new version
+            previous = self._current
+            self._current = loaded
+            if self.prediction_cache is not None:
+                self.prediction_cache.set_version(version)
+            if previous is not None:
+                self.reload_count += 1
+            self.last_error = None
+            logger.info(f"✅ Model version {version} ready "
+                        f"(load {loaded.load_time_s * 1000:.0f} ms, "
+                        f"{loaded.memory_bytes / (1024 * 1024):.1f} MB)")
+            return True
+
+    def _load_version(self, version):
+        was_tracing = self.trace_memory and tracemalloc.is_tracing()
+        if self.trace_memory and not was_tracing:
+            tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        start = time.perf_counter()
+        try:
+            predictor = ConsumptionPredictor.load_trained_model(self.model_dir, variant=self.variant)
+        finally:
+            load_time_s = time.perf_counter() - start
+            traced_bytes = tracemalloc.get_traced_memory()[0] - traced_before if self.trace_memory else 0
+            if self.trace_memory and not was_tracing:
+                tracemalloc.stop()
+
+        if predictor is None:
+            self.last_error = f"Could not load model version {version} from '{self.model_dir}'"
+            logger.error(f"❌ {self.last_error}")
+            return None
+
+        if self.use_prediction_grid:
+            self._attach_grid(predictor, version)
+
+        start = time.perf_counter()
+        try:
+            self._warm_up(predictor)
+        except Exception as e:
+            self.last_error = f"Warm-up failed for model version {version}: {e}"
+            logger.error(f"❌ {self.last_error}")
+            return None
+        warmup_time_s = time.perf_counter() - start
+
+        predictor.model_version = version
+        predictor.prediction_cache = self.prediction_cache
+        # Bundle arrays are memory-mapped (shared page cache), reported separately from private memory
+        if self.trace_memory:
+            memory_bytes = max(0, traced_bytes) + forest_native_nbytes(predictor.model)
+            if predictor.prediction_grid is not None:
+                memory_bytes += predictor.prediction_grid.nbytes
+        else:
+            memory_bytes = model_private_nbytes(predictor)
+        mapped_bytes = predictor.bundle.mapped_bytes if predictor.bundle is not None else 0
+        return LoadedModel(predictor, version, load_time_s, memory_bytes, warmup_time_s, mapped_bytes)
+
+    def _attach_grid(self, predictor, version):
+        """Serve from the precomputed grid when one matching this model exists; the forest otherwise"""
+        grid_path = os.path.join(self.model_dir, GRID_FILENAME)
+        if not os.path.isfile(grid_path):
+            logger.warning(f"⚠️ No prediction grid in '{self.model_dir}', serving from the forest")
+            return
+        try:
+            predictor.attach_grid(PredictionGrid.load(grid_path))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Prediction grid not used for model version {version}: {e}")
+
+    @staticmethod
+    def _warm_up(predictor):
+        """Run one dummy prediction so the first real request pays no lazy-init cost"""
+        tables = predictor.encoding_tables
+        predictor.predict_consumption_batch(
+            origin=tables['Origin'].classes[0],
+            flight_type=tables['Flight_Type'].classes[0],
+            service_type=tables['Service_Type'].classes[0],
+            passenger_count=100,
+            product_name=tables['Product_Name'].classes[0],
+            unit_cost=1.0,
+            has_issues=0
+        )
+
+    def start_watching(self):
+        """Start the background thread that reloads the model when its files change"""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, name="model-registry-watcher", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        self._stop_event.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=self.poll_interval + 1)
+            self._watch_thread = None
+
+    def _watch_loop(self):
+        pending = None
+        while not self._stop_event.wait(self.poll_interval):
+            signature = model_signature(self.model_dir, self.variant, self.use_prediction_grid)
+            if signature is None or signature in (self.version, self._failed_version):
+                pending = None
+                continue
+            # Only load once the files have stopped changing for a full interval,
+            # so a model that is still being written is never picked up
+            if signature != pending:
+                pending = signature
+                continue
+            try:
+                self.load()
+            except Exception as e:
+                self.last_error = f"Reload failed: {e}"
+                logger.error(f"❌ {self.last_error}")
+            pending = None
+
+    def status(self):
+        current = self._current
+        status = {
+            'model_dir': self.model_dir,
+            'requested_variant': self.variant,
+            'loaded': current is not None,
+            'watching': self._watch_thread is not None and self._watch_thread.is_alive(),
+            'reloads': self.reload_count,
+            'last_error': self.last_error,
+        }
+        if current is not None:
+            status.update(current.to_dict())
+        return status
@@ -0,0 +1,107 @@
+"""
+Bounded LRU cache with TTL for forest predictions
+
+Keys are the encoded feature rows (origin, flight_type, service_type,
+passenger_count, product, unit_cost, has_issues) plus the model version.
+The cache is bound to one model version at a time: when the registry serves
+a new version every entry is dropped, and lookups or stores made for any
+other version bypass the cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache of raw forest predictions
+    """
+
+    def __init__(self, maxsize=10000, ttl_seconds=3600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.version = None
+        self._entries = OrderedDict()  # key -> (prediction, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def set_version(self, version):
+        """Bind the cache to a model version, dropping entries of the previous one"""
+        with self._lock:
+            if version == self.version:
+                return
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    @staticmethod
+    def make_key(feature_row, version):
+        return tuple(feature_row) + (version,)
+
+    def get_many(self, feature_rows, version):
+        """
+        Cached prediction for each feature row, None where there is no live entry
+        """
+        if version != self.version:
+            with self._lock:
+                self.misses += len(feature_rows)
+            return [None] * len(feature_rows)
+
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for row in feature_rows:
+                key = self.make_key(row, version)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                elif entry[1] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append(entry[0])
+        return results
+
+    def put_many(self, feature_rows, predictions, version):
+        if version != self.version:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for row, prediction in zip(feature_rows, predictions):
+                key = self.make_key(row, version)
+                self._entries[key] = (prediction, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_version': self.version,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,264 @@
+"""
+Precomputed dense prediction grid
+
+The encoders know only a few origins, flight types, service types and
+products, each product has one catalogue unit cost, and passenger counts lie
+in a bounded range. build_grid() evaluates the forest once over
+
+    origin x flight_type x service_type x product x has_issues x passenger bucket
+
+and stores the raw predictions as a float32 array. At serving time a row is a
+direct index into that array, interpolating linearly between the two nearest
+passenger buckets. With the default one-passenger step the grid reproduces
+the forest for every whole passenger count; coarser steps shrink the array at
+the cost of interpolation error, which the accuracy report written by the
+offline job quantifies. Rows outside the grid (unit cost different from the
+product's catalogue cost, passenger count out of range) are left to the
+forest.
+
+Offline job (from backend/):
+    python -m aidata.prediction_grid --model-dir airline_consumption_model
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+try:
+    from .forest_engine import export_forest
+except ImportError:
+    from forest_engine import export_forest
+
+GRID_FILENAME = "prediction_grid.npz"
+GRID_FEATURES = ('Origin', 'Flight_Type', 'Service_Type', 'Product_Name')
+
+DEFAULT_PASSENGER_RANGE = (50, 450)
+DEFAULT_PASSENGER_STEP = 1
+UNIT_COST_TOLERANCE = 1e-6
+
+
+class GridMismatchError(ValueError):
+    """The grid was built for a different model or different encoders"""
+
+
+def forest_fingerprint(predictor):
+    """Short hash of the forests the predictor serves (split features, thresholds and leaf values)"""
+    flat_forest = predictor.flat_forest if predictor.flat_forest is not None else export_forest(predictor.model)
+    digest = hashlib.sha256()
+    arrays = [flat_forest.feature, flat_forest.threshold, flat_forest.value]
+    if getattr(predictor, 'segment_router', None) is not None:
+        arrays += predictor.segment_router.fingerprint_arrays()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def canonical_unit_costs(df, product_classes):
+    """Most frequent Unit_Cost of each product, in encoder order"""
+    costs = df.groupby('Product_Name')['Unit_Cost'].agg(lambda values: values.mode().iloc[0])
+    missing = [product for product in product_classes if product not in costs.index]
+    if missing:
+        raise ValueError(f"No unit cost in the dataset for products: {missing}")
+    return np.array([costs[product] for product in product_classes], dtype=np.float64)
+
+
+class PredictionGrid:
+    """
+    Dense table of raw forest predictions indexed by encoded category codes
+    values: float32 array shaped (origin, flight_type, service_type, product, has_issues, passenger bucket)
+    """
+
+    def __init__(self, values, passenger_points, unit_costs, encoder_classes, fingerprint, report=None):
+        self.values = values
+        self.passenger_points = np.asarray(passenger_points, dtype=np.float64)
+        self.unit_costs = np.asarray(unit_costs, dtype=np.float64)
+        self.encoder_classes = encoder_classes
+        self.fingerprint = fingerprint
+        self.report = report
+        self.passenger_min = self.passenger_points[0]
+        self.passenger_max = self.passenger_points[-1]
+        self.passenger_step = self.passenger_points[1] - self.passenger_points[0] if len(self.passenger_points) > 1 else 1.0
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def lookup(self, features):
+        """
+        Raw predictions for an encoded feature matrix
+        Returns (predictions, on_grid mask); predictions are NaN where the row is off-grid
+        """
+        features = np.asarray(features, dtype=np.float64)
+        origins, flight_types, service_types, passengers, products, unit_costs, issues = features.T
+        codes = [origins, flight_types, service_types, products, issues]
+        int_codes = [code.astype(np.int64) for code in codes]
+
+        on_grid = (passengers >= self.passenger_min) & (passengers <= self.passenger_max)
+        for code, int_code, size in zip(codes, int_codes, self.values.shape[:5]):
+            on_grid &= (code == int_code) & (int_code >= 0) & (int_code < size)
+        product_codes = np.where(on_grid, int_codes[3], 0)
+        on_grid &= np.abs(unit_costs - self.unit_costs[product_codes]) <= UNIT_COST_TOLERANCE
+
+        predictions = np.full(len(features), np.nan)
+        if not on_grid.any():
+            return predictions, on_grid
+
+        cells = tuple(int_code[on_grid] for int_code in int_codes)
+        position = (passengers[on_grid] - self.passenger_min) / self.passenger_step
+        lower = np.minimum(np.floor(position).astype(np.int64), len(self.passenger_points) - 1)
+        upper = np.minimum(lower + 1, len(self.passenger_points) - 1)
+        fraction = position - lower
+        predictions[on_grid] = (self.values[cells + (lower,)] * (1 - fraction)
+                                + self.values[cells + (upper,)] * fraction)
+        return predictions, on_grid
+
+    def check_compatible(self, predictor):
+        """Raise GridMismatchError unless the grid was built from this predictor's model"""
+        for feature in GRID_FEATURES:
+            if predictor.encoding_tables[feature].classes.tolist() != self.encoder_classes[feature]:
+                raise GridMismatchError(f"Grid was built with different {feature} categories")
+        fingerprint = forest_fingerprint(predictor)
+        if fingerprint != self.fingerprint:
+            raise GridMismatchError(f"Grid was built for forest {self.fingerprint}, model is {fingerprint}")
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(
+            tmp_path,
+            values=self.values,
+            passenger_points=self.passenger_points,
+            unit_costs=self.unit_costs,
+            info=np.array(json.dumps({
+                'encoder_classes': self.encoder_classes,
+                'fingerprint': self.fingerprint,
+                'report': self.report,
+            })),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            info = json.loads(str(data['info']))
+            return cls(
+                values=data['values'],
+                passenger_points=data['passenger_points'],
+                unit_costs=data['unit_costs'],
+                encoder_classes=info['encoder_classes'],
+                fingerprint=info['fingerprint'],
+                report=info.get('report'),
+            )
+
+
+def build_grid(predictor, unit_costs, passenger_range=DEFAULT_PASSENGER_RANGE,
+               passenger_step=DEFAULT_PASSENGER_STEP):
+    """
+    Evaluate the predictor's forest over the full category x passenger grid
+    unit_costs: catalogue cost per product code (see canonical_unit_costs)
+    """
+    tables = predictor.encoding_tables
+    passenger_points = np.arange(passenger_range[0], passenger_range[1] + passenger_step, passenger_step,
+                                 dtype=np.float64)
+    passenger_points = passenger_points[passenger_points <= passenger_range[1]]
+    shape = tuple(len(tables[feature]) for feature in GRID_FEATURES) + (2, len(passenger_points))
+
+    origins, flight_types, service_types, products, issues, buckets = np.indices(shape).reshape(len(shape), -1)
+    features = np.column_stack([
+        origins, flight_types, service_types, passenger_points[buckets],
+        products, np.asarray(unit_costs)[products], issues
+    ]).astype(float)
+    values = predictor._predict_features(features).astype(np.float32).reshape(shape)
+
+    return PredictionGrid(
+        values=values,
+        passenger_points=passenger_points,
+        unit_costs=unit_costs,
+        encoder_classes={feature: tables[feature].classes.tolist() for feature in GRID_FEATURES},
+        fingerprint=forest_fingerprint(predictor),
+    )
+
+
+def accuracy_report(grid, predictor, features):
+    """
+    Compare grid lookups with direct forest predictions on encoded feature rows
+    Returns coverage, raw prediction errors and the share of identical rounded units
+    """
+    grid_values, on_grid = grid.lookup(features)
+    report = {'rows': len(features), 'on_grid_rows': int(on_grid.sum()),
+              'coverage': round(float(on_grid.mean()), 4) if len(features) else 0.0}
+    if on_grid.any():
+        forest_values = predictor._predict_features(features[on_grid])
+        errors = np.abs(grid_values[on_grid] - forest_values)
+        grid_units = np.maximum(0, np.rint(grid_values[on_grid]))
+        forest_units = np.maximum(0, np.rint(forest_values))
+        report.update({
+            'mean_abs_error': round(float(errors.mean()), 4),
+            'p99_abs_error': round(float(np.percentile(errors, 99)), 4),
+            'max_abs_error': round(float(errors.max()), 4),
+            'exact_unit_rate': round(float((grid_units == forest_units).mean()), 4),
+            'mean_abs_unit_error': round(float(np.abs(grid_units - forest_units).mean()), 4),
+        })
+    return report
+
+
+def main():
+    try:
+        from .consumption_predictor import ConsumptionPredictor
+    except ImportError:
+        from consumption_predictor import ConsumptionPredictor
+    import pandas as pd
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Build the dense prediction grid for a saved model")
+    parser.add_argument('--model-dir', default='airline_consumption_model')
+    parser.add_argument('--dataset', default=os.path.join(current_dir, '(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv'))
+    parser.add_argument('--output', help=f"grid file (default: <model-dir>/{GRID_FILENAME})")
+    parser.add_argument('--passenger-min', type=int, default=DEFAULT_PASSENGER_RANGE[0])
+    parser.add_argument('--passenger-max', type=int, default=DEFAULT_PASSENGER_RANGE[1])
+    parser.add_argument('--passenger-step', type=int, default=DEFAULT_PASSENGER_STEP)
+    args = parser.parse_args()
+
+    predictor = ConsumptionPredictor.load_trained_model(args.model_dir)
+    if predictor is None:
+        return 1
+
+    df = pd.read_csv(args.dataset)
+    unit_costs = canonical_unit_costs(df, predictor.encoding_tables['Product_Name'].classes.tolist())
+    grid = build_grid(predictor, unit_costs, (args.passenger_min, args.passenger_max), args.passenger_step)
+
+    # Accuracy on every integer passenger count of the grid range (between-bucket rows
+    # included) and on the dataset rows themselves
+    rng = np.random.default_rng(0)
+    n_samples = 20000
+    tables = predictor.encoding_tables
+    products = rng.integers(0, len(tables['Product_Name']), n_samples)
+    sampled = np.column_stack([
+        rng.integers(0, len(tables['Origin']), n_samples),
+        rng.integers(0, len(tables['Flight_Type']), n_samples),
+        rng.integers(0, len(tables['Service_Type']), n_samples),
+        rng.integers(args.passenger_min, args.passenger_max + 1, n_samples),
+        products, unit_costs[products], rng.integers(0, 2, n_samples),
+    ]).astype(float)
+    dataset_features, _, _ = predictor._encode_batch(
+        df['Origin'].values, df['Flight_Type'].values, df['Service_Type'].values,
+        df['Passenger_Count'].values, df['Product_Name'].values, df['Unit_Cost'].values, 0)
+    grid.report = {
+        'passenger_step': args.passenger_step,
+        'sampled': accuracy_report(grid, predictor, sampled),
+        'dataset': accuracy_report(grid, predictor, dataset_features),
+    }
+
+    output = args.output or os.path.join(args.model_dir, GRID_FILENAME)
+    grid.save(output)
+    print(f"✅ Prediction grid saved to '{output}' "
+          f"({grid.values.shape}, {grid.nbytes / 1024:.0f} KB)")
+    print(json.dumps(grid.report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
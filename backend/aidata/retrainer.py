@@ -0,0 +1,398 @@
+"""
+Incremental retraining from post-flight actuals
+
+Runs as its own process, never inside the API workers (from backend/):
+
+    python -m aidata.retrainer --mode warm                      # one warm-start cycle
+    python -m aidata.retrainer --mode auto --interval-s 900     # keep running
+
+warm:    copy the served forest and add trees fitted on a sliding window of the
+         most recent actuals (warm_start), dropping the oldest trees beyond
+         --max-trees. Needs the pickled sklearn forest; rows with categories
+         the encoders never saw are skipped
+rebuild: refit the forest from scratch on the training CSV plus all actuals
+auto:    rebuild when the last rebuild is older than --rebuild-every-h,
+         warm-start when --min-new-rows actuals arrived since the last cycle
+
+The newest actuals are held out of training. A candidate is published only
+when its MAE on that holdout is no worse than the served model's (within
+--max-mae-regression). Publishing saves the candidate to a staging directory
+and renames its files into the model directory, the bundle last, so the
+ModelRegistry of every worker swaps to the new version in one step; segment
+models of the previous forest are removed. Every
+cycle is appended to <model-dir>/retrain_history.jsonl.
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+try:
+    from .actuals_store import DATASET_COLUMNS, DEFAULT_STORE_PATH, ActualsStore
+    from .consumption_predictor import ConsumptionPredictor
+    from .feature_cache import DEFAULT_CACHE_DIR, PREPROCESSING_CONFIG
+    from .model_bundle import BUNDLE_FILENAME
+    from .prediction_grid import GRID_FILENAME, PredictionGrid, build_grid, canonical_unit_costs
+    from .Random_Forest_Regression import AirlineConsumptionPredictor
+    from .segment_models import SEGMENTS_DIRNAME
+except ImportError:
+    from actuals_store import DATASET_COLUMNS, DEFAULT_STORE_PATH, ActualsStore
+    from consumption_predictor import ConsumptionPredictor
+    from feature_cache import DEFAULT_CACHE_DIR, PREPROCESSING_CONFIG
+    from model_bundle import BUNDLE_FILENAME
+    from prediction_grid import GRID_FILENAME, PredictionGrid, build_grid, canonical_unit_costs
+    from Random_Forest_Regression import AirlineConsumptionPredictor
+    from segment_models import SEGMENTS_DIRNAME
+
+logger = logging.getLogger(__name__)
+
+RETRAIN_MODES = ('warm', 'rebuild', 'auto')
+HISTORY_FILENAME = "retrain_history.jsonl"
+LEGACY_MODEL_FILES = ("random_forest_model.pkl", "label_encoders.pkl", "model_metadata.pkl")
+
+DEFAULT_MODEL_DIR = "airline_consumption_model"
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv')
+
+
+class RetrainConfig:
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR, dataset_path=DEFAULT_DATASET, actuals_path=DEFAULT_STORE_PATH,
+                 feature_cache_dir=DEFAULT_CACHE_DIR, add_trees=20, max_trees=200, window_rows=5000,
+                 holdout_fraction=0.2, min_holdout_rows=20, max_mae_regression=0.02,
+                 min_new_rows=50, rebuild_every_h=24.0, n_jobs=1, random_state=42):
+        self.model_dir = model_dir
+        self.dataset_path = dataset_path
+        self.actuals_path = actuals_path
+        self.feature_cache_dir = feature_cache_dir
+        self.add_trees = add_trees
+        self.max_trees = max_trees
+        self.window_rows = window_rows
+        self.holdout_fraction = holdout_fraction
+        self.min_holdout_rows = min_holdout_rows
+        self.max_mae_regression = max_mae_regression
+        self.min_new_rows = min_new_rows
+        self.rebuild_every_h = rebuild_every_h
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+
+def read_history(model_dir):
+    """Entries of <model_dir>/retrain_history.jsonl, oldest first"""
+    path = os.path.join(model_dir, HISTORY_FILENAME)
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
+
+
+def _append_history(model_dir, entry):
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, HISTORY_FILENAME), 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def split_holdout(actuals, holdout_fraction, min_holdout_rows):
+    """(train, holdout): the newest holdout_fraction of the actuals (at least min_holdout_rows) is held out"""
+    n_holdout = max(min_holdout_rows, int(round(len(actuals) * holdout_fraction)))
+    n_holdout = min(n_holdout, len(actuals))
+    return actuals.iloc[:len(actuals) - n_holdout], actuals.iloc[len(actuals) - n_holdout:]
+
+
+def encode_rows(predictor, df):
+    """Feature matrix, target and known-category mask of dataset-shaped rows under the predictor's encoders"""
+    has_issues = df['Crew_Feedback'].isin(PREPROCESSING_CONFIG['problematic_feedback']).astype(int).values
+    features, unknown, _ = predictor._encode_batch(
+        df['Origin'].values, df['Flight_Type'].values, df['Service_Type'].values,
+        df['Passenger_Count'].values, df['Product_Name'].values, df['Unit_Cost'].values, has_issues
+    )
+    target = df[PREPROCESSING_CONFIG['target_column']].values.astype(float)
+    return features, target, ~unknown
+
+
+def holdout_scores(served, candidate, holdout):
+    """
+    MAE and R² of both models on the holdout rows both can encode
+    served may be None (no model published yet)
+    """
+    candidate_features, target, known = encode_rows(candidate, holdout)
+    if served is not None:
+        served_features, _, served_known = encode_rows(served, holdout)
+        known &= served_known
+    scores = {'rows': int(known.sum())}
+    if not known.any():
+        return scores
+    y = target[known]
+    candidate_pred = candidate._predict_features(candidate_features[known])
+    scores['candidate_mae'] = round(float(mean_absolute_error(y, candidate_pred)), 4)
+    scores['candidate_r2'] = round(float(r2_score(y, candidate_pred)), 4) if len(y) > 1 else None
+    if served is not None:
+        served_pred = served._predict_features(served_features[known])
+        scores['served_mae'] = round(float(mean_absolute_error(y, served_pred)), 4)
+        scores['served_r2'] = round(float(r2_score(y, served_pred)), 4) if len(y) > 1 else None
+    return scores
+
+
+def passes_gate(scores, config):
+    """(passed, reason) for the holdout-accuracy gate"""
+    if scores['rows'] < config.min_holdout_rows:
+        return False, f"only {scores['rows']} usable holdout rows (need {config.min_holdout_rows})"
+    if 'served_mae' not in scores:
+        return True, "no served model to compare with"
+    limit = scores['served_mae'] * (1 + config.max_mae_regression)
+    if scores['candidate_mae'] > limit:
+        return False, f"holdout MAE {scores['candidate_mae']} worse than served {scores['served_mae']}"
+    return True, f"holdout MAE {scores['candidate_mae']} vs served {scores['served_mae']}"
+
+
+def _feature_importance(model, feature_columns):
+    return pd.DataFrame({
+        'feature': feature_columns,
+        'importance': model.feature_importances_
+    }).sort_values('importance', ascending=False)
+
+
+def train_warm(current, train_actuals, config):
+    """
+    Candidate = the current sklearn forest plus add_trees trees fitted on the
+    newest window_rows training actuals; the oldest trees beyond max_trees are dropped
+    """
+    window = train_actuals.iloc[-config.window_rows:] if config.window_rows else train_actuals
+    features, target, known = encode_rows(current, window)
+    if not known.all():
+        logger.info(f"Warm start skips {int((~known).sum())} rows with categories the model has not seen")
+    if not known.any():
+        raise ValueError("No actuals with known categories to warm-start on")
+
+    model = copy.deepcopy(current.model)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + config.add_trees, n_jobs=config.n_jobs)
+    model.fit(features[known], target[known])
+    if config.max_trees and len(model.estimators_) > config.max_trees:
+        # Sliding window over trees: the oldest ones were fitted on the oldest data
+        model.estimators_ = model.estimators_[-config.max_trees:]
+        model.n_estimators = config.max_trees
+    model.set_params(warm_start=False)
+
+    candidate = AirlineConsumptionPredictor()
+    candidate.label_encoders = current.label_encoders
+    candidate.encoding_tables = current.encoding_tables
+    candidate.feature_columns = current.feature_columns
+    candidate.target_column = current.target_column
+    candidate.model = model
+    candidate._compile_engine()
+    candidate.feature_importance = _feature_importance(model, candidate.feature_columns)
+    return candidate, int(known.sum())
+
+
+def train_rebuild(base, train_actuals, params, config, work_dir):
+    """Candidate forest fitted from scratch on the training CSV plus the training actuals"""
+    combined = pd.concat([base[DATASET_COLUMNS], train_actuals[DATASET_COLUMNS]], ignore_index=True)
+    combined_path = os.path.join(work_dir, "training_data.csv")
+    combined.to_csv(combined_path, index=False)
+
+    candidate = AirlineConsumptionPredictor(combined_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        candidate.prepare_features(cache_dir=config.feature_cache_dir)
+    X = candidate.df_final[candidate.feature_columns]
+    y = candidate.df_final[candidate.target_column]
+
+    params = dict(params, warm_start=False, n_jobs=config.n_jobs)
+    candidate.model = RandomForestRegressor(**params)
+    candidate.model.fit(X, y)
+    candidate._compile_engine()
+    candidate.feature_importance = _feature_importance(candidate.model, candidate.feature_columns)
+    return candidate, len(X)
+
+
+def publish(candidate, model_dir, unit_cost_source=None):
+    """
+    Save the candidate into model_dir without ever exposing a half-written model:
+    files go to a staging directory next to it and are renamed into place, the
+    bundle (which the ModelRegistry watches) last. A prediction grid already in
+    model_dir is rebuilt for the new forest, a stale grid would just be ignored.
+    segments/ is replaced by the candidate's segment models, or removed when it
+    has none: specialists fitted for the previous forest would keep overriding it
+    """
+    model_dir = os.path.abspath(model_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=os.path.dirname(model_dir))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if not candidate.save_model(staging_dir):
+                raise RuntimeError(f"Could not save the candidate model to '{staging_dir}'")
+
+        names = list(LEGACY_MODEL_FILES)
+        grid_path = os.path.join(model_dir, GRID_FILENAME)
+        if os.path.isfile(grid_path) and unit_cost_source is not None:
+            # The grid's fingerprint must match the model the registry will serve:
+            # the staged bundle together with the staged segments, loaded the same way
+            with contextlib.redirect_stdout(io.StringIO()):
+                served = ConsumptionPredictor.load_trained_model(staging_dir)
+            if served is None:
+                raise RuntimeError(f"Could not load the staged model from '{staging_dir}'")
+            previous = PredictionGrid.load(grid_path)
+            points = previous.passenger_points
+            step = int(points[1] - points[0]) if len(points) > 1 else 1
+            unit_costs = canonical_unit_costs(unit_cost_source, served.encoding_tables['Product_Name'].classes.tolist())
+            grid = build_grid(served, unit_costs, (int(points[0]), int(points[-1])), step)
+            grid.save(os.path.join(staging_dir, GRID_FILENAME))
+            names.append(GRID_FILENAME)
+
+        _replace_segments(staging_dir, model_dir)
+        for name in names + [BUNDLE_FILENAME]:
+            os.replace(os.path.join(staging_dir, name), os.path.join(model_dir, name))
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _replace_segments(staging_dir, model_dir):
+    """Swap model_dir/segments for the staged one (or none); the old directory ends up in staging_dir"""
+    segments_dir = os.path.join(model_dir, SEGMENTS_DIRNAME)
+    staged_segments = os.path.join(staging_dir, SEGMENTS_DIRNAME)
+    if os.path.isdir(segments_dir):
+        os.replace(segments_dir, os.path.join(staging_dir, f".previous-{SEGMENTS_DIRNAME}"))
+        if not os.path.isdir(staged_segments):
+            logger.info(f"Removed the segment models of the previous forest from '{model_dir}'")
+    if os.path.isdir(staged_segments):
+        os.replace(staged_segments, segments_dir)
+
+
+def choose_mode(config, history, n_actuals):
+    """Mode for an 'auto' cycle, or None when there is nothing to do"""
+    rebuilds = [entry for entry in history if entry.get('mode') == 'rebuild']
+    last_rebuild = datetime.fromisoformat(rebuilds[-1]['started_at']) if rebuilds else None
+    if last_rebuild is None or datetime.now() - last_rebuild >= timedelta(hours=config.rebuild_every_h):
+        return 'rebuild'
+    seen = history[-1].get('actuals_rows', 0) if history else 0
+    if n_actuals - seen >= config.min_new_rows:
+        return 'warm'
+    return None
+
+
+def run_cycle(config, mode='auto'):
+    """
+    One retraining cycle; returns its history entry (None when 'auto' found nothing to do)
+    """
+    started = datetime.now()
+    actuals = ActualsStore(config.actuals_path).read_frame()
+    history = read_history(config.model_dir)
+    if mode == 'auto':
+        mode = choose_mode(config, history, len(actuals))
+        if mode is None:
+            logger.info(f"Nothing to retrain ({len(actuals)} actuals, last cycle saw "
+                        f"{history[-1].get('actuals_rows', 0) if history else 0})")
+            return None
+
+    entry = {'started_at': started.isoformat(timespec='seconds'), 'mode': mode,
+             'actuals_rows': len(actuals), 'published': False}
+    train_actuals, holdout = split_holdout(actuals, config.holdout_fraction, config.min_holdout_rows)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        served = ConsumptionPredictor.load_trained_model(config.model_dir)
+        current = AirlineConsumptionPredictor()
+        has_forest = current.load_model(config.model_dir)
+
+    if mode == 'warm' and not has_forest:
+        logger.warning(f"No pickled sklearn forest in '{config.model_dir}', rebuilding instead of warm-starting")
+        mode = entry['mode'] = 'rebuild'
+    if mode == 'warm' and len(train_actuals) == 0:
+        entry['reason'] = "no training actuals outside the holdout"
+        _append_history(config.model_dir, entry)
+        logger.info(f"Warm start skipped: {entry['reason']}")
+        return entry
+
+    base = pd.read_csv(config.dataset_path)
+    start = time.perf_counter()
+    if mode == 'warm':
+        candidate, train_rows = train_warm(current, train_actuals, config)
+    else:
+        params = current.model.get_params() if has_forest else {
+            'n_estimators': 100, 'random_state': config.random_state}
+        with tempfile.TemporaryDirectory() as work_dir:
+            candidate, train_rows = train_rebuild(base, train_actuals, params, config, work_dir)
+    entry['train_rows'] = train_rows
+    entry['train_time_s'] = round(time.perf_counter() - start, 2)
+    entry['n_trees'] = len(candidate.model.estimators_)
+
+    scores = holdout_scores(served, candidate, holdout)
+    entry['holdout'] = scores
+    passed, reason = passes_gate(scores, config)
+    entry['reason'] = reason
+    if passed:
+        unit_cost_source = pd.concat([base[DATASET_COLUMNS], actuals[DATASET_COLUMNS]], ignore_index=True)
+        publish(candidate, config.model_dir, unit_cost_source)
+        entry['published'] = True
+        logger.info(f"✅ {mode} model published to '{config.model_dir}' ({reason})")
+    else:
+        logger.warning(f"⚠️ {mode} candidate rejected: {reason}")
+    _append_history(config.model_dir, entry)
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=RETRAIN_MODES, default='auto')
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--actuals', default=DEFAULT_STORE_PATH)
+    parser.add_argument('--feature-cache', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--add-trees', type=int, default=20)
+    parser.add_argument('--max-trees', type=int, default=200)
+    parser.add_argument('--window-rows', type=int, default=5000)
+    parser.add_argument('--holdout-fraction', type=float, default=0.2)
+    parser.add_argument('--min-holdout-rows', type=int, default=20)
+    parser.add_argument('--max-mae-regression', type=float, default=0.02,
+                        help="accepted relative holdout MAE increase over the served model")
+    parser.add_argument('--min-new-rows', type=int, default=50)
+    parser.add_argument('--rebuild-every-h', type=float, default=24.0)
+    parser.add_argument('--n-jobs', type=int, default=1, help="cores for fitting (leave the rest to serving)")
+    parser.add_argument('--interval-s', type=float, default=0, help="repeat every N seconds (0: run once)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if hasattr(os, 'nice'):
+        os.nice(10)  # yield the CPU to the API workers on the same host
+    config = RetrainConfig(
+        model_dir=args.model_dir, dataset_path=args.dataset, actuals_path=args.actuals,
+        feature_cache_dir=args.feature_cache, add_trees=args.add_trees, max_trees=args.max_trees,
+        window_rows=args.window_rows, holdout_fraction=args.holdout_fraction,
+        min_holdout_rows=args.min_holdout_rows, max_mae_regression=args.max_mae_regression,
+        min_new_rows=args.min_new_rows, rebuild_every_h=args.rebuild_every_h, n_jobs=args.n_jobs
+    )
+
+    while True:
+        try:
+            entry = run_cycle(config, args.mode)
+            if entry is not None:
+                print(json.dumps(entry, indent=2))
+        except Exception as e:
+            logger.error(f"❌ Retraining cycle failed: {e}")
+            if args.interval_s <= 0:
+                return 1
+        if args.interval_s <= 0:
+            return 0
+        time.sleep(args.interval_s)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
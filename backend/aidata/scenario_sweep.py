@@ -0,0 +1,126 @@
+"""
+What-if scenario sweeps
+
+A sweep takes one base flight (origin, flight type, service type, passenger
+count and its products with their unit costs) and lists or ranges of values
+for service_type, passenger_count and unit_cost. Every point of the cartesian
+grid of those axes is evaluated for every product in a single batched
+inference, and the result comes back as a dense matrix with the axes as
+dimensions instead of one /api/predict round trip per point.
+
+An axis that is not swept keeps the base flight's value. A swept unit_cost
+replaces the cost of every product (sweep one product to study its price).
+"""
+
+import os
+
+import numpy as np
+
+try:
+    from .category_encoding import validate_unknown_policy
+except ImportError:
+    from category_encoding import validate_unknown_policy
+
+SWEEP_AXES = ('service_type', 'passenger_count', 'unit_cost')
+SWEEP_DIMS = SWEEP_AXES + ('product_name',)
+
+MAX_SWEEP_ROWS = int(os.getenv("SWEEP_MAX_ROWS", "200000"))
+
+
+class SweepTooLargeError(ValueError):
+    """The grid has more rows (points x products) than MAX_SWEEP_ROWS"""
+
+
+def axis_values(spec, integer=False, max_values=MAX_SWEEP_ROWS):
+    """
+    Values of one axis: a list as given, or {'start', 'stop', 'step'} expanded
+    into an inclusive range
+    """
+    if isinstance(spec, dict):
+        start, stop, step = float(spec['start']), float(spec['stop']), float(spec['step'])
+        if step <= 0 or stop < start:
+            raise ValueError(f"Invalid range {spec}: need step > 0 and stop >= start")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        if count > max_values:
+            raise SweepTooLargeError(f"Range {spec} has {count} values (max {max_values})")
+        values = start + step * np.arange(count)
+        values = np.round(values) if integer else np.round(values, 6)
+    else:
+        values = np.asarray(list(spec))
+        if values.size == 0:
+            raise ValueError("A swept axis needs at least one value")
+    if integer:
+        values = values.astype(np.int64)
+        if (values <= 0).any():
+            raise ValueError("passenger_count values must be positive")
+    elif values.dtype.kind in 'iuf':
+        values = values.astype(np.float64)
+        if (values < 0).any():
+            raise ValueError("unit_cost values must be >= 0")
+    return values
+
+
+def run_sweep(predictor, origin, flight_type, service_type, passenger_count, product_name, unit_cost,
+              sweep, has_issues=0, unknown_policy='raise', max_rows=MAX_SWEEP_ROWS):
+    """
+    Evaluate the cartesian grid of the swept axes for every product of the base flight
+    sweep: {axis: list or range dict} for any of SWEEP_AXES
+    Returns a dict with the axes, 'units' shaped (service_type, passenger_count,
+    unit_cost, product_name) and per-point 'total_units' / 'total_cost'; the
+    unit_cost axis is None when costs were not swept (each product keeps its own)
+    """
+    policy = validate_unknown_policy(unknown_policy)
+    unknown_axes = set(sweep) - set(SWEEP_AXES)
+    if unknown_axes:
+        raise ValueError(f"Cannot sweep {sorted(unknown_axes)}; sweepable axes are {SWEEP_AXES}")
+
+    products = np.asarray(product_name)
+    base_costs = np.asarray(unit_cost, dtype=np.float64)
+    if products.size == 0 or products.size != base_costs.size:
+        raise ValueError("product_name and unit_cost must be non-empty lists of the same length")
+
+    service_types = axis_values(sweep['service_type']) if sweep.get('service_type') is not None \
+        else np.asarray([service_type])
+    passengers = axis_values(sweep['passenger_count'], integer=True) if sweep.get('passenger_count') is not None \
+        else np.asarray([int(passenger_count)])
+    swept_costs = axis_values(sweep['unit_cost']) if sweep.get('unit_cost') is not None else None
+
+    shape = (len(service_types), len(passengers), 1 if swept_costs is None else len(swept_costs), len(products))
+    n_rows = int(np.prod(shape))
+    if n_rows > max_rows:
+        raise SweepTooLargeError(f"Sweep of {n_rows} rows exceeds the limit of {max_rows}")
+
+    s, p, c, n = (index.ravel() for index in np.indices(shape))
+    costs = base_costs[n] if swept_costs is None else swept_costs[c]
+    features, unknown, categories = predictor._encode_batch(
+        origin, flight_type, service_types[s], passengers[p], products[n], costs, has_issues
+    )
+    if unknown.any() and policy == 'raise':
+        raise predictor._unknown_category_error(categories)
+
+    units = np.zeros(n_rows, dtype=np.int64)
+    known = ~unknown
+    if known.any():
+        # One call for the whole grid; sweep rows bypass the prediction cache so they do not evict live traffic
+        raw = predictor._predict_rows(features if known.all() else features[known], use_cache=False)
+        units[known] = np.maximum(0, np.rint(raw)).astype(np.int64)
+
+    units = units.reshape(shape)
+    total_cost = (units * costs.reshape(shape)).sum(axis=-1)
+    result = {
+        'dims': list(SWEEP_DIMS),
+        'axes': {
+            'service_type': service_types.tolist(),
+            'passenger_count': passengers.tolist(),
+            'unit_cost': None if swept_costs is None else swept_costs.tolist(),
+            'product_name': products.tolist(),
+        },
+        'units': units,
+        'total_units': units.sum(axis=-1),
+        'total_cost': np.round(total_cost, 2),
+        'points': int(np.prod(shape[:-1])),
+        'rows': n_rows,
+    }
+    if unknown.any() and policy == 'null':
+        result['unknown'] = unknown.reshape(shape)
+    return result
@@ -0,0 +1,194 @@
+"""
+Per-segment specialist forests
+
+Instead of asking the global forest about every route, smaller forests can be
+trained per segment (an Origin, a Service_Type, or a combination of both).
+SegmentRouter sends every encoded row to the forest of its segment and the
+rows of segments without a specialist (too little training data, or a
+segment only seen at serving time) to the global model.
+
+Segment forests are fitted in parallel, one loky worker per forest with
+n_jobs=1 (the same policy as tuning.py), and served through the flat engine.
+On disk they live next to the model as <model_dir>/segments/: one model bundle
+per segment plus manifest.json, which records the segments by category name
+so they survive an encoder re-ordering.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+try:
+    from .forest_engine import export_forest
+    from . import model_bundle
+except ImportError:
+    from forest_engine import export_forest
+    import model_bundle
+
+SEGMENT_FEATURES = ('Origin', 'Service_Type')
+SEGMENTS_DIRNAME = "segments"
+MANIFEST_FILENAME = "manifest.json"
+
+DEFAULT_MIN_SEGMENT_ROWS = 50
+DEFAULT_SEGMENT_ESTIMATORS = 50
+
+
+def validate_segment_by(segment_by):
+    segment_by = tuple(segment_by)
+    if not segment_by or any(feature not in SEGMENT_FEATURES for feature in segment_by):
+        raise ValueError(f"segment_by must be a non-empty subset of {SEGMENT_FEATURES}, got {segment_by}")
+    return segment_by
+
+
+def _segment_columns(feature_columns, segment_by):
+    return [feature_columns.index(f"{feature}_encoded") for feature in segment_by]
+
+
+class SegmentRouter:
+    """
+    Dispatches encoded rows to per-segment FlatForests
+    forests: {tuple of category codes (in segment_by order): FlatForest}
+    """
+
+    def __init__(self, segment_by, feature_columns, forests, segment_info=None):
+        self.segment_by = validate_segment_by(segment_by)
+        self.columns = _segment_columns(feature_columns, self.segment_by)
+        self.forests = forests
+        self.segment_info = segment_info or {}
+
+    @property
+    def nbytes(self):
+        return sum(forest.nbytes for forest in self.forests.values())
+
+    def partition(self, features):
+        """
+        Split row indices by serving forest
+        Returns [(forest or None for the global model, row indices)], one entry per forest used
+        """
+        keys = features[:, self.columns].astype(np.int64)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        groups = []
+        fallback = []
+        for i, key in enumerate(map(tuple, unique_keys.tolist())):
+            rows = np.flatnonzero(inverse == i)
+            forest = self.forests.get(key)
+            if forest is None:
+                fallback.append(rows)
+            else:
+                groups.append((forest, rows))
+        if fallback:
+            groups.append((None, np.concatenate(fallback)))
+        return groups
+
+    def predict(self, features, fallback):
+        """Raw predictions: segment forests where available, fallback(features) for the other rows"""
+        predictions = np.empty(len(features), dtype=np.float64)
+        for forest, rows in self.partition(features):
+            subset = features[rows]
+            predictions[rows] = fallback(subset) if forest is None else forest.predict(subset)
+        return predictions
+
+    def fingerprint_arrays(self):
+        """Arrays identifying the segment forests (for prediction grid compatibility checks)"""
+        arrays = []
+        for key in sorted(self.forests):
+            forest = self.forests[key]
+            arrays.extend([np.asarray(key, dtype=np.int64), forest.feature, forest.threshold, forest.value])
+        return arrays
+
+
+def _fit_segment(X, y, params):
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(**dict(params, n_jobs=1))
+    model.fit(X, y)
+    return model
+
+
+def fit_segment_models(X, y, feature_columns, segment_by=SEGMENT_FEATURES, min_rows=DEFAULT_MIN_SEGMENT_ROWS,
+                       n_estimators=DEFAULT_SEGMENT_ESTIMATORS, n_workers=None, random_state=42, **params):
+    """
+    Fit one forest per segment with at least min_rows training rows, in parallel
+    X: encoded feature matrix in feature_columns order; extra params go to RandomForestRegressor
+    Returns a SegmentRouter
+    """
+    from joblib import Parallel, delayed
+
+    segment_by = validate_segment_by(segment_by)
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keys = X[:, _segment_columns(feature_columns, segment_by)].astype(np.int64)
+    unique_keys, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    selected = [(tuple(key), np.flatnonzero(inverse == i))
+                for i, key in enumerate(unique_keys.tolist()) if counts[i] >= min_rows]
+    if not selected:
+        return SegmentRouter(segment_by, feature_columns, {})
+
+    params = dict(params, n_estimators=n_estimators, random_state=random_state)
+    n_workers = n_workers or os.cpu_count() or 1
+    models = Parallel(n_jobs=min(n_workers, len(selected)), backend='loky')(
+        delayed(_fit_segment)(X[rows], y[rows], params) for _, rows in selected
+    )
+    forests = {key: export_forest(model) for (key, _), model in zip(selected, models)}
+    segment_info = {key: {'train_rows': len(rows), 'n_trees': n_estimators} for key, rows in selected}
+    return SegmentRouter(segment_by, feature_columns, forests, segment_info)
+
+
+def save_segments(segments_dir, router, encoding_tables):
+    """
+    Write the router's forests (one bundle each) and the manifest
+    The directory is built next to segments_dir and swapped in with renames
+    """
+    parent = os.path.dirname(os.path.abspath(segments_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".segments-", dir=parent)
+    try:
+        segments = []
+        for i, (key, forest) in enumerate(sorted(router.forests.items())):
+            values = [encoding_tables[feature].classes.tolist()[code]
+                      for feature, code in zip(router.segment_by, key)]
+            filename = f"segment_{i:03d}.bundle"
+            model_bundle.save_bundle(os.path.join(tmp_dir, filename), forest, {},
+                                     {'segment': dict(zip(router.segment_by, values))})
+            segments.append({'values': values, 'file': filename, **router.segment_info.get(key, {})})
+        with open(os.path.join(tmp_dir, MANIFEST_FILENAME), 'w') as f:
+            json.dump({'segment_by': list(router.segment_by), 'segments': segments}, f, indent=2)
+
+        if os.path.isdir(segments_dir):
+            old_dir = f"{segments_dir}.old-{os.getpid()}"
+            os.replace(segments_dir, old_dir)
+            os.replace(tmp_dir, segments_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, segments_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return len(segments)
+
+
+def load_segments(segments_dir, encoding_tables, feature_columns, verify=True):
+    """
+    SegmentRouter from a segments directory, or None if there is none
+    Segments whose categories the encoders no longer know are dropped
+    """
+    manifest_path = os.path.join(segments_dir, MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    segment_by = validate_segment_by(manifest['segment_by'])
+    forests = {}
+    segment_info = {}
+    for segment in manifest['segments']:
+        key = tuple(encoding_tables[feature].lookup(value) for feature, value in zip(segment_by, segment['values']))
+        if any(code < 0 for code in key):
+            continue
+        bundle = model_bundle.load_bundle(os.path.join(segments_dir, segment['file']), verify=verify)
+        forests[key] = bundle.flat_forest
+        segment_info[key] = {name: value for name, value in segment.items() if name not in ('values', 'file')}
+    return SegmentRouter(segment_by, feature_columns, forests, segment_info)
@@ -0,0 +1,198 @@
+"""
+Budget-aware hyperparameter search for the consumption Random Forest
+
+Successive halving over the number of trees: every configuration of the
+search space is cross-validated with a small forest, the best third moves on
+to a forest three times larger, and so on up to max_estimators, or until the
+wall-clock budget runs out (the best configuration seen so far is returned).
+
+Parallelism policy: the (configuration, fold) fits of a rung run in one
+joblib loky pool of n_workers processes and every forest is fitted with
+n_jobs=1, so there is never more than one busy thread per worker. The
+training data is dumped once to a memory-mapped file that all workers read.
+
+Every finished trial is appended to a JSONL leaderboard; a rerun with the same
+data, folds and search space reads it back and only fits the missing trials.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold
+
+# 'auto' is no longer accepted by RandomForestRegressor; 1.0 (all features) is what it meant
+SEARCH_SPACE = {
+    'max_depth': [10, 20, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': [1.0, 'sqrt', 'log2'],
+}
+
+DEFAULT_LEADERBOARD = "tuning_leaderboard.jsonl"
+
+
+def _data_fingerprint(X, y, cv, random_state):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    digest.update(f"{cv}:{random_state}".encode())
+    return digest.hexdigest()[:12]
+
+
+def trial_key(params, n_estimators, data_fingerprint):
+    """Identifies a trial in the leaderboard: same params, forest size, data and folds"""
+    payload = json.dumps({'params': params, 'n_estimators': n_estimators, 'data': data_fingerprint}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _fit_fold(data_path, train_idx, test_idx, params, n_estimators, random_state):
+    X, y = joblib.load(data_path, mmap_mode='r')
+    start = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=1, **params)
+    model.fit(X[train_idx], y[train_idx])
+    score = r2_score(y[test_idx], model.predict(X[test_idx]))
+    return float(score), time.perf_counter() - start
+
+
+class Leaderboard:
+    """Append-only JSONL record of finished trials"""
+
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        trial = json.loads(line)
+                    except ValueError:
+                        continue  # a run killed mid-write leaves a truncated last line
+                    self.trials[trial['key']] = trial
+
+    def get(self, key):
+        return self.trials.get(key)
+
+    def add(self, trial):
+        self.trials[trial['key']] = trial
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(trial) + "\n")
+
+
+class TuningResult:
+    def __init__(self, best_params, best_n_estimators, best_score, trials, elapsed_s, resumed_trials, budget_exhausted):
+        self.best_params = best_params
+        self.best_n_estimators = best_n_estimators
+        self.best_score = best_score
+        self.trials = trials
+        self.elapsed_s = elapsed_s
+        self.resumed_trials = resumed_trials
+        self.budget_exhausted = budget_exhausted
+
+
+def successive_halving(X, y, search_space=SEARCH_SPACE, min_estimators=25, max_estimators=300,
+                       factor=3, cv=3, time_budget_s=600, n_workers=None,
+                       leaderboard_path=DEFAULT_LEADERBOARD, random_state=42, verbose=True):
+    """
+    Successive halving over n_estimators under a wall-clock budget
+    Returns a TuningResult; the best configuration is the best-scoring one of the
+    highest rung that was reached
+    """
+    start = time.perf_counter()
+    n_workers = n_workers or os.cpu_count() or 1
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    fingerprint = _data_fingerprint(X, y, cv, random_state)
+    folds = list(KFold(n_splits=cv, shuffle=True, random_state=random_state).split(X))
+    leaderboard = Leaderboard(leaderboard_path)
+
+    names = sorted(search_space)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(search_space[n] for n in names))]
+
+    rungs = []
+    n_estimators = min_estimators
+    while n_estimators < max_estimators:
+        rungs.append(n_estimators)
+        n_estimators *= factor
+    rungs.append(max_estimators)
+
+    resumed = 0
+    budget_exhausted = False
+    best = None  # (rung index, score, params, n_estimators)
+    all_trials = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = os.path.join(tmp_dir, "tuning_data.joblib")
+        joblib.dump((X, y), data_path)
+
+        with Parallel(n_jobs=n_workers, backend='loky') as parallel:
+            for rung_index, n_estimators in enumerate(rungs):
+                rung_scores = []
+                pending = []
+                for params in candidates:
+                    key = trial_key(params, n_estimators, fingerprint)
+                    trial = leaderboard.get(key)
+                    if trial is not None:
+                        resumed += 1
+                        rung_scores.append((trial['mean_score'], params))
+                        all_trials.append(trial)
+                    else:
+                        pending.append((key, params))
+
+                # Fit the missing trials in waves so the budget is checked between waves
+                wave_size = max(1, n_workers)
+                for wave_start in range(0, len(pending), wave_size):
+                    if time.perf_counter() - start > time_budget_s:
+                        budget_exhausted = True
+                        break
+                    wave = pending[wave_start:wave_start + wave_size]
+                    results = parallel(
+                        delayed(_fit_fold)(data_path, train_idx, test_idx, params, n_estimators, random_state)
+                        for _, params in wave for train_idx, test_idx in folds
+                    )
+                    for i, (key, params) in enumerate(wave):
+                        fold_results = results[i * cv:(i + 1) * cv]
+                        scores = [score for score, _ in fold_results]
+                        trial = {
+                            'key': key,
+                            'data': fingerprint,
+                            'params': params,
+                            'n_estimators': n_estimators,
+                            'rung': rung_index,
+                            'fold_scores': [round(score, 6) for score in scores],
+                            'mean_score': round(float(np.mean(scores)), 6),
+                            'fit_time_s': round(sum(fit_time for _, fit_time in fold_results), 3),
+                        }
+                        leaderboard.add(trial)
+                        all_trials.append(trial)
+                        rung_scores.append((trial['mean_score'], params))
+
+                if not rung_scores:
+                    break
+                rung_scores.sort(key=lambda item: -item[0])
+                best = (rung_index, rung_scores[0][0], rung_scores[0][1], n_estimators)
+                if verbose:
+                    print(f"Rung {rung_index} ({n_estimators} trees): {len(rung_scores)} configs, "
+                          f"best R² {rung_scores[0][0]:.4f} - {rung_scores[0][1]}")
+                if budget_exhausted:
+                    break
+                keep = max(1, len(rung_scores) // factor)
+                candidates = [params for _, params in rung_scores[:keep]]
+
+    elapsed = time.perf_counter() - start
+    if best is None:
+        raise RuntimeError(f"No trial finished within the {time_budget_s}s budget")
+    _, best_score, best_params, best_n_estimators = best
+    return TuningResult(best_params, best_n_estimators, best_score, all_trials, elapsed, resumed, budget_exhausted)
@@ -3,6 +3,8 @@ Example script showing how to use a saved Random Forest model for predictions
 """
 
 from Random_Forest_Regression import AirlineConsumptionPredictor
+from scenario_sweep import run_sweep
+from load_optimizer import plan_load
 import pandas as pd
 
 def make_predictions_with_saved_model():
@@ -136,18 +138,15 @@ def batch_predictions_from_csv():
     print("Input data for predictions:")
     print(new_data.to_string(index=False))
     
-    # Make predictions for each row
-    predictions = []
-    for _, row in new_data.iterrows():
-        pred = predictor.predict_consumption(
-            origin=row['origin'],
-            flight_type=row['flight_type'],
-            service_type=row['service_type'],
-            passenger_count=row['passenger_count'],
-            product_name=row['product_name'],
-            unit_cost=row['unit_cost']
-        )
-        predictions.append(pred)
+    # Predict every row with a single batched call
+    predictions = predictor.predict_consumption_batch(
+        origin=new_data['origin'],
+        flight_type=new_data['flight_type'],
+        service_type=new_data['service_type'],
+        passenger_count=new_data['passenger_count'],
+        product_name=new_data['product_name'],
+        unit_cost=new_data['unit_cost']
+    )
     
     # Add predictions to the DataFrame
     new_data['predicted_consumption'] = predictions
@@ -178,42 +177,44 @@ def inventory_planning_example():
         'passenger_count': 320
     }
     
-    # Products to stock
+    # Products to stock, with the margin of every unit sold
     products = [
-        {'name': 'Still Water 500ml', 'cost': 0.5},
-        {'name': 'Sparkling Water 330ml', 'cost': 0.45},
-        {'name': 'Juice 200ml', 'cost': 0.55},
-        {'name': 'Bread Roll Pack', 'cost': 0.35},
-        {'name': 'Chocolate Bar 50g', 'cost': 0.8},
-        {'name': 'Mixed Nuts 30g', 'cost': 0.65},
-        {'name': 'Instant Coffee Stick', 'cost': 0.08}
+        {'name': 'Still Water 500ml', 'cost': 0.5, 'margin': 1.5},
+        {'name': 'Sparkling Water 330ml', 'cost': 0.45, 'margin': 1.55},
+        {'name': 'Juice 200ml', 'cost': 0.55, 'margin': 1.95},
+        {'name': 'Bread Roll Pack', 'cost': 0.35, 'margin': 0.9},
+        {'name': 'Chocolate Bar 50g', 'cost': 0.8, 'margin': 2.2},
+        {'name': 'Mixed Nuts 30g', 'cost': 0.65, 'margin': 2.35},
+        {'name': 'Instant Coffee Stick', 'cost': 0.08, 'margin': 0.92}
     ]
+    budget = 250.0
     
     print(f"Flight: {flight_info['origin']} {flight_info['flight_type']} ({flight_info['service_type']})")
-    print(f"Passengers: {flight_info['passenger_count']}")
+    print(f"Passengers: {flight_info['passenger_count']} | Loading budget: ${budget:.2f}")
     print("\n📦 RECOMMENDED INVENTORY:")
-    print("-" * 50)
-    
-    total_cost = 0
-    for product in products:
-        predicted_demand = predictor.predict_consumption(
-            origin=flight_info['origin'],
-            flight_type=flight_info['flight_type'],
-            service_type=flight_info['service_type'],
-            passenger_count=flight_info['passenger_count'],
-            product_name=product['name'],
-            unit_cost=product['cost']
-        )
-        
-        # Add no buffer for no safety stock
-        recommended_stock = int(predicted_demand * 1.0)
-        cost = recommended_stock * product['cost']
-        total_cost += cost
-        
-        print(f"{product['name']:<25} | Stock: {recommended_stock:>3} units | Cost: ${cost:>6.2f}")
-    
-    print("-" * 50)
-    print(f"{'TOTAL INVENTORY COST':<25} | {'':>11} | ${total_cost:>6.2f}")
+    print("-" * 78)
+    
+    # Units with the best expected margin per dollar first, until the budget is spent
+    plan = plan_load(
+        predictor,
+        flight_index=[0] * len(products),
+        origin=flight_info['origin'],
+        flight_type=flight_info['flight_type'],
+        service_type=flight_info['service_type'],
+        passenger_count=flight_info['passenger_count'],
+        product_name=[product['name'] for product in products],
+        unit_cost=[product['cost'] for product in products],
+        margin=[product['margin'] for product in products],
+        budget=[budget]
+    )
+    
+    for i, product in enumerate(products):
+        print(f"{product['name']:<25} | Stock: {plan['units'][i]:>3} units (demand ~{plan['predicted_units'][i]:>3}) "
+              f"| Cost: ${plan['spent'][i]:>6.2f} | Fill: {plan['fill_probability'][i]:>4.0%}")
+    
+    print("-" * 78)
+    print(f"{'TOTAL INVENTORY COST':<25} | ${plan['spent'].sum():>6.2f} | "
+          f"Expected sales: {plan['expected_sales'].sum():.0f} units, margin ${plan['expected_margin'].sum():.2f}")
 
 def flight_demand_analysis():
     """
@@ -417,27 +418,21 @@ def compare_service_types():
     total_retail = 0
     total_pick_pack = 0
     
-    for product in products:
-        # Retail prediction
-        retail_demand = predictor.predict_consumption(
-            origin=base_flight['origin'],
-            flight_type=base_flight['flight_type'],
-            service_type='Retail',
-            passenger_count=base_flight['passenger_count'],
-            product_name=product['name'],
-            unit_cost=product['cost']
-        )
-        
-        # Pick & Pack prediction
-        pick_pack_demand = predictor.predict_consumption(
-            origin=base_flight['origin'],
-            flight_type=base_flight['flight_type'],
-            service_type='Pick & Pack',
-            passenger_count=base_flight['passenger_count'],
-            product_name=product['name'],
-            unit_cost=product['cost']
-        )
-        
+    # Both service types for every product in one batched sweep
+    sweep = run_sweep(
+        predictor,
+        origin=base_flight['origin'],
+        flight_type=base_flight['flight_type'],
+        service_type='Retail',
+        passenger_count=base_flight['passenger_count'],
+        product_name=[product['name'] for product in products],
+        unit_cost=[product['cost'] for product in products],
+        sweep={'service_type': ['Retail', 'Pick & Pack']}
+    )
+    # units is indexed [service_type][passenger_count][unit_cost][product]
+    retail_units, pick_pack_units = sweep['units'][:, 0, 0, :].tolist()
+    
+    for product, retail_demand, pick_pack_demand in zip(products, retail_units, pick_pack_units):
         difference = pick_pack_demand - retail_demand
         percent_increase = (difference / retail_demand * 100) if retail_demand > 0 else 0
         
@@ -0,0 +1,115 @@
+"""
+Bounded LRU cache with TTL for barcode lookups
+
+Scanners look up the same SKUs over and over, and every lookup is a warehouse
+round trip. BarcodeCache keeps the check_barcode_exists result per barcode:
+found products for ttl_seconds, barcodes that are not in PRODUCT_DATA for the
+shorter negative_ttl_seconds (another process may add them). Entries also
+expire when the date changes, because days_until_expiration is computed
+against the current date.
+
+Writes made through SnowflakeConnection invalidate the barcodes they touch.
+A lookup that started before an invalidation does not store its (possibly
+stale) result: put() takes the generation read before the query and drops the
+entry if any invalidation happened since.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+class BarcodeCache:
+    """
+    Thread-safe LRU cache of check_barcode_exists results
+    Cached results are shared between callers and must not be modified
+    """
+
+    def __init__(self, maxsize=10000, ttl_seconds=300, negative_ttl_seconds=30):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries = OrderedDict()  # barcode -> (result, expires_at, day)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.flushes = 0
+
+    def get(self, barcode):
+        """Cached result for barcode, None when there is no live entry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, expires_at, day = entry
+            if expires_at < now or day != date.today():
+                del self._entries[barcode]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(barcode)
+            self.hits += 1
+            if not result['exists']:
+                self.negative_hits += 1
+            return result
+
+    def put(self, barcode, result, generation=None):
+        """
+        Store a lookup result
+        generation: value of self.generation read before the lookup; the result is
+        dropped when an invalidation happened in between
+        """
+        ttl = self.ttl_seconds if result['exists'] else self.negative_ttl_seconds
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[barcode] = (result, time.monotonic() + ttl, date.today())
+            self._entries.move_to_end(barcode)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, barcodes):
+        """Drop the entries of one barcode or an iterable of barcodes"""
+        if isinstance(barcodes, str):
+            barcodes = [barcodes]
+        with self._lock:
+            self.generation += 1
+            for barcode in barcodes:
+                if self._entries.pop(barcode, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry; returns how many were dropped"""
+        with self._lock:
+            self.generation += 1
+            dropped = len(self._entries)
+            self._entries.clear()
+            self.flushes += 1
+            return dropped
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl_seconds,
+                'negative_ttl_seconds': self.negative_ttl_seconds,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'flushes': self.flushes,
+            }
@@ -0,0 +1,82 @@
+"""
+Latency benchmark: flattened NumPy forest vs sklearn's RandomForestRegressor.predict
+
+Usage (from backend/):
+    python -m benchmarks.bench_forest_engine [--model-dir airline_consumption_model] [--max-slowdown 2.5]
+
+Checks that both engines return identical predictions, then reports p50/p99
+latency for batch sizes 1, 10, 100, 10k and 50k. Bundles serve every batch
+size with the flat engine, so the exit code is 1 when a batch large enough for
+its per-tree walk is more than --max-slowdown times slower than sklearn.
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from aidata.forest_engine import LEVEL_WALK_MIN_ROWS
+from benchmarks.common import (DEFAULT_MODEL_DIR, latency_summary, load_or_train_predictor,
+                               measure_latency, random_feature_rows)
+
+BATCH_SIZES = (1, 10, 100, 10_000, 50_000)
+REPEATS = {1: 500, 10: 500, 100: 200, 10_000: 20, 50_000: 5}
+DEFAULT_MAX_SLOWDOWN = 2.5
+
+
+def run(model_dir=DEFAULT_MODEL_DIR):
+    predictor = load_or_train_predictor(model_dir, require_sklearn=True, engine='flat')
+    model, flat_forest = predictor.model, predictor.flat_forest
+
+    X = random_feature_rows(predictor, max(BATCH_SIZES))
+    if not np.array_equal(model.predict(X), flat_forest.predict(X)):
+        raise AssertionError("Flat engine output differs from model.predict")
+
+    results = []
+    for batch_size in BATCH_SIZES:
+        batch = X[:batch_size]
+        repeats = REPEATS[batch_size]
+        sklearn_stats = latency_summary(measure_latency(lambda: model.predict(batch), repeats))
+        flat_stats = latency_summary(measure_latency(lambda: flat_forest.predict(batch), repeats))
+        results.append({'batch_size': batch_size, 'sklearn': sklearn_stats, 'flat': flat_stats})
+    return results
+
+
+def large_batch_slowdowns(results, max_slowdown=DEFAULT_MAX_SLOWDOWN):
+    """Batch sizes served by the per-tree walk whose flat p50 exceeds max_slowdown x sklearn's"""
+    return [row['batch_size'] for row in results
+            if row['batch_size'] >= LEVEL_WALK_MIN_ROWS
+            and row['flat']['p50_ms'] > max_slowdown * row['sklearn']['p50_ms']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help="flat/sklearn p50 ratio that fails a large batch")
+    args = parser.parse_args()
+
+    results = run(args.model_dir)
+    slow = large_batch_slowdowns(results, args.max_slowdown)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if slow else 0)
+
+    print("✅ Flat engine output identical to model.predict")
+    print(f"{'Batch':>7} | {'sklearn p50':>12} {'sklearn p99':>12} | {'flat p50':>10} {'flat p99':>10} | {'speedup p50':>11}")
+    print("-" * 78)
+    for row in results:
+        sk, flat = row['sklearn'], row['flat']
+        speedup = sk['p50_ms'] / flat['p50_ms'] if flat['p50_ms'] else float('inf')
+        print(f"{row['batch_size']:>7} | {sk['p50_ms']:>10.3f}ms {sk['p99_ms']:>10.3f}ms | "
+              f"{flat['p50_ms']:>8.3f}ms {flat['p99_ms']:>8.3f}ms | {speedup:>10.1f}x")
+    if slow:
+        print(f"❌ Flat engine more than {args.max_slowdown}x slower than sklearn at batch size(s) "
+              f"{', '.join(map(str, slow))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Throughput benchmark: one forest call per request vs micro-batched requests
+
+Usage (from backend/):
+    python -m benchmarks.bench_micro_batching [--clients 50 100 250 500] [--window-ms 2]
+
+Each simulated client sends a sequence of /api/predict-sized requests (one
+flight, 10 products) as fast as it gets answers. Both modes run on the same
+bounded InferenceExecutor; the batched mode goes through MicroBatcher.
+The prediction cache is not attached, so every row reaches the forest.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import DEFAULT_MODEL_DIR, latency_summary, load_or_train_predictor
+from inference_executor import InferenceExecutor
+from micro_batcher import MicroBatcher
+
+CLIENT_COUNTS = (50, 100, 250, 500)
+REQUESTS_PER_CLIENT = 5
+PRODUCTS_PER_REQUEST = 10
+
+
+def make_requests(predictor, n_requests, seed=0):
+    """Random but valid request payloads (all products of one flight)"""
+    rng = np.random.default_rng(seed)
+    tables = predictor.encoding_tables
+    products = tables['Product_Name'].classes
+    requests = []
+    for _ in range(n_requests):
+        requests.append({
+            'origin': rng.choice(tables['Origin'].classes),
+            'flight_type': rng.choice(tables['Flight_Type'].classes),
+            'service_type': rng.choice(tables['Service_Type'].classes),
+            'passenger_count': int(rng.integers(100, 400)),
+            'product_name': products[:PRODUCTS_PER_REQUEST].tolist(),
+            'unit_cost': np.round(rng.uniform(0.05, 2.5, PRODUCTS_PER_REQUEST), 2).tolist(),
+        })
+    return requests
+
+
+async def run_clients(n_clients, requests, predict):
+    latencies = []
+
+    async def client(index):
+        for k in range(REQUESTS_PER_CLIENT):
+            payload = requests[(index * REQUESTS_PER_CLIENT + k) % len(requests)]
+            start = time.perf_counter()
+            await predict(payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(n_clients)))
+    elapsed = time.perf_counter() - start
+    summary = latency_summary(np.array(latencies))
+    summary['requests_per_s'] = round(len(latencies) / elapsed, 1)
+    return summary
+
+
+async def run(model_dir=DEFAULT_MODEL_DIR, client_counts=CLIENT_COUNTS, window_ms=2.0, max_rows=2048, workers=2):
+    predictor = load_or_train_predictor(model_dir)
+    requests = make_requests(predictor, 1000)
+    # Queue large enough for the unbatched mode to admit every client at once
+    executor = InferenceExecutor(max_workers=workers, max_queue=max(client_counts), timeout_s=120)
+    batcher = MicroBatcher(executor, window_ms=window_ms, max_rows=max_rows)
+
+    async def direct(payload):
+        return await executor.run(predictor.predict_consumption_batch, has_issues=0,
+                                  unknown_policy='raise', **payload)
+
+    async def batched(payload):
+        return await batcher.predict(predictor, has_issues=0, **payload)
+
+    # Both modes must return the same units
+    sample = requests[:20]
+    expected = [await direct(payload) for payload in sample]
+    coalesced = await asyncio.gather(*(batched(payload) for payload in sample))
+    if any(not np.array_equal(a, b) for a, b in zip(expected, coalesced)):
+        raise AssertionError("Micro-batched predictions differ from direct predictions")
+
+    results = []
+    for n_clients in client_counts:
+        direct_stats = await run_clients(n_clients, requests, direct)
+        batched_stats = await run_clients(n_clients, requests, batched)
+        results.append({'clients': n_clients, 'direct': direct_stats, 'batched': batched_stats})
+    executor.shutdown()
+    return results, batcher.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--clients', type=int, nargs='+', default=list(CLIENT_COUNTS))
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-rows', type=int, default=2048)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    results, batcher_stats = asyncio.run(run(args.model_dir, args.clients, args.window_ms, args.max_rows, args.workers))
+    if args.json:
+        print(json.dumps({'results': results, 'micro_batching': batcher_stats}, indent=2))
+        return
+
+    print("✅ Micro-batched predictions identical to direct predictions")
+    print(f"{'Clients':>7} | {'direct req/s':>12} {'p50':>9} {'p99':>9} | {'batched req/s':>13} {'p50':>9} {'p99':>9} | {'gain':>6}")
+    print("-" * 92)
+    for row in results:
+        direct, batched = row['direct'], row['batched']
+        gain = batched['requests_per_s'] / direct['requests_per_s'] if direct['requests_per_s'] else float('inf')
+        print(f"{row['clients']:>7} | {direct['requests_per_s']:>12.1f} {direct['p50_ms']:>7.1f}ms {direct['p99_ms']:>7.1f}ms | "
+              f"{batched['requests_per_s']:>13.1f} {batched['p50_ms']:>7.1f}ms {batched['p99_ms']:>7.1f}ms | {gain:>5.1f}x")
+    print(f"Average batch: {batcher_stats['avg_requests_per_batch']} requests, {batcher_stats['avg_rows_per_batch']} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Report: per-segment specialist forests vs the monolithic forest
+
+Usage (from backend/):
+    python -m benchmarks.bench_segment_models [--segment-by Origin Service_Type] [--min-rows 50] [--json]
+
+Trains the global forest (train_random_forest, 80/20 split) and the segment
+forests on the same training rows, then reports for every segment of the test
+split: MAE and R² of both models, the size of each forest, and the latency of
+predicting the segment's rows (one batch call and one row at a time, flat
+engine for both). The summary compares the routed predictor with the global
+forest over the whole test split.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import numpy as np
+
+from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+from aidata.segment_models import DEFAULT_MIN_SEGMENT_ROWS, DEFAULT_SEGMENT_ESTIMATORS, SEGMENT_FEATURES
+from benchmarks.common import DATASET_PATH, latency_summary, measure_latency
+
+
+def _errors(y, predictions):
+    mae = float(np.abs(y - predictions).mean())
+    denominator = float(((y - y.mean()) ** 2).sum())
+    r2 = 1 - float(((y - predictions) ** 2).sum()) / denominator if denominator else None
+    return round(mae, 4), (round(r2, 4) if r2 is not None else None)
+
+
+def run(segment_by=SEGMENT_FEATURES, min_rows=DEFAULT_MIN_SEGMENT_ROWS,
+        n_estimators=DEFAULT_SEGMENT_ESTIMATORS, n_workers=None, repeats=50):
+    predictor = AirlineConsumptionPredictor(DATASET_PATH, engine='flat')
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor.prepare_features()
+        predictor.train_random_forest()
+        start = time.perf_counter()
+        router = predictor.train_segment_models(segment_by, min_rows=min_rows, n_estimators=n_estimators,
+                                                n_workers=n_workers)
+        segment_train_s = time.perf_counter() - start
+    global_forest = predictor.flat_forest
+
+    X_test = predictor.X_test.values.astype(float)
+    y_test = predictor.y_test.values.astype(float)
+    tables = predictor.encoding_tables
+
+    segments = []
+    for forest, rows in router.partition(X_test):
+        if forest is None:
+            continue
+        features, y = X_test[rows], y_test[rows]
+        key = tuple(int(code) for code in features[0, router.columns])
+        global_mae, global_r2 = _errors(y, global_forest.predict(features))
+        segment_mae, segment_r2 = _errors(y, forest.predict(features))
+        segments.append({
+            'segment': ' / '.join(tables[feature].classes.tolist()[code] for feature, code in zip(router.segment_by, key)),
+            'train_rows': router.segment_info[key]['train_rows'],
+            'test_rows': len(rows),
+            'global': {'mae': global_mae, 'r2': global_r2, 'nodes': global_forest.n_nodes,
+                       'kb': round(global_forest.nbytes / 1024, 1),
+                       'batch': latency_summary(measure_latency(lambda: global_forest.predict(features), repeats)),
+                       'row': latency_summary(measure_latency(lambda: global_forest.predict(features[:1]), repeats))},
+            'segment_model': {'mae': segment_mae, 'r2': segment_r2, 'nodes': forest.n_nodes,
+                              'kb': round(forest.nbytes / 1024, 1),
+                              'batch': latency_summary(measure_latency(lambda: forest.predict(features), repeats)),
+                              'row': latency_summary(measure_latency(lambda: forest.predict(features[:1]), repeats))},
+        })
+
+    routed = predictor._predict_features(X_test)
+    predictor.segment_router = None
+    monolithic = predictor._predict_features(X_test)
+    routed_latency = latency_summary(measure_latency(lambda: router.predict(X_test, global_forest.predict), repeats))
+    global_latency = latency_summary(measure_latency(lambda: global_forest.predict(X_test), repeats))
+    covered = sum(segment['test_rows'] for segment in segments)
+    summary = {
+        'segment_by': list(router.segment_by),
+        'segment_models': len(router.forests),
+        'segment_train_s': round(segment_train_s, 2),
+        'test_rows': len(y_test),
+        'test_rows_on_segment_models': covered,
+        'global': {'mae': _errors(y_test, monolithic)[0], 'r2': _errors(y_test, monolithic)[1],
+                   'kb': round(global_forest.nbytes / 1024, 1), 'batch': global_latency},
+        'routed': {'mae': _errors(y_test, routed)[0], 'r2': _errors(y_test, routed)[1],
+                   'kb': round((global_forest.nbytes + router.nbytes) / 1024, 1), 'batch': routed_latency},
+    }
+    return segments, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segment-by', nargs='+', choices=SEGMENT_FEATURES, default=list(SEGMENT_FEATURES))
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_SEGMENT_ROWS)
+    parser.add_argument('--n-estimators', type=int, default=DEFAULT_SEGMENT_ESTIMATORS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    segments, summary = run(args.segment_by, args.min_rows, args.n_estimators, args.workers, args.repeats)
+    if args.json:
+        print(json.dumps({'segments': segments, 'summary': summary}, indent=2))
+        return
+
+    print(f"Segment models by {' x '.join(summary['segment_by'])}: {summary['segment_models']} "
+          f"(trained in {summary['segment_train_s']} s)")
+    print(f"{'Segment':<28} {'test':>5} | {'global MAE':>10} {'segment MAE':>11} | "
+          f"{'global KB':>9} {'segment KB':>10} | {'global p50':>10} {'segment p50':>11}")
+    print("-" * 110)
+    for segment in segments:
+        g, s = segment['global'], segment['segment_model']
+        print(f"{segment['segment']:<28} {segment['test_rows']:>5} | {g['mae']:>10.3f} {s['mae']:>11.3f} | "
+              f"{g['kb']:>9.1f} {s['kb']:>10.1f} | {g['batch']['p50_ms']:>8.3f}ms {s['batch']['p50_ms']:>9.3f}ms")
+    g, r = summary['global'], summary['routed']
+    print("-" * 110)
+    print(f"All test rows ({summary['test_rows']}, {summary['test_rows_on_segment_models']} on segment models): "
+          f"MAE global {g['mae']:.3f} vs routed {r['mae']:.3f}, R² {g['r2']} vs {r['r2']}, "
+          f"{g['kb']:.0f} KB vs {r['kb']:.0f} KB, batch p50 {g['batch']['p50_ms']:.3f} ms vs {r['batch']['p50_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Benchmark suite: training and inference of the consumption predictor, offline on the bundled CSV
+
+Usage (from backend/):
+    python -m benchmarks.bench_suite [--output results.json] [--skip-training] [--quick]
+    python -m benchmarks.bench_suite --compare baseline.json [--against current.json] [--max-regression 0.15]
+
+A run trains the model from the bundled dataset in a temporary directory and
+measures:
+    train.*    feature preparation (cold and from the feature cache), forest
+               fit, 5-fold cross-validation and the whole train_random_forest
+    load.*     model load time from the bundle (through ModelRegistry, as the
+               API loads it) and from the legacy pickles
+    memory.*   private memory of the loaded model (tracemalloc plus the
+               forest's native arrays) and the bundle's mapped size
+    predict.*  single-row latency of predict_consumption and batch latency /
+               throughput of predict_consumption_batch at several sizes, up
+               to the 50k-row batches served by the flat forest's per-tree walk
+
+Results are one flat {metric: value} dict plus the environment they were
+measured in, written as JSON. --compare runs the suite (or reads --against)
+and compares it with a baseline file: every shared metric gets its change in
+percent, and the exit code is 1 when a gated metric (by default the
+prediction hot path, predict.* p50 and throughput) regressed by more than
+--max-regression.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from aidata.consumption_predictor import ConsumptionPredictor
+from aidata.model_registry import ModelRegistry, forest_native_nbytes
+from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+from benchmarks.common import BACKEND_DIR, DATASET_PATH, latency_summary, measure_latency, random_feature_rows
+
+# The 10k and 50k batches run through the bundle's per-tree walk (see forest_engine)
+BATCH_SIZES = (1, 10, 100, 1000, 10_000, 50_000)
+BATCH_REPEATS = {1: 300, 10: 300, 100: 100, 1000: 30, 10_000: 10, 50_000: 5}
+ROW_REPEATS = 1000
+LOAD_REPEATS = 10
+TRAIN_REPEATS = 3
+
+DEFAULT_GATE = ('predict.',)
+# Reported but never a regression (sizes of the run, not timings)
+INFORMATIONAL_METRICS = ('train.rows',)
+DEFAULT_MAX_REGRESSION = 0.15
+RESULTS_FORMAT_VERSION = 1
+
+
+def _environment():
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+    }
+
+
+def _timed(fn, repeats=1):
+    """Median wall time of fn in seconds, and its last result"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), result
+
+
+def bench_training(work_dir, repeats=TRAIN_REPEATS):
+    """Trains the model into work_dir/model; returns (metrics, trainer)"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import cross_val_score
+
+    cache_dir = os.path.join(work_dir, 'feature_cache')
+    trainer = AirlineConsumptionPredictor(DATASET_PATH)
+    metrics = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics['train.prepare_features_s'], _ = _timed(lambda: trainer.prepare_features(cache_dir, use_cache=False))
+        trainer.prepare_features(cache_dir)
+        metrics['train.prepare_features_cached_s'], _ = _timed(lambda: trainer.prepare_features(cache_dir), repeats)
+
+        X = trainer.df_final[trainer.feature_columns]
+        y = trainer.df_final[trainer.target_column]
+        params = {'n_estimators': 100, 'random_state': 42, 'n_jobs': -1}
+        metrics['train.fit_s'], _ = _timed(lambda: RandomForestRegressor(**params).fit(X, y), repeats)
+        metrics['train.cv_s'], _ = _timed(
+            lambda: cross_val_score(RandomForestRegressor(**params), X, y, cv=5, scoring='r2'))
+        metrics['train.total_s'], _ = _timed(trainer.train_random_forest)
+        if not trainer.save_model(os.path.join(work_dir, 'model')):
+            raise RuntimeError("Could not save the trained model")
+    metrics['train.rows'] = len(X)
+    return metrics, trainer
+
+
+def bench_loading(model_dir, repeats=LOAD_REPEATS):
+    """Load time and memory of the bundle (through ModelRegistry) and of the legacy pickles"""
+    metrics = {}
+    registry_times, registry_memory = [], []
+    logging.getLogger('aidata.model_registry').setLevel(logging.WARNING)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            registry = ModelRegistry(model_dir, trace_memory=True)
+            registry.load()
+            status = registry.status()
+            registry_times.append(status['load_time_ms'])
+            registry_memory.append(status['memory_mb'])
+        metrics['load.bundle_ms'] = float(np.median(registry_times))
+        metrics['memory.bundle_mb'] = float(np.median(registry_memory))
+        metrics['memory.bundle_mapped_mb'] = status['mapped_mb']
+
+        pickle_times = []
+        for _ in range(max(1, repeats // 2)):
+            predictor = ConsumptionPredictor()
+            tracemalloc.start()
+            start = time.perf_counter()
+            predictor.load_model(model_dir)
+            pickle_times.append((time.perf_counter() - start) * 1000)
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        metrics['load.pickle_ms'] = float(np.median(pickle_times))
+        metrics['memory.pickle_mb'] = round((memory + forest_native_nbytes(predictor.model)) / (1024 * 1024), 2)
+    return metrics, registry.get_predictor()
+
+
+def _batch_arguments(predictor, n_rows, seed=0):
+    """predict_consumption_batch arguments for n_rows random but valid rows"""
+    rows = random_feature_rows(predictor, n_rows, seed)
+    tables = predictor.encoding_tables
+    return {
+        'origin': tables['Origin'].classes[rows[:, 0].astype(int)],
+        'flight_type': tables['Flight_Type'].classes[rows[:, 1].astype(int)],
+        'service_type': tables['Service_Type'].classes[rows[:, 2].astype(int)],
+        'passenger_count': rows[:, 3].astype(int),
+        'product_name': tables['Product_Name'].classes[rows[:, 4].astype(int)],
+        'unit_cost': rows[:, 5],
+        'has_issues': rows[:, 6].astype(int),
+    }
+
+
+def bench_prediction(predictor, scale=1.0):
+    """Latency of the public prediction API (no prediction cache, no grid)"""
+    metrics = {}
+    arguments = _batch_arguments(predictor, max(BATCH_SIZES))
+    row = {name: values[0] for name, values in arguments.items()}
+    row['unit_cost'] = float(row['unit_cost'])
+    summary = latency_summary(measure_latency(lambda: predictor.predict_consumption(**row),
+                                              max(10, int(ROW_REPEATS * scale))))
+    metrics['predict.row.p50_ms'] = summary['p50_ms']
+    metrics['predict.row.p99_ms'] = summary['p99_ms']
+
+    for batch_size in BATCH_SIZES:
+        batch = {name: values[:batch_size] for name, values in arguments.items()}
+        timings = measure_latency(lambda: predictor.predict_consumption_batch(**batch),
+                                  max(5, int(BATCH_REPEATS[batch_size] * scale)))
+        summary = latency_summary(timings)
+        metrics[f'predict.batch_{batch_size}.p50_ms'] = summary['p50_ms']
+        metrics[f'predict.batch_{batch_size}.p99_ms'] = summary['p99_ms']
+        metrics[f'predict.batch_{batch_size}.rows_per_s'] = round(batch_size / (summary['p50_ms'] / 1000), 1)
+    return metrics
+
+
+def run(skip_training=False, model_dir=None, scale=1.0):
+    """
+    Run the suite; returns {'format_version', 'created_at', 'environment', 'metrics'}
+    skip_training: benchmark the model already in model_dir instead of training one
+    """
+    metrics = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        if not skip_training:
+            train_metrics, _ = bench_training(work_dir, repeats=max(1, int(TRAIN_REPEATS * scale)))
+            metrics.update(train_metrics)
+            model_dir = os.path.join(work_dir, 'model')
+        if model_dir is None:
+            raise ValueError("--skip-training needs --model-dir")
+        load_metrics, predictor = bench_loading(model_dir, repeats=max(2, int(LOAD_REPEATS * scale)))
+        if predictor is None:
+            raise RuntimeError(f"Could not load a model from '{model_dir}'")
+        metrics.update(load_metrics)
+        metrics.update(bench_prediction(predictor, scale))
+    return {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'metrics': {name: round(float(value), 4) for name, value in metrics.items()},
+    }
+
+
+def higher_is_better(metric):
+    return metric.endswith('rows_per_s')
+
+
+def is_gated(metric, gate=DEFAULT_GATE):
+    """Gated metrics fail a comparison: hot-path p50 latencies and throughputs under the gate prefixes"""
+    return metric.startswith(tuple(gate)) and (metric.endswith('p50_ms') or higher_is_better(metric))
+
+
+def compare(baseline, current, max_regression=DEFAULT_MAX_REGRESSION, gate=DEFAULT_GATE):
+    """
+    Per-metric comparison of two result dicts
+    Returns (rows, regressions): rows of {'metric', 'baseline', 'current', 'change_pct',
+    'regression', 'gated'}; regressions lists the gated metrics over max_regression
+    """
+    rows, regressions = [], []
+    for metric in sorted(set(baseline['metrics']) & set(current['metrics'])):
+        before, after = baseline['metrics'][metric], current['metrics'][metric]
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better(metric) else change
+        gated = is_gated(metric, gate)
+        regression = metric not in INFORMATIONAL_METRICS and worse > max_regression
+        rows.append({'metric': metric, 'baseline': before, 'current': after,
+                     'change_pct': round(change * 100, 2), 'regression': regression, 'gated': gated})
+        if regression and gated:
+            regressions.append(metric)
+    return rows, regressions
+
+
+def _load_results(path):
+    with open(path) as f:
+        results = json.load(f)
+    if results.get('format_version') != RESULTS_FORMAT_VERSION:
+        raise ValueError(f"'{path}' is not a benchmark results file (format {results.get('format_version')})")
+    return results
+
+
+def _print_results(results):
+    env = results['environment']
+    print(f"Benchmark suite ({results['created_at']}, commit {env['commit']}, Python {env['python']}, "
+          f"numpy {env['numpy']}, sklearn {env['sklearn']}, {env['cpu_count']} CPUs)")
+    print("-" * 60)
+    for metric, value in results['metrics'].items():
+        print(f"{metric:<40} {value:>16,.4f}")
+
+
+def _print_comparison(baseline, current, rows, regressions, max_regression):
+    for key in ('python', 'numpy', 'sklearn', 'cpu_count', 'platform'):
+        if baseline['environment'].get(key) != current['environment'].get(key):
+            print(f"⚠️ {key} differs: {baseline['environment'].get(key)} vs {current['environment'].get(key)}")
+    print(f"Baseline {baseline['environment']['commit']} ({baseline['created_at']}) vs "
+          f"current {current['environment']['commit']} ({current['created_at']})")
+    print(f"{'Metric':<40} {'baseline':>14} {'current':>14} {'change':>9}")
+    print("-" * 82)
+    for row in rows:
+        marker = ' ❌' if row['regression'] and row['gated'] else (' ⚠️' if row['regression'] else '')
+        print(f"{row['metric']:<40} {row['baseline']:>14,.4f} {row['current']:>14,.4f} "
+              f"{row['change_pct']:>+8.1f}%{marker}")
+    print("-" * 82)
+    if regressions:
+        print(f"❌ {len(regressions)} hot-path regression(s) over {max_regression:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"✅ No hot-path regression over {max_regression:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="write the results JSON to this file")
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    parser.add_argument('--skip-training', action='store_true', help="only load and predict with --model-dir")
+    parser.add_argument('--model-dir', default=None)
+    parser.add_argument('--quick', action='store_true', help="a fifth of the repetitions (noisier)")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare with a baseline results file")
+    parser.add_argument('--against', metavar='CURRENT', help="results file to compare instead of running the suite")
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="relative slowdown of a gated metric that fails --compare")
+    parser.add_argument('--gate', nargs='+', default=list(DEFAULT_GATE),
+                        help="metric prefixes whose p50/throughput regressions fail --compare")
+    args = parser.parse_args()
+
+    if args.against:
+        current = _load_results(args.against)
+    else:
+        current = run(args.skip_training, args.model_dir, scale=0.2 if args.quick else 1.0)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+
+    if not args.compare:
+        if args.json:
+            print(json.dumps(current, indent=2))
+        else:
+            _print_results(current)
+        return 0
+
+    baseline = _load_results(args.compare)
+    rows, regressions = compare(baseline, current, args.max_regression, args.gate)
+    if args.json:
+        print(json.dumps({'baseline': baseline['environment'], 'current': current['environment'],
+                          'metrics': rows, 'regressions': regressions}, indent=2))
+    else:
+        _print_comparison(baseline, current, rows, regressions, args.max_regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
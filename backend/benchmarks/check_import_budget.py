@@ -0,0 +1,76 @@
+"""
+Import-time budget for the serving modules
+
+Usage (from backend/):
+    python -m benchmarks.check_import_budget [--budget-ms 1500] [--json]
+
+Imports the modules a serving worker needs in a fresh interpreter, measures
+the wall time, and fails (exit code 1) when it is over budget or when a
+training-only dependency (pandas, sklearn, matplotlib, seaborn) was pulled in.
+Run in CI so a stray top-level import shows up before it reaches the workers.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+SERVING_MODULES = (
+    'aidata.consumption_predictor',
+    'aidata.model_registry',
+    'aidata.prediction_grid',
+    'aidata.prediction_cache',
+    'aidata.fleet_prediction',
+    'aidata.load_optimizer',
+    'inference_executor',
+    'micro_batcher',
+)
+
+FORBIDDEN_MODULES = ('pandas', 'sklearn', 'matplotlib', 'seaborn')
+
+DEFAULT_BUDGET_MS = 1500
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    'import_ms': round(elapsed_ms, 1),
+    'forbidden_loaded': [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(modules=SERVING_MODULES, forbidden=FORBIDDEN_MODULES):
+    """Import the modules in a fresh interpreter; returns its import time and forbidden imports"""
+    probe = _PROBE.format(modules=tuple(modules), forbidden=tuple(forbidden))
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--json', action='store_true', help="print machine-readable results")
+    args = parser.parse_args()
+
+    result = measure()
+    result['budget_ms'] = args.budget_ms
+    result['ok'] = result['import_ms'] <= args.budget_ms and not result['forbidden_loaded']
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Serving modules imported in {result['import_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        if result['forbidden_loaded']:
+            print(f"❌ Training-only modules imported: {', '.join(result['forbidden_loaded'])}")
+        elif not result['ok']:
+            print("❌ Import time over budget")
+        else:
+            print("✅ Import budget respected")
+    return 0 if result['ok'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Shared helpers for the benchmark scripts (run from backend/ with python -m benchmarks.<name>)
+"""
+
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+
+from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(BACKEND_DIR, 'aidata', '(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv')
+DEFAULT_MODEL_DIR = os.path.join(BACKEND_DIR, 'airline_consumption_model')
+
+
+def load_or_train_predictor(model_dir=DEFAULT_MODEL_DIR, require_sklearn=False, **kwargs):
+    """
+    Load the saved model, or train one from the bundled dataset when the
+    forest is not on disk (the repository does not ship the pickled forest)
+    require_sklearn: skip the model bundle, which only holds the flat forest
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = AirlineConsumptionPredictor.load_trained_model(model_dir, **kwargs)
+        if predictor is not None and require_sklearn and predictor.model is None:
+            predictor = AirlineConsumptionPredictor(csv_file_path=None, **kwargs)
+            if not predictor.load_model(model_dir):
+                predictor = None
+        if predictor is None:
+            predictor = AirlineConsumptionPredictor(DATASET_PATH, **kwargs)
+            predictor.prepare_features()
+            predictor.train_random_forest()
+    return predictor
+
+
+def random_feature_rows(predictor, n_rows, seed=0):
+    """Encoded feature matrix with random but valid category codes"""
+    rng = np.random.default_rng(seed)
+    tables = predictor.encoding_tables
+    return np.column_stack([
+        rng.integers(0, len(tables['Origin']), n_rows),
+        rng.integers(0, len(tables['Flight_Type']), n_rows),
+        rng.integers(0, len(tables['Service_Type']), n_rows),
+        rng.integers(50, 400, n_rows),
+        rng.integers(0, len(tables['Product_Name']), n_rows),
+        rng.choice([0.06, 0.08, 0.35, 0.45, 0.5, 0.55, 0.65, 0.75, 0.8, 2.1], n_rows),
+        rng.integers(0, 2, n_rows),
+    ]).astype(float)
+
+
+def measure_latency(fn, repeats, warmup=3):
+    """Call fn repeatedly and return per-call latencies in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings[i] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def latency_summary(timings):
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 4),
+        'p99_ms': round(float(np.percentile(timings, 99)), 4),
+        'mean_ms': round(float(timings.mean()), 4),
+        'calls': int(len(timings)),
+    }
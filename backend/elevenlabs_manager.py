@@ -4,6 +4,8 @@ import base64
 from dotenv import load_dotenv
 from typing import Optional
 import logging
+import threading
+from collections import OrderedDict
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +19,13 @@ class ElevenLabsManager:
         self.api_key = os.getenv("ELEVENLABS_API_KEY")
         self.voice_id = os.getenv("ELEVENLABS_VOICE_ID", "pNInz6obpgDQGcFmaJgB")
         self.model_id = "eleven_multilingual_v2"
+        # Sin timeout una llamada colgada retiene su hilo indefinidamente
+        self.timeout_s = float(os.getenv("ELEVENLABS_TIMEOUT", "10"))
+        # Audio ya generado por texto: las respuestas del escáner son siempre las mismas frases
+        # LRU compartida por los hilos de tts_executor
+        self._audio_cache = OrderedDict()
+        self._audio_cache_lock = threading.Lock()
+        self._audio_cache_size = int(os.getenv("ELEVENLABS_AUDIO_CACHE_SIZE", "32"))
         
         if not self.api_key:
             logger.warning("⚠️ ELEVENLABS_API_KEY no encontrada en variables de entorno")
@@ -29,6 +38,13 @@ class ElevenLabsManager:
             logger.error("❌ API key de ElevenLabs no configurada")
             return None
         
+        cache_key = (self.voice_id, self.model_id, text)
+        with self._audio_cache_lock:
+            cached = self._audio_cache.get(cache_key)
+            if cached is not None:
+                self._audio_cache.move_to_end(cache_key)
+                return cached
+        
         url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
         
         headers = {
@@ -48,12 +64,17 @@ class ElevenLabsManager:
         
         try:
             logger.info(f"🎙️ Generando audio para: '{text[:50]}...'")
-            response = requests.post(url, json=data, headers=headers)
+            response = requests.post(url, json=data, headers=headers, timeout=self.timeout_s)
             response.raise_for_status()
             
             # Convertir el audio a base64
             audio_base64 = base64.b64encode(response.content).decode('utf-8')
             logger.info("✅ Audio generado y convertido a base64")
+            with self._audio_cache_lock:
+                self._audio_cache[cache_key] = audio_base64
+                self._audio_cache.move_to_end(cache_key)
+                while len(self._audio_cache) > self._audio_cache_size:
+                    self._audio_cache.popitem(last=False)
             return audio_base64
             
         except requests.exceptions.HTTPError as http_err:
@@ -0,0 +1,171 @@
+"""
+Off-loop execution of model inference
+
+The forest is synchronous CPU work; called directly from an ``async def``
+handler it blocks the uvicorn event loop, and barcode scans and chat requests
+queue behind it. InferenceExecutor runs it on a dedicated, size-bounded thread
+pool with a per-request timeout, and EventLoopLagMonitor measures how late the
+event loop wakes up so blocking work shows up as a number.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBusyError(Exception):
+    """All worker and queue slots are taken"""
+
+
+class InferenceTimeoutError(Exception):
+    """The inference call did not finish within its timeout"""
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for model calls
+    At most max_workers calls run and max_queue wait; further submissions fail
+    fast with InferenceBusyError instead of piling up. A call that times out
+    keeps its slot until its thread really finishes, so timeouts cannot
+    overcommit the pool.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, timeout_s=10.0, thread_name_prefix="inference"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._stats_lock = threading.Lock()
+        self._run_times_ms = deque(maxlen=1000)
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and await its result
+        Raises InferenceBusyError when the pool is saturated and
+        InferenceTimeoutError after timeout seconds (default: timeout_s)
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise InferenceBusyError(f"Inference pool saturated ({self.max_workers} workers, {self.max_queue} queued)")
+
+        with self._stats_lock:
+            self.in_flight += 1
+        try:
+            future = self.executor.submit(self._call, fn, args, kwargs)
+        except Exception:
+            self._release(failed=True)
+            raise
+        future.add_done_callback(lambda done: self._release(failed=done.cancelled() or done.exception() is not None))
+
+        timeout = self.timeout_s if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise InferenceTimeoutError(f"Inference did not finish within {timeout} s")
+
+    def _call(self, fn, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self._run_times_ms.append(elapsed_ms)
+
+    def _release(self, failed):
+        with self._stats_lock:
+            self.in_flight -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+        self._slots.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._stats_lock:
+            run_times = list(self._run_times_ms)
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'timeout_s': self.timeout_s,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'run_ms_p50': round(_percentile(run_times, 50), 3),
+                'run_ms_p99': round(_percentile(run_times, 99), 3),
+            }
+
+
+class EventLoopLagMonitor:
+    """
+    Background task that sleeps for interval_s and records how much later than
+    requested it woke up; sustained lag means something is blocking the loop
+    """
+
+    def __init__(self, interval_s=0.25, window=240):
+        self.interval_s = interval_s
+        self._lags_ms = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+            self._lags_ms.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms > 250:
+                logger.warning(f"⚠️ Event loop blocked for {lag_ms:.0f} ms")
+
+    def stats(self):
+        lags = list(self._lags_ms)
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'interval_ms': self.interval_s * 1000,
+            'samples': len(lags),
+            'last_ms': round(lags[-1], 3) if lags else 0.0,
+            'p50_ms': round(_percentile(lags, 50), 3),
+            'p99_ms': round(_percentile(lags, 99), 3),
+            'max_ms': round(self.max_lag_ms, 3),
+        }
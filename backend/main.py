@@ -51,6 +51,40 @@ else:
 # --- Import Managers ---
 from snowflake_manager import snowflake_manager
 from elevenlabs_manager import elevenlabs_manager
+from aidata.model_registry import ModelRegistry
+from aidata.category_encoding import UnknownCategoryError
+from aidata.prediction_cache import PredictionCache
+from inference_executor import EventLoopLagMonitor, InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+from micro_batcher import MicroBatcher
+
+# --- Prediction model (loaded once per process, hot-reloaded when the files change) ---
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+)
+model_registry = ModelRegistry(
+    str(script_path / "airline_consumption_model"),
+    prediction_cache=prediction_cache,
+    use_prediction_grid=os.getenv("PREDICTION_GRID", "0") == "1",
+    trace_memory=os.getenv("MODEL_TRACE_MEMORY", "0") == "1"  # debugging only: tracemalloc on every load
+)
+if not model_registry.load():
+    logger.error("❌ Failed to load model. Run aidata/Random_Forest_Regression.py to train and save it.")
+
+# Inference runs on a bounded pool so the forest never blocks the event loop
+inference_executor = InferenceExecutor(
+    max_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE", "16")),
+    timeout_s=float(os.getenv("INFERENCE_TIMEOUT", "10"))
+)
+loop_lag_monitor = EventLoopLagMonitor()
+
+# Concurrent /api/predict requests are coalesced into shared forest calls
+micro_batcher = MicroBatcher(
+    inference_executor,
+    window_ms=float(os.getenv("MICRO_BATCH_WINDOW_MS", "2")),
+    max_rows=int(os.getenv("MICRO_BATCH_MAX_ROWS", "2048"))
+)
 
 # --- Reuse existing ia_gemini (same initialization used in snowflake/ia_gemini.py)
 # Ensure Python can import the module located in backend/snowflake
@@ -126,6 +160,10 @@ class PredictRequest(BaseModel):
      passenger_count: int
      product_name: List[str] # Corrected typing
      unit_cost: List[float] # Corrected typing (assuming costs can be decimals)
+     service_level: Optional[float] = None # e.g. 0.95: recommend stock at the demand P95
+
+# Demand quantiles reported when a service level is requested
+REPORTED_QUANTILES = (0.5, 0.9, 0.95)
 # Chat models
 class ChatMessageRequest(BaseModel): message: str
 class ChatMessageResponse(BaseModel): reply: str
@@ -207,7 +245,8 @@ async def health_check():
     # ... (Existing code) ...
      return {
         "status": "healthy",
-        "snowflake_connected": snowflake_manager.connection is not None,
+        "snowflake_connected": snowflake_manager.pool is not None,
+        "snowflake_pool": snowflake_manager.pool_stats(),
         # "elevenlabs_configured": elevenlabs_manager.api_key is not None # Check if still needed
         "gemini_model_loaded": modelo_gemini is not None
      }
@@ -217,40 +256,60 @@ async def health_check():
 async def predict_consumption(data: PredictRequest):
     logger.info(f"🔄 Recibiendo request de predicción para Flight ID: {data.flight_id}") # Log flight_id
     try:
-        # IMPORTANT: Make sure this import path is correct relative to main.py
-        # If 'aidata' is a folder at the same level as 'backend', this might need adjustment
-        from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
-
-        # Assuming model file is in the same directory or accessible path
-        model_path = "airline_consumption_model.joblib" # Or full path if needed
-        predictor = AirlineConsumptionPredictor.load_trained_model(model_path)
+        predictor = model_registry.get_predictor()
 
         if predictor is None:
-            logger.error(f"Modelo no encontrado o no cargado desde {model_path}")
-            raise HTTPException(status_code=500, detail=f"Model not loaded from {model_path}")
+            logger.error(f"Modelo no cargado desde {model_registry.model_dir}")
+            raise HTTPException(status_code=503, detail="Prediction model not loaded")
+
+        # One feature matrix and a single model.predict for the whole product list
+        n_products = min(len(data.product_name), len(data.unit_cost))
+        product_names = data.product_name[:n_products]
+        unit_costs = data.unit_cost[:n_products]
+
+        if data.service_level is not None:
+            if not 0 < data.service_level < 1:
+                raise HTTPException(status_code=400, detail="service_level must be between 0 and 1")
+            # Point prediction and quantiles come from the same forest traversal
+            predicted_units, quantile_units = await inference_executor.run(
+                predictor.predict_consumption_quantiles,
+                origin=data.origin, flight_type=data.flight_type, service_type=data.service_type,
+                passenger_count=data.passenger_count, product_name=product_names, unit_cost=unit_costs,
+                has_issues=0, quantiles=REPORTED_QUANTILES + (data.service_level,), unknown_policy='raise'
+            )
+            quantile_rows = quantile_units.T.tolist()
+        else:
+            predicted_units = await micro_batcher.predict(
+                predictor,
+                origin=data.origin, flight_type=data.flight_type, service_type=data.service_type,
+                passenger_count=data.passenger_count, product_name=product_names, unit_cost=unit_costs,
+                has_issues=0 # Assuming 0 for no issues by default
+            )
+            quantile_rows = None
 
         predictions = []
         total_units = 0
         total_cost = 0.0 # Use float
+        recommended_units = 0
+        recommended_cost = 0.0
 
-        for i, (product_name, unit_cost) in enumerate(zip(data.product_name, data.unit_cost)):
-            # Assuming predict_consumption expects these arguments
-            prediction_float = predictor.predict_consumption(
-                origin=data.origin, flight_type=data.flight_type, service_type=data.service_type,
-                passenger_count=data.passenger_count, product_name=product_name, unit_cost=unit_cost,
-                has_issues=0 # Assuming 0 for no issues by default
-            )
-            # Ensure prediction is an integer if needed by logic, but keep cost calc float
-            prediction_units = int(round(prediction_float))
-
+        for i, (product_name, unit_cost, prediction_units) in enumerate(zip(product_names, unit_costs, predicted_units.tolist())):
             product_total_cost = prediction_units * unit_cost
             total_units += prediction_units
             total_cost += product_total_cost
 
-            predictions.append({
+            product = {
                 "product_name": product_name, "unit_cost": unit_cost,
                 "predicted_units": prediction_units, "total_cost": round(product_total_cost, 2)
-            })
+            }
+            if quantile_rows is not None:
+                *quantile_values, stock = quantile_rows[i]
+                recommended_units += stock
+                recommended_cost += stock * unit_cost
+                product["quantiles"] = {f"p{round(q * 100)}": value for q, value in zip(REPORTED_QUANTILES, quantile_values)}
+                product["recommended_units"] = stock
+                product["recommended_cost"] = round(stock * unit_cost, 2)
+            predictions.append(product)
 
         logger.info(f"✅ Predicción exitosa! Total: {total_units} unidades, ${total_cost:.2f}")
 
@@ -258,6 +317,17 @@ async def predict_consumption(data: PredictRequest):
         units_per_passenger = round(total_units / data.passenger_count, 2) if data.passenger_count > 0 else 0
         cost_per_passenger = round(total_cost / data.passenger_count, 2) if data.passenger_count > 0 else 0
 
+        totals = {
+            "total_units": total_units, "total_cost": round(total_cost, 2),
+            "units_per_passenger": units_per_passenger,
+            "cost_per_passenger": cost_per_passenger
+        }
+        if quantile_rows is not None:
+            totals.update({
+                "service_level": data.service_level, "recommended_units": recommended_units,
+                "recommended_cost": round(recommended_cost, 2)
+            })
+
         return {
             "flight_info": {
                 "flight_id": data.flight_id, # Include flight_id in response
@@ -265,23 +335,43 @@ async def predict_consumption(data: PredictRequest):
                 "service_type": data.service_type, "passenger_count": data.passenger_count
             },
             "products": predictions,
-            "totals": {
-                "total_units": total_units, "total_cost": round(total_cost, 2),
-                "units_per_passenger": units_per_passenger,
-                "cost_per_passenger": cost_per_passenger
-            }
+            "totals": totals
         }
 
-    except ImportError as ie:
-         logger.error(f"❌ Error importing prediction module: {ie}. Check path 'aidata.Random_Forest_Regression'")
-         raise HTTPException(status_code=500, detail=f"Prediction module import error: {ie}")
-    except FileNotFoundError as fnfe:
-         logger.error(f"❌ Error loading model: {fnfe}. Ensure '{model_path}' exists.")
-         raise HTTPException(status_code=500, detail=f"Model file not found: {fnfe}")
+    except HTTPException:
+        raise
+    except UnknownCategoryError as e:
+        logger.warning(f"⚠️ Unknown category in prediction request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except InferenceBusyError as e:
+        logger.warning(f"⚠️ Inference pool saturated: {e}")
+        raise HTTPException(status_code=503, detail="Prediction service busy, retry shortly")
+    except InferenceTimeoutError as e:
+        logger.error(f"❌ Prediction timed out: {e}")
+        raise HTTPException(status_code=504, detail="Prediction timed out")
     except Exception as e:
         logger.exception(f"❌ Error inesperado en predict_consumption: {e}") # Use logger.exception for full traceback
         raise HTTPException(status_code=500, detail=f"Internal prediction error: {str(e)}")
 
+@app.get("/api/model/status")
+async def model_status():
+    """Served model version, load time and memory footprint"""
+    return model_registry.status()
+
+@app.get("/api/predict/cache")
+async def prediction_cache_stats():
+    """Prediction cache hit, miss and eviction counters"""
+    return prediction_cache.stats()
+
+@app.get("/api/metrics/inference")
+async def inference_metrics():
+    """Inference pool occupancy and event loop lag"""
+    return {
+        "executor": inference_executor.stats(),
+        "micro_batching": micro_batcher.stats(),
+        "event_loop_lag": loop_lag_monitor.stats()
+    }
+
 # --- List all available files in HackMTY2025_ChallengeDimensions ---
 data_root_folder = script_path / "HackMTY2025_ChallengeDimensions"
 
@@ -371,6 +461,8 @@ async def handle_chat_message(request: ChatMessageRequest):
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Iniciando Web Scanner API")
+    model_registry.start_watching()
+    loop_lag_monitor.start()
     if snowflake_manager.connect():
         snowflake_manager.create_table_if_not_exists()
     else:
@@ -379,6 +471,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Cerrando Web Scanner API")
+    model_registry.stop_watching()
+    await loop_lag_monitor.stop()
+    inference_executor.shutdown()
     snowflake_manager.disconnect()
 
 # --- Run Command ---
@@ -0,0 +1,169 @@
+"""
+Micro-batching of concurrent prediction requests
+
+Every /api/predict request holds a handful of rows (one per product), and
+each pays the full per-call cost of the forest. MicroBatcher collects the
+rows of requests that arrive within a short window (or until max_rows rows
+are waiting), runs them through the forest as one matrix on the inference
+executor and hands every request back its own slice. When the shared call
+fails, the requests of the batch are retried one at a time, so a malformed
+request only fails itself.
+"""
+
+import asyncio
+import logging
+
+import numpy as np
+
+from aidata.category_encoding import UnknownCategoryError
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    def __init__(self, predictor, columns, n_rows, future):
+        self.predictor = predictor
+        self.columns = columns
+        self.n_rows = n_rows
+        self.future = future
+
+
+def _predict_alone(predictor, request):
+    """One request on its own: its predictions or the exception it should raise"""
+    try:
+        return np.ma.getdata(predictor.predict_consumption_batch(*request.columns, unknown_policy='raise'))
+    except Exception as e:
+        return e
+
+
+def _predict_group(predictor, requests):
+    """
+    One batch call for all requests of a group (runs on the executor)
+    Returns one entry per request: its predictions or the exception it should raise
+    """
+    try:
+        columns = [np.concatenate([request.columns[i] for request in requests]) for i in range(7)]
+        origins, flight_types, service_types, passengers, products, unit_costs, issues = columns
+        predictions = predictor.predict_consumption_batch(
+            origin=origins, flight_type=flight_types, service_type=service_types,
+            passenger_count=passengers, product_name=products, unit_cost=unit_costs,
+            has_issues=issues, unknown_policy='null', deduplicate=True
+        )
+    except Exception as e:
+        if len(requests) == 1:
+            return [e]
+        logger.warning(f"⚠️ Batched prediction of {len(requests)} requests failed ({e}), "
+                       f"retrying them one at a time")
+        return [_predict_alone(predictor, request) for request in requests]
+    mask = np.ma.getmaskarray(predictions)
+    values = np.ma.getdata(predictions)
+
+    results = []
+    start = 0
+    for request in requests:
+        stop = start + request.n_rows
+        if mask[start:stop].any():
+            # Rerun just this request under 'raise' to get its own unknown values
+            try:
+                predictor.predict_consumption_batch(*request.columns, unknown_policy='raise')
+            except UnknownCategoryError as e:
+                results.append(e)
+            else:
+                results.append(UnknownCategoryError({}))
+        else:
+            results.append(values[start:stop])
+        start = stop
+    return results
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predictions into shared forest calls
+    window_ms: how long the first waiting request holds the batch open
+    max_rows: flush as soon as this many rows are waiting
+    """
+
+    def __init__(self, inference_executor, window_ms=2.0, max_rows=2048):
+        self.inference_executor = inference_executor
+        self.window_ms = window_ms
+        self.max_rows = max_rows
+        self._pending = []
+        self._pending_rows = 0
+        self._flush_handle = None
+        # Strong references: the event loop only keeps weak ones to running tasks
+        self._tasks = set()
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+
+    async def predict(self, predictor, origin, flight_type, service_type, passenger_count,
+                      product_name, unit_cost, has_issues=0):
+        """
+        Predicted units for one request's rows, as an int array
+        Raises UnknownCategoryError like predict_consumption_batch(unknown_policy='raise')
+        """
+        columns = [np.atleast_1d(np.asarray(column)) for column in
+                   (origin, flight_type, service_type, passenger_count, product_name, unit_cost, has_issues)]
+        columns = [np.asarray(column) for column in np.broadcast_arrays(*columns)]
+        n_rows = len(columns[0])
+        if n_rows == 0:
+            return np.array([], dtype=int)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(_PendingRequest(predictor, columns, n_rows, future))
+        self._pending_rows += n_rows
+
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        if not pending:
+            return
+
+        # Requests that raced a model reload go with the predictor they were given
+        groups = {}
+        for request in pending:
+            groups.setdefault(id(request.predictor), []).append(request)
+        for requests in groups.values():
+            task = asyncio.get_running_loop().create_task(self._run_group(requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_group(self, requests):
+        self.batches += 1
+        self.requests += len(requests)
+        self.rows += sum(request.n_rows for request in requests)
+        try:
+            results = await self.inference_executor.run(_predict_group, requests[0].predictor, requests)
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            if request.future.done():
+                continue
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    def stats(self):
+        return {
+            'window_ms': self.window_ms,
+            'max_rows': self.max_rows,
+            'batches': self.batches,
+            'requests': self.requests,
+            'rows': self.rows,
+            'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'avg_rows_per_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
@@ -1,16 +1,30 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List
 import logging
 import os
 import random
-from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+import secrets
+from aidata.model_registry import ModelRegistry
+from aidata.category_encoding import UnknownCategoryError
+from aidata.prediction_cache import PredictionCache
+from aidata.fleet_prediction import SCHEDULE_FORMATS, iter_spooled, spool_body, stream_fleet_predictions
+from aidata.actuals_store import DATASET_COLUMNS, ActualsStore, InvalidActualsError
+from aidata.scenario_sweep import run_sweep
+from aidata.load_optimizer import flight_totals, plan_load
+from inference_executor import EventLoopLagMonitor, InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+from micro_batcher import MicroBatcher
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import pandas as pd
-from typing import Optional
+from typing import Optional, Union
 from SnowflakeFinal import SnowflakeConnection
+from barcode_cache import BarcodeCache
+from snowflake_async import AsyncSnowflake, DatabaseBusyError, DatabaseTimeoutError
 from elevenlabs_manager import elevenlabs_manager
 import google.generativeai as genai 
 import sys
@@ -21,8 +35,15 @@ from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from datetime import datetime, timedelta
 
+# Caché de consultas de códigos de barras: los escaneos repetidos no consultan Snowflake
+barcode_cache = BarcodeCache(
+    maxsize=int(os.getenv("BARCODE_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("BARCODE_CACHE_TTL", "300")),
+    negative_ttl_seconds=float(os.getenv("BARCODE_CACHE_NEGATIVE_TTL", "30"))
+)
+
 # Global variable for the Snowflake Connection
-sf = SnowflakeConnection()
+sf = SnowflakeConnection(barcode_cache=barcode_cache)
 
 def generate_self_signed_cert(cert_file="cert.pem", key_file="key.pem"):
     """Genera certificados SSL autofirmados si no existen"""
@@ -138,9 +159,68 @@ except FileNotFoundError:
 except Exception as e:
     print(f"❌ Error al cargar CSV '{csv_full_path}': {e}")
 
-predictor = AirlineConsumptionPredictor.load_trained_model("airline_consumption_model")
-if predictor is None:
+# Modelo compartido por todo el proceso: se carga una vez y se recarga al cambiar los archivos
+prediction_cache = PredictionCache(
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+)
+model_registry = ModelRegistry(
+    "airline_consumption_model",
+    prediction_cache=prediction_cache,
+    use_prediction_grid=os.getenv("PREDICTION_GRID", "0") == "1",
+    variant=os.getenv("MODEL_VARIANT", "full"),  # "compact": bosque comprimido (python -m aidata.model_compression)
+    trace_memory=os.getenv("MODEL_TRACE_MEMORY", "0") == "1"  # solo para depurar: tracemalloc en cada carga
+)
+if not model_registry.load():
     print("❌ Failed to load model. Make sure to run Random_Forest_Regression.py first to train and save the model.")
+model_registry.start_watching()
+
+# Pool de trabajadores para las predicciones de flota (/api/predict/fleet)
+fleet_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FLEET_PREDICTION_WORKERS", "2")),
+    thread_name_prefix="fleet-predict"
+)
+
+# Pool acotado para la inferencia: el modelo no bloquea el event loop de uvicorn
+inference_executor = InferenceExecutor(
+    max_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    max_queue=int(os.getenv("INFERENCE_QUEUE", "16")),
+    timeout_s=float(os.getenv("INFERENCE_TIMEOUT", "10"))
+)
+loop_lag_monitor = EventLoopLagMonitor()
+
+# Las consultas a Snowflake corren fuera del event loop, en un pool acotado del tamaño del pool de conexiones
+db = AsyncSnowflake(
+    sf,
+    max_workers=int(os.getenv("SNOWFLAKE_WORKERS", os.getenv("SNOWFLAKE_POOL_MAX", "8"))),
+    max_queue=int(os.getenv("SNOWFLAKE_QUEUE", "32")),
+    timeout_s=float(os.getenv("SNOWFLAKE_QUERY_TIMEOUT", "15"))
+)
+# Los escaneos esperan menos que el dashboard: el operador está frente al lector
+SCAN_TIMEOUT_S = float(os.getenv("SNOWFLAKE_SCAN_TIMEOUT", "5"))
+# Máximo de códigos por solicitud a /api/check_barcodes
+MAX_BARCODES_PER_REQUEST = int(os.getenv("CHECK_BARCODES_MAX", "5000"))
+# Endpoints de administración: exigen la cabecera X-Admin-Token; sin ADMIN_TOKEN quedan deshabilitados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# El audio de ElevenLabs es una llamada HTTP bloqueante: corre en su propio pool
+# y un escaneo nunca espera más de TTS_TIMEOUT segundos por él
+tts_executor = InferenceExecutor(
+    max_workers=int(os.getenv("TTS_WORKERS", "2")),
+    max_queue=int(os.getenv("TTS_QUEUE", "16")),
+    timeout_s=float(os.getenv("TTS_TIMEOUT", "3")),
+    thread_name_prefix="tts"
+)
+
+# Las predicciones concurrentes se agrupan en una sola llamada al modelo
+micro_batcher = MicroBatcher(
+    inference_executor,
+    window_ms=float(os.getenv("MICRO_BATCH_WINDOW_MS", "2")),
+    max_rows=int(os.getenv("MICRO_BATCH_MAX_ROWS", "2048"))
+)
+
+# Datos reales post-vuelo para el reentrenamiento (python -m aidata.retrainer, en otro proceso)
+actuals_store = ActualsStore()
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -167,6 +247,71 @@ class PredictRequest(BaseModel):
     passenger_count: int
     product_name: List[str]
     unit_cost: List[float]
+    service_level: Optional[float] = None  # p.ej. 0.95: stock recomendado en el cuantil 95
+
+# Cuantiles de demanda reportados cuando se pide un nivel de servicio
+REPORTED_QUANTILES = (0.5, 0.9, 0.95)
+
+# Rango inclusivo para un eje del barrido (p.ej. pasajeros de 100 a 300 de 10 en 10)
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float
+
+class SweepAxes(BaseModel):
+    passenger_count: Optional[Union[List[int], SweepRange]] = None
+    service_type: Optional[List[str]] = None
+    unit_cost: Optional[Union[List[float], SweepRange]] = None
+
+# Vuelo base más los ejes a barrer; los ejes no barridos toman el valor del vuelo base
+class SweepRequest(BaseModel):
+    origin: str
+    flight_type: str
+    service_type: str
+    passenger_count: int
+    product_name: List[str]
+    unit_cost: List[float]
+    sweep: SweepAxes
+
+# Producto candidato a cargar: costo, margen por unidad vendida y (opcional) peso y tope de unidades
+class LoadProduct(BaseModel):
+    product_name: str
+    unit_cost: float
+    margin: float
+    unit_weight: Optional[float] = None
+    max_units: Optional[int] = None
+
+class LoadFlight(BaseModel):
+    flight_id: str
+    origin: str
+    flight_type: str
+    service_type: str
+    passenger_count: int
+    budget: float  # en la unidad de budget_type (costo o peso)
+    products: List[LoadProduct]
+
+class LoadPlanRequest(BaseModel):
+    budget_type: str = "cost"  # "cost" o "weight"
+    flights: List[LoadFlight]
+
+# Consumo real de un producto en un vuelo ya realizado
+class ActualRecord(BaseModel):
+    flight_id: str
+    origin: str
+    date: Optional[str] = None  # por defecto, la fecha de recepción
+    flight_type: str
+    service_type: str
+    passenger_count: int
+    product_id: Optional[str] = None
+    product_name: str
+    standard_specification_qty: Optional[int] = None  # por defecto, consumido + devuelto
+    quantity_consumed: int
+    quantity_returned: int
+    unit_cost: float
+    crew_feedback: Optional[str] = None
+
+class ActualsRequest(BaseModel):
+    records: List[ActualRecord]
 
 class BarcodeResponse(BaseModel):
     exists: bool
@@ -180,6 +325,24 @@ class BarcodeResponse(BaseModel):
 class BarcodeRequest(BaseModel):
     barcode: str
 
+# Bandeja completa de códigos de barras de un escáner
+class BarcodesRequest(BaseModel):
+    barcodes: List[str]
+
+class BarcodeMatch(BaseModel):
+    barcode: str
+    productID: Optional[str] = None
+    productName: Optional[str] = None
+    quantity: Optional[int] = None
+    lot: Optional[str] = None
+    expirationDate: Optional[str] = None
+    daysUntilExpiration: Optional[int] = None
+
+class BarcodesResponse(BaseModel):
+    found: List[BarcodeMatch]
+    not_found: List[str]
+    summary: dict
+
 class SaveResponse(BaseModel):
     success: bool
     message: str
@@ -276,33 +439,82 @@ async def predict_consumption(data: PredictRequest):
     try:
         logger.info(f"🔄 Recibiendo request de predicción: {data.flight_id}")
         
-        # SIMULACIÓN: Generar predicciones aleatorias para cada producto
-        predictions = []
-        total_units = 0
-        total_cost = 0
-        
-        for product_name, unit_cost in zip(data.product_name, data.unit_cost):
-            # Generar una predicción aleatoria basada en el número de pasajeros
-            current_prediction = predictor.predict_consumption(
+        predictor = model_registry.get_predictor()
+        if predictor is None:
+            raise HTTPException(status_code=503, detail="Modelo de predicción no disponible")
+
+        # Todos los productos del vuelo en una sola inferencia
+        n_products = min(len(data.product_name), len(data.unit_cost))
+        product_names = data.product_name[:n_products]
+        unit_costs = data.unit_cost[:n_products]
+
+        if data.service_level is not None:
+            if not 0 < data.service_level < 1:
+                raise HTTPException(status_code=400, detail="service_level debe estar entre 0 y 1")
+            # Predicción puntual y cuantiles salen del mismo recorrido del bosque
+            predicted_units, quantile_units = await inference_executor.run(
+                predictor.predict_consumption_quantiles,
+                origin=data.origin,
+                flight_type=data.flight_type,
+                service_type=data.service_type,
+                passenger_count=data.passenger_count,
+                product_name=product_names,
+                unit_cost=unit_costs,
+                has_issues=0,
+                quantiles=REPORTED_QUANTILES + (data.service_level,),
+                unknown_policy='raise'
+            )
+            quantile_rows = quantile_units.T.tolist()
+        else:
+            predicted_units = await micro_batcher.predict(
+                predictor,
                 origin=data.origin,
                 flight_type=data.flight_type,
                 service_type=data.service_type,
                 passenger_count=data.passenger_count,
-                product_name=product_name,
-                unit_cost=unit_cost,
+                product_name=product_names,
+                unit_cost=unit_costs,
                 has_issues=0
             )
+            quantile_rows = None
+
+        predictions = []
+        total_units = 0
+        total_cost = 0
+        recommended_units = 0
+        recommended_cost = 0
+
+        for i, (product_name, unit_cost, current_prediction) in enumerate(zip(product_names, unit_costs, predicted_units.tolist())):
             total_units += current_prediction
             total_cost += current_prediction * unit_cost
-            predictions.append({
+            product = {
                 "product_name": product_name,
                 "unit_cost": unit_cost,
                 "predicted_units": current_prediction,
                 "total_cost": round(current_prediction * unit_cost, 2)
-            })
+            }
+            if quantile_rows is not None:
+                *quantile_values, stock = quantile_rows[i]
+                recommended_units += stock
+                recommended_cost += stock * unit_cost
+                product["quantiles"] = {f"p{round(q * 100)}": value for q, value in zip(REPORTED_QUANTILES, quantile_values)}
+                product["recommended_units"] = stock
+                product["recommended_cost"] = round(stock * unit_cost, 2)
+            predictions.append(product)
 
         logger.info(f"✅ Predicción exitosa! Total: {total_units} unidades, ${total_cost:.2f}")
 
+        totals = {
+            "total_units": total_units,
+            "total_cost": round(total_cost, 2),
+            "units_per_passenger": round(total_units / data.passenger_count, 2),
+            "cost_per_passenger": round(total_cost / data.passenger_count, 2)
+        }
+        if quantile_rows is not None:
+            totals["service_level"] = data.service_level
+            totals["recommended_units"] = recommended_units
+            totals["recommended_cost"] = round(recommended_cost, 2)
+
         return {
             "flight_info": {
                 "flight_id": data.flight_id,
@@ -312,18 +524,256 @@ async def predict_consumption(data: PredictRequest):
                 "passenger_count": data.passenger_count
             },
             "products": predictions,
-            "totals": {
-                "total_units": total_units,
-                "total_cost": round(total_cost, 2),
-                "units_per_passenger": round(total_units / data.passenger_count, 2),
-                "cost_per_passenger": round(total_cost / data.passenger_count, 2)
-            }
+            "totals": totals
         }
 
+    except HTTPException:
+        raise
+    except UnknownCategoryError as e:
+        logger.warning(f"⚠️ Categoría desconocida en predict_consumption: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except InferenceBusyError as e:
+        logger.warning(f"⚠️ Pool de inferencia saturado: {e}")
+        raise HTTPException(status_code=503, detail="Servicio de predicción saturado, intenta de nuevo")
+    except InferenceTimeoutError as e:
+        logger.error(f"❌ Timeout en predict_consumption: {e}")
+        raise HTTPException(status_code=504, detail="La predicción tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error en predict_consumption: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
     
+@app.post("/api/predict/sweep")
+async def predict_sweep(data: SweepRequest):
+    """
+    Análisis what-if: evalúa la malla cartesiana de service_type x passenger_count x unit_cost
+    para todos los productos del vuelo base en una sola inferencia.
+    Devuelve las matrices units[servicio][pasajeros][costo][producto], total_units y total_cost.
+    """
+    predictor = model_registry.get_predictor()
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="Modelo de predicción no disponible")
+
+    sweep = data.sweep.model_dump(exclude_none=True)
+    try:
+        result = await inference_executor.run(
+            run_sweep, predictor,
+            origin=data.origin,
+            flight_type=data.flight_type,
+            service_type=data.service_type,
+            passenger_count=data.passenger_count,
+            product_name=data.product_name,
+            unit_cost=data.unit_cost,
+            sweep=sweep
+        )
+    except UnknownCategoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Barrido inválido: {e}")
+    except InferenceBusyError:
+        raise HTTPException(status_code=503, detail="Servicio de predicción saturado, intenta de nuevo")
+    except InferenceTimeoutError:
+        raise HTTPException(status_code=504, detail="El barrido tardó demasiado")
+
+    logger.info(f"📊 Barrido de {result['points']} escenarios ({result['rows']} filas)")
+    return {
+        "dims": result["dims"],
+        "axes": result["axes"],
+        "units": result["units"].tolist(),
+        "total_units": result["total_units"].tolist(),
+        "total_cost": result["total_cost"].tolist(),
+        "points": result["points"],
+        "rows": result["rows"]
+    }
+
+@app.post("/api/optimize/load")
+async def optimize_load(data: LoadPlanRequest):
+    """
+    Plan de carga con presupuesto: para cada vuelo elige cuántas unidades cargar de cada producto
+    para maximizar el margen esperado de ventas sin pasar el presupuesto (costo o peso) del vuelo.
+    La demanda de cada producto es la distribución de las predicciones de los árboles del modelo;
+    todos los vuelos se optimizan juntos en una sola inferencia.
+    """
+    predictor = model_registry.get_predictor()
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="Modelo de predicción no disponible")
+    if not data.flights:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un vuelo")
+
+    rows = [(i, flight, product) for i, flight in enumerate(data.flights) for product in flight.products]
+    if not rows:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un producto")
+    if data.budget_type == "weight" and any(product.unit_weight is None for _, _, product in rows):
+        raise HTTPException(status_code=400, detail="budget_type 'weight' requiere unit_weight en cada producto")
+
+    flight_index = [i for i, _, _ in rows]
+    budgets = [flight.budget for flight in data.flights]
+    max_units = [product.max_units for _, _, product in rows]
+    try:
+        plan = await inference_executor.run(
+            plan_load, predictor,
+            flight_index=flight_index,
+            origin=[flight.origin for _, flight, _ in rows],
+            flight_type=[flight.flight_type for _, flight, _ in rows],
+            service_type=[flight.service_type for _, flight, _ in rows],
+            passenger_count=[flight.passenger_count for _, flight, _ in rows],
+            product_name=[product.product_name for _, _, product in rows],
+            unit_cost=[product.unit_cost for _, _, product in rows],
+            margin=[product.margin for _, _, product in rows],
+            unit_weight=[product.unit_weight for _, _, product in rows] if data.budget_type == "weight" else None,
+            budget=budgets,
+            budget_type=data.budget_type,
+            max_units=max_units if any(units is not None for units in max_units) else None
+        )
+    except UnknownCategoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Plan de carga inválido: {e}")
+    except InferenceBusyError:
+        raise HTTPException(status_code=503, detail="Servicio de predicción saturado, intenta de nuevo")
+    except InferenceTimeoutError:
+        raise HTTPException(status_code=504, detail="La optimización tardó demasiado")
+
+    totals = flight_totals(plan, flight_index, budgets)
+    products = [[] for _ in data.flights]
+    for row, (i, _, product) in enumerate(rows):
+        products[i].append({
+            "product_name": product.product_name,
+            "units": int(plan["units"][row]),
+            "predicted_units": int(plan["predicted_units"][row]),
+            "expected_sales": round(float(plan["expected_sales"][row]), 2),
+            "expected_margin": round(float(plan["expected_margin"][row]), 2),
+            "fill_probability": round(float(plan["fill_probability"][row]), 3),
+        })
+    flights = []
+    for i, flight in enumerate(data.flights):
+        flights.append({
+            "flight_id": flight.flight_id,
+            "budget": flight.budget,
+            "budget_used": round(float(totals["spent"][i]), 2),
+            "total_units": int(totals["units"][i]),
+            "expected_sales": round(float(totals["expected_sales"][i]), 2),
+            "expected_margin": round(float(totals["expected_margin"][i]), 2),
+            "products": products[i]
+        })
+
+    logger.info(f"📦 Plan de carga para {len(data.flights)} vuelos ({len(rows)} productos)")
+    return {"budget_type": data.budget_type, "flights": flights}
+
+@app.get("/api/model/status")
+async def model_status():
+    """Versión del modelo servido, tiempo de carga y memoria usada"""
+    return model_registry.status()
+
+@app.post("/api/predict/fleet")
+async def predict_fleet(request: Request, format: Optional[str] = None):
+    """
+    Predicción para un itinerario completo (CSV con encabezado o NDJSON) con las columnas
+    Flight_ID, Origin, Flight_Type, Service_Type, Passenger_Count, Product_Name, Unit_Cost.
+    Responde en streaming con un registro NDJSON por vuelo y un resumen final.
+    """
+    predictor = model_registry.get_predictor()
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="Modelo de predicción no disponible")
+
+    schedule_format = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    if schedule_format not in SCHEDULE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {schedule_format}")
+
+    logger.info(f"🛫 Recibiendo itinerario de flota ({schedule_format})")
+    # El cuerpo se lee completo antes de responder: durante el streaming Starlette escucha
+    # receive() para detectar desconexiones y ambas lecturas competirían por los mensajes
+    body = await spool_body(request.stream())
+    return StreamingResponse(
+        stream_fleet_predictions(iter_spooled(body), predictor, schedule_format, fleet_executor),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(body.close)
+    )
+
+@app.get("/api/barcode/cache")
+async def barcode_cache_stats():
+    """Contadores de la caché de códigos de barras (hits, misses, invalidaciones)"""
+    return barcode_cache.stats()
+
+def require_admin(token):
+    """403 salvo que ADMIN_TOKEN esté configurado y la cabecera X-Admin-Token coincida"""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Endpoint de administración deshabilitado (configura ADMIN_TOKEN)")
+    if token is None or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administración inválido")
+
+@app.post("/api/admin/barcode-cache/flush")
+async def flush_barcode_cache(barcode: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """Vacía la caché de códigos de barras, o solo la entrada de un código (?barcode=...)"""
+    require_admin(x_admin_token)
+    if barcode is not None:
+        barcode_cache.invalidate(barcode.strip())
+        logger.info(f"🧹 Entrada de caché eliminada para el código {barcode.strip()}")
+        return {"flushed": barcode.strip(), "cache": barcode_cache.stats()}
+    dropped = barcode_cache.clear()
+    logger.info(f"🧹 Caché de códigos de barras vaciada ({dropped} entradas)")
+    return {"flushed": dropped, "cache": barcode_cache.stats()}
+
+@app.get("/api/predict/cache")
+async def prediction_cache_stats():
+    """Contadores de la caché de predicciones (hits, misses, evictions)"""
+    return prediction_cache.stats()
+
+@app.get("/api/metrics/inference")
+async def inference_metrics():
+    """Ocupación del pool de inferencia y retraso del event loop"""
+    return {
+        "executor": inference_executor.stats(),
+        "micro_batching": micro_batcher.stats(),
+        "event_loop_lag": loop_lag_monitor.stats()
+    }
+
+@app.get("/api/metrics/db")
+async def db_metrics():
+    """Pool de conexiones a Snowflake y pool de hilos que ejecuta las consultas"""
+    return {"connected": sf.pool is not None, "pool": sf.pool_stats(), "executor": db.stats()}
+
+@app.post("/api/actuals")
+async def ingest_actuals(data: ActualsRequest):
+    """
+    Registra el consumo real post-vuelo en el almacén de entrenamiento.
+    El reentrenamiento corre en un proceso aparte y solo publica modelos que pasan el holdout.
+    """
+    records = [{column: getattr(record, column.lower()) for column in DATASET_COLUMNS}
+               for record in data.records]
+    loop = asyncio.get_running_loop()
+    try:
+        accepted = await loop.run_in_executor(None, actuals_store.append, records)
+    except InvalidActualsError as e:
+        raise HTTPException(status_code=400, detail=f"Registro inválido: {e}")
+    logger.info(f"📥 {accepted} registros reales post-vuelo almacenados")
+    return {"accepted": accepted, "store": await loop.run_in_executor(None, actuals_store.stats)}
+
+@app.get("/api/actuals")
+async def actuals_status():
+    """Tamaño y última modificación del almacén de datos reales"""
+    return await asyncio.get_running_loop().run_in_executor(None, actuals_store.stats)
+
+@app.on_event("startup")
+async def startup_event():
+    loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_lag_monitor.stop()
+    model_registry.stop_watching()
+    inference_executor.shutdown()
+    tts_executor.shutdown()
+    db.shutdown()
+    sf.disconnect()
+
+async def scanner_audio(text):
+    """Audio en base64 del mensaje del escáner, fuera del event loop; None si no llega a tiempo"""
+    try:
+        return await tts_executor.run(elevenlabs_manager.text_to_speech_base64, text)
+    except (InferenceBusyError, InferenceTimeoutError) as e:
+        logger.warning(f"⚠️ Audio no generado para el escaneo: {e}")
+        return None
+
 @app.post("/api/check_barcode", response_model=BarcodeResponse)
 async def check_barcode(request: BarcodeRequest):
     """
@@ -333,7 +783,7 @@ async def check_barcode(request: BarcodeRequest):
     try:
         logger.info(f"🔍 Verificando barcode: {request.barcode.strip()}")
 
-        result = sf.check_barcode_exists(request.barcode.strip())
+        result = await db.check_barcode_exists(request.barcode.strip(), timeout=SCAN_TIMEOUT_S)
 
         if result is None:
             raise HTTPException(status_code=500, detail="Error conectando a la base de datos")
@@ -342,7 +792,7 @@ async def check_barcode(request: BarcodeRequest):
             # Producto existe
             logger.info(f"✅ Producto encontrado: {result['product_info']['product_name']}")
             audio_text = "El producto está en la base de datos"
-            audio_base64 = elevenlabs_manager.text_to_speech_base64(audio_text)
+            audio_base64 = await scanner_audio(audio_text)
 
             return BarcodeResponse(
                 exists=True,
@@ -357,18 +807,69 @@ async def check_barcode(request: BarcodeRequest):
             # Producto no existe - generar audio
             logger.info("❌ Producto no encontrado - generando audio")
             audio_text = "El producto no está en la base de datos"
-            audio_base64 = elevenlabs_manager.text_to_speech_base64(audio_text)
+            audio_base64 = await scanner_audio(audio_text)
             
             return BarcodeResponse(
                 exists=False,
                 audio_base64=audio_base64
             )
     
-            
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en check_barcode: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error en check_barcode: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@app.post("/api/check_barcodes", response_model=BarcodesResponse)
+async def check_barcodes(request: BarcodesRequest):
+    """
+    Verifica varios códigos de barras a la vez (p.ej. una bandeja completa).
+    Se resuelven con una consulta por bloque de códigos en lugar de una por código.
+    """
+    barcodes = [barcode.strip() for barcode in request.barcodes if barcode.strip()]
+    if not barcodes:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un código de barras")
+    if len(barcodes) > MAX_BARCODES_PER_REQUEST:
+        raise HTTPException(status_code=400,
+                            detail=f"Máximo {MAX_BARCODES_PER_REQUEST} códigos por solicitud, se recibieron {len(barcodes)}")
+    logger.info(f"🔍 Verificando {len(barcodes)} códigos de barras")
+    try:
+        result = await db.search_barcodes(barcodes, timeout=SCAN_TIMEOUT_S)
+        if result is None:
+            raise HTTPException(status_code=500, detail="Error conectando a la base de datos")
+        
+        found = [
+            BarcodeMatch(
+                barcode=product["barcode"],
+                productID=product["product_id"],
+                productName=product["product_name"],
+                quantity=product["quantity"],
+                lot=product["lot_number"],
+                expirationDate=str(product["exp_date"]),
+                daysUntilExpiration=product["days_until_expiration"]
+            )
+            for product in result["found"]
+        ]
+        return BarcodesResponse(found=found, not_found=result["not_found"], summary=result["summary"])
+    
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en check_barcodes: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
+    except Exception as e:
+        logger.error(f"❌ Error en check_barcodes: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
 @app.post("/api/save_product", response_model=SaveResponse)
 async def save_product(request: ProductRequest):
     """
@@ -388,7 +889,7 @@ async def save_product(request: ProductRequest):
             'quantity': request.quantity,
             'exp_date': request.expirationDate
         }
-        if sf.add_product_data(single_product_dict):
+        if await db.add_product_data(single_product_dict):
             logger.info("✅ Producto insertado correctamente.")
             return SaveResponse(
                 success=True,
@@ -397,6 +898,14 @@ async def save_product(request: ProductRequest):
         else:
             logger.error("❌ Error insertando el nuevo producto.")
             raise HTTPException(status_code=500, detail="Error insertando el nuevo producto")            
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en save_product: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error en save_product: {e}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
@@ -410,8 +919,6 @@ async def get_dashboard_metrics():
         
         # Total de productos
         total_query = "SELECT COUNT(*) as total FROM PRODUCT_DATA"
-        total_result = sf.execute_query(total_query)
-        total_products = total_result[0][0] if total_result else 0
         
         # Productos próximos a vencer (30 días)
         expiring_query = """
@@ -420,8 +927,6 @@ async def get_dashboard_metrics():
         WHERE Exp_Date <= DATEADD(day, 30, CURRENT_DATE()) 
         AND Exp_Date >= CURRENT_DATE()
         """
-        expiring_result = sf.execute_query(expiring_query)
-        expiring_products = expiring_result[0][0] if expiring_result else 0
         
         # Productos vencidos
         expired_query = """
@@ -429,12 +934,20 @@ async def get_dashboard_metrics():
         FROM PRODUCT_DATA 
         WHERE Exp_Date < CURRENT_DATE()
         """
-        expired_result = sf.execute_query(expired_query)
-        expired_products = expired_result[0][0] if expired_result else 0
         
         # Suma total de cantidades
         quantity_query = "SELECT SUM(Quantity) as total_quantity FROM PRODUCT_DATA"
-        quantity_result = sf.execute_query(quantity_query)
+        
+        # Las consultas son independientes: se ejecutan en paralelo en conexiones distintas del pool
+        total_result, expiring_result, expired_result, quantity_result = await asyncio.gather(
+            db.execute_query(total_query),
+            db.execute_query(expiring_query),
+            db.execute_query(expired_query),
+            db.execute_query(quantity_query)
+        )
+        total_products = total_result[0][0] if total_result else 0
+        expiring_products = expiring_result[0][0] if expiring_result else 0
+        expired_products = expired_result[0][0] if expired_result else 0
         total_quantity = quantity_result[0][0] if quantity_result and quantity_result[0][0] else 0
         
         return {
@@ -445,6 +958,14 @@ async def get_dashboard_metrics():
             "healthy_products": total_products - expiring_products - expired_products
         }
         
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en get_dashboard_metrics: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error obteniendo métricas: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo métricas: {str(e)}")
@@ -472,7 +993,7 @@ async def get_dashboard_products():
         ORDER BY Exp_Date ASC
         """
         
-        result = sf.execute_query(query)
+        result = await db.execute_query(query)
         
         if not result:
             return {"products": []}
@@ -491,6 +1012,14 @@ async def get_dashboard_products():
         
         return {"products": products}
         
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en get_dashboard_products: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error obteniendo productos: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo productos: {str(e)}")
@@ -515,12 +1044,6 @@ async def get_dashboard_charts():
         ORDER BY Count DESC
         """
         
-        status_result = sf.execute_query(status_query)
-        status_data = {}
-        if status_result:
-            for row in status_result:
-                status_data[row[0]] = row[1]
-        
         # Top 10 productos por cantidad
         top_products_query = """
         SELECT ProductName, SUM(Quantity) as TotalQuantity
@@ -530,15 +1053,6 @@ async def get_dashboard_charts():
         LIMIT 10
         """
         
-        top_result = sf.execute_query(top_products_query)
-        top_products = []
-        if top_result:
-            for row in top_result:
-                top_products.append({
-                    "name": row[0],
-                    "quantity": row[1]
-                })
-        
         # Productos próximos a vencer por fecha
         expiring_timeline_query = """
         SELECT 
@@ -551,7 +1065,25 @@ async def get_dashboard_charts():
         ORDER BY Exp_Date ASC
         """
         
-        timeline_result = sf.execute_query(expiring_timeline_query)
+        status_result, top_result, timeline_result = await asyncio.gather(
+            db.execute_query(status_query),
+            db.execute_query(top_products_query),
+            db.execute_query(expiring_timeline_query)
+        )
+        
+        status_data = {}
+        if status_result:
+            for row in status_result:
+                status_data[row[0]] = row[1]
+        
+        top_products = []
+        if top_result:
+            for row in top_result:
+                top_products.append({
+                    "name": row[0],
+                    "quantity": row[1]
+                })
+        
         timeline_data = []
         if timeline_result:
             for row in timeline_result:
@@ -566,6 +1098,14 @@ async def get_dashboard_charts():
             "expiring_timeline": timeline_data
         }
         
+    except HTTPException:
+        raise
+    except DatabaseBusyError as e:
+        logger.warning(f"⚠️ Pool de base de datos saturado: {e}")
+        raise HTTPException(status_code=503, detail="Base de datos saturada, intenta de nuevo")
+    except DatabaseTimeoutError as e:
+        logger.error(f"❌ Timeout en get_dashboard_charts: {e}")
+        raise HTTPException(status_code=504, detail="La consulta a la base de datos tardó demasiado")
     except Exception as e:
         logger.error(f"❌ Error obteniendo datos de gráficos: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo datos de gráficos: {str(e)}")
@@ -654,6 +1194,17 @@ async def health_check():
         "message": "Backend funcionando correctamente",
         "endpoints": [
             "/api/predict - POST - Predicciones",
+            "/api/predict/fleet - POST - Predicciones para un itinerario completo (CSV/NDJSON)",
+            "/api/predict/sweep - POST - Barrido what-if (servicio x pasajeros x costo)",
+            "/api/optimize/load - POST - Plan de carga que maximiza ventas esperadas con presupuesto",
+            "/api/model/status - GET - Estado del modelo de predicción",
+            "/api/predict/cache - GET - Estadísticas de la caché de predicciones",
+            "/api/barcode/cache - GET - Estadísticas de la caché de códigos de barras",
+            "/api/admin/barcode-cache/flush - POST - Vacía la caché de códigos de barras",
+            "/api/metrics/inference - GET - Pool de inferencia y retraso del event loop",
+            "/api/metrics/db - GET - Pool de conexiones a Snowflake",
+            "/api/actuals - POST/GET - Consumo real post-vuelo para el reentrenamiento",
+            "/api/check_barcodes - POST - Verificación de varios códigos de barras en una consulta",
             "/api/dashboard/metrics - GET - Métricas del dashboard",
             "/api/dashboard/products - GET - Lista de productos",
             "/api/dashboard/charts - GET - Datos para gráficos",
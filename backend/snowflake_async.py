@@ -0,0 +1,94 @@
+"""
+Awaitable access to Snowflake for the FastAPI handlers
+
+SnowflakeConnection is blocking: every query waits on the network in the
+calling thread, so called from an ``async def`` handler one slow dashboard
+query stalls every barcode scan. AsyncSnowflake runs those calls on a bounded
+thread pool (an InferenceExecutor sized to the connection pool) with a
+per-call timeout:
+
+    rows = await db.execute_query("SELECT ...", timeout=5)
+
+When the timeout expires the handler gets DatabaseTimeoutError straight away.
+The statement itself runs with a server-side timeout a little longer than the
+await, so the connector cancels it in Snowflake and the worker thread (and its
+pooled connection) comes back instead of serving a result nobody reads. A call
+whose awaiting task is cancelled while it is still queued never reaches
+Snowflake.
+"""
+
+import functools
+import logging
+import math
+
+from inference_executor import InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Seconds the statement may outlive the await before the connector cancels it
+STATEMENT_TIMEOUT_GRACE_S = 2
+
+
+class DatabaseBusyError(Exception):
+    """All database worker and queue slots are taken"""
+
+
+class DatabaseTimeoutError(Exception):
+    """The database call did not finish within its timeout"""
+
+
+class AsyncSnowflake:
+    """
+    Async facade over a SnowflakeConnection
+    Every method takes timeout= (seconds) to override the default timeout_s
+    """
+
+    def __init__(self, sf, max_workers=8, max_queue=32, timeout_s=15.0):
+        self.sf = sf
+        self.timeout_s = timeout_s
+        self.executor = InferenceExecutor(max_workers=max_workers, max_queue=max_queue, timeout_s=timeout_s,
+                                          thread_name_prefix="snowflake")
+
+    async def _call(self, fn, *args, timeout=None, **kwargs):
+        timeout = self.timeout_s if timeout is None else timeout
+        statement_timeout = int(math.ceil(timeout)) + STATEMENT_TIMEOUT_GRACE_S
+        call = functools.partial(fn, *args, timeout=statement_timeout, **kwargs)
+        try:
+            return await self.executor.run(call, timeout=timeout)
+        except InferenceBusyError as e:
+            raise DatabaseBusyError(
+                f"Database pool saturated ({self.executor.max_workers} workers, "
+                f"{self.executor.max_queue} queued)") from e
+        except InferenceTimeoutError as e:
+            logger.warning(f"⚠️ Snowflake call {fn.__name__} did not finish within {timeout} s")
+            raise DatabaseTimeoutError(f"Database call did not finish within {timeout} s") from e
+
+    async def execute_query(self, sql, fetch=True, params=None, timeout=None):
+        """SnowflakeConnection.execute_query off the event loop"""
+        return await self._call(self.sf.execute_query, sql, fetch=fetch, params=params, timeout=timeout)
+
+    async def check_barcode_exists(self, barcode, timeout=None):
+        """
+        SnowflakeConnection.check_barcode_exists off the event loop
+        A barcode_cache hit is answered on the loop, without a thread hop
+        """
+        cache = self.sf.barcode_cache
+        if cache is not None:
+            cached = cache.get(barcode)
+            if cached is not None:
+                return cached
+        return await self._call(self.sf.check_barcode_exists, barcode, timeout=timeout, use_cache=False)
+
+    async def search_barcodes(self, barcodes, timeout=None):
+        """SnowflakeConnection.search_barcodes off the event loop"""
+        return await self._call(self.sf.search_barcodes, barcodes, timeout=timeout)
+
+    async def add_product_data(self, product_data, timeout=None):
+        """SnowflakeConnection.add_product_data off the event loop"""
+        return await self._call(self.sf.add_product_data, product_data, timeout=timeout)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def stats(self):
+        return self.executor.stats()
@@ -3,6 +3,7 @@ import snowflake.connector
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
 import logging
+from snowflake_pool import pool_from_env
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -13,38 +14,46 @@ load_dotenv()
 
 class SnowflakeManager:
     def __init__(self):
-        self.connection = None
-        self.cursor = None
+        # Cada operación toma su propia conexión y cursor del pool
+        self.pool = None
+    
+    @staticmethod
+    def _open_connection():
+        return snowflake.connector.connect(
+            user=os.getenv("SNOWFLAKE_USER"),
+            password=os.getenv("SNOWFLAKE_PASSWORD"),
+            account=os.getenv("SNOWFLAKE_ACCOUNT"),
+            warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+            database=os.getenv("SNOWFLAKE_DATABASE"),
+            schema=os.getenv("SNOWFLAKE_SCHEMA")
+        )
         
     def connect(self) -> bool:
-        """Establece conexión con Snowflake"""
+        """Crea el pool de conexiones con Snowflake"""
         try:
-            self.connection = snowflake.connector.connect(
-                user=os.getenv("SNOWFLAKE_USER"),
-                password=os.getenv("SNOWFLAKE_PASSWORD"),
-                account=os.getenv("SNOWFLAKE_ACCOUNT"),
-                warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-                database=os.getenv("SNOWFLAKE_DATABASE"),
-                schema=os.getenv("SNOWFLAKE_SCHEMA")
-            )
-            self.cursor = self.connection.cursor()
-            logger.info("✅ Conexión a Snowflake establecida")
+            pool = pool_from_env(self._open_connection)
+            pool.prefill()
+            self.pool = pool
+            logger.info(f"✅ Conexión a Snowflake establecida (pool de {pool.min_size}-{pool.max_size})")
             return True
         except Exception as e:
             logger.error(f"❌ Error conectando a Snowflake: {e}")
             return False
     
     def disconnect(self):
-        """Cierra la conexión con Snowflake"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+        """Cierra las conexiones del pool"""
+        if self.pool:
+            self.pool.close()
+            self.pool = None
         logger.info("🔌 Conexión a Snowflake cerrada")
     
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        """Métricas del pool de conexiones (None si no hay conexión)"""
+        return self.pool.stats() if self.pool else None
+    
     def check_barcode_exists(self, barcode: str) -> Optional[Dict[str, Any]]:
         """Verifica si un código de barras existe en la base de datos"""
-        if not self.connection:
+        if not self.pool:
             if not self.connect():
                 return None
         
@@ -54,8 +63,9 @@ class SnowflakeManager:
             FROM Products 
             WHERE Barcode = %s
             """
-            self.cursor.execute(query, (barcode,))
-            result = self.cursor.fetchone()
+            with self.pool.cursor() as cursor:
+                cursor.execute(query, (barcode,))
+                result = cursor.fetchone()
             
             if result:
                 return {
@@ -76,7 +86,7 @@ class SnowflakeManager:
     def save_product(self, barcode: str, product_id: str, product_name: str, 
                     quantity: int, lot: str, expiration_date: str) -> bool:
         """Guarda o actualiza un producto en la base de datos"""
-        if not self.connection:
+        if not self.pool:
             if not self.connect():
                 return False
         
@@ -99,9 +109,14 @@ class SnowflakeManager:
                        source.Quantity, source.Lot, source.ExpirationDate)
             """
             
-            self.cursor.execute(query, (barcode, product_id, product_name, 
-                                      quantity, lot, expiration_date))
-            self.connection.commit()
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(query, (barcode, product_id, product_name,
+                                           quantity, lot, expiration_date))
+                    connection.commit()
+                finally:
+                    cursor.close()
             logger.info(f"✅ Producto guardado: {barcode}")
             return True
             
@@ -111,7 +126,7 @@ class SnowflakeManager:
     
     def create_table_if_not_exists(self) -> bool:
         """Crea la tabla Products si no existe"""
-        if not self.connection:
+        if not self.pool:
             if not self.connect():
                 return False
         
@@ -126,8 +141,13 @@ class SnowflakeManager:
                 ExpirationDate DATE
             )
             """
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(create_table_query)
+                    connection.commit()
+                finally:
+                    cursor.close()
             logger.info("✅ Tabla Products creada/verificada")
             return True
             
@@ -0,0 +1,307 @@
+"""
+Bounded pool of Snowflake connections
+
+A single connection with one shared cursor serialises every scan, save and
+dashboard query, and interleaves their results when two threads use it at
+once. ConnectionPool hands each caller its own connection (and a fresh cursor)
+for the duration of one unit of work:
+
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT ...")
+        rows = cursor.fetchall()
+
+Between min_size and max_size connections are kept; a checkout waits up to
+checkout_timeout_s for one to come back when all max_size are busy. Idle
+connections beyond min_size are closed after idle_timeout_s. On checkout a
+connection is checked locally (is_closed) and, when it sat idle for more than
+validate_after_s, with a round trip (SELECT 1); dead connections are replaced.
+A connection whose work failed with a session error (expired token, closed
+connection) is discarded instead of returned.
+
+The pool only needs a connect() callable, so it does not import the Snowflake
+connector itself.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SESSION_ERROR_MARKERS = ("390114", "Authentication token has expired", "Invalid access token",
+                         "Connection is closed", "connection is closed")
+
+
+class PoolTimeoutError(Exception):
+    """No connection became available within the checkout timeout"""
+
+
+class PoolClosedError(Exception):
+    """The pool has been closed"""
+
+
+def is_session_error(error):
+    """True for errors after which the connection cannot be reused"""
+    message = str(error)
+    return any(marker in message for marker in SESSION_ERROR_MARKERS)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _ping(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections created by connect()
+    validate: callable(connection) raising when the connection is unusable
+    fatal_error: callable(exception) -> True when the connection must be discarded
+    """
+
+    def __init__(self, connect, min_size=1, max_size=8, idle_timeout_s=300.0, checkout_timeout_s=10.0,
+                 validate_after_s=30.0, validate=_ping, fatal_error=is_session_error, name="snowflake"):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout_s = idle_timeout_s
+        self.checkout_timeout_s = checkout_timeout_s
+        self.validate_after_s = validate_after_s
+        self._validate = validate
+        self._fatal_error = fatal_error
+        self.name = name
+
+        self._condition = threading.Condition()
+        self._idle = deque()  # most recently returned on the right: reused first
+        self._size = 0  # idle + checked out + being opened
+        self._closed = False
+        self._wait_ms = deque(maxlen=1000)
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.created = 0
+        self.closed_count = 0
+        self.validation_failures = 0
+        self.discarded = 0
+
+    def prefill(self):
+        """Open min_size connections up front; raises if the first one cannot be opened"""
+        with self._condition:
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        opened = []
+        try:
+            for _ in range(max(0, missing)):
+                opened.append(_PooledConnection(self._connect()))
+        except Exception:
+            with self._condition:
+                self._size -= missing - len(opened)
+                self._idle.extend(opened)
+                self.created += len(opened)
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._idle.extend(opened)
+            self.created += len(opened)
+            self._condition.notify_all()
+        return len(opened)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection for the duration of the block"""
+        pooled = self._checkout(self.checkout_timeout_s if timeout is None else timeout)
+        broken = False
+        try:
+            yield pooled.connection
+        except Exception as e:
+            broken = self._fatal_error(e)
+            raise
+        finally:
+            self._checkin(pooled, broken)
+
+    @contextmanager
+    def cursor(self, timeout=None):
+        """A fresh cursor on a checked-out connection; both are released after the block"""
+        with self.connection(timeout) as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _checkout(self, timeout):
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise PoolClosedError(f"Pool '{self.name}' is closed")
+                self._evict_idle()
+                pooled, create = None, False
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No connection available in pool '{self.name}' within {timeout} s "
+                            f"({self.max_size} in use)")
+                    waited = True
+                    self._condition.wait(remaining)
+                    continue
+
+            # Connecting and validating happen outside the lock
+            if create:
+                try:
+                    pooled = _PooledConnection(self._connect())
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self.created += 1
+            elif not self._is_usable(pooled):
+                self._close(pooled)
+                continue
+
+            with self._condition:
+                self.checkouts += 1
+                if waited:
+                    self.waits += 1
+                self._wait_ms.append((time.perf_counter() - start) * 1000)
+            return pooled
+
+    def _is_usable(self, pooled):
+        connection = pooled.connection
+        try:
+            if getattr(connection, 'is_closed', None) is not None and connection.is_closed():
+                raise ConnectionError("connection is closed")
+            if self._validate is not None and time.monotonic() - pooled.returned_at > self.validate_after_s:
+                self._validate(connection)
+            return True
+        except Exception as e:
+            with self._condition:
+                self.validation_failures += 1
+            logger.warning(f"⚠️ Dropping unusable connection from pool '{self.name}': {e}")
+            return False
+
+    def _checkin(self, pooled, broken=False):
+        if broken:
+            with self._condition:
+                self.discarded += 1
+            self._close(pooled)
+            return
+        with self._condition:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                pooled.returned_at = time.monotonic()
+                self._idle.append(pooled)
+                self._condition.notify()
+        if closed:
+            self._close(pooled)
+
+    def _close(self, pooled):
+        """Close a connection that is no longer idle nor checked out, freeing its slot"""
+        try:
+            pooled.connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+        with self._condition:
+            self._size -= 1
+            self.closed_count += 1
+            self._condition.notify()
+
+    def _evict_idle(self):
+        """Close connections idle for longer than idle_timeout_s, keeping min_size (lock held)"""
+        now = time.monotonic()
+        expired = []
+        # Oldest returns sit on the left
+        while self._idle and self._size - len(expired) > self.min_size \
+                and now - self._idle[0].returned_at > self.idle_timeout_s:
+            expired.append(self._idle.popleft())
+        if expired:
+            # Closing can block on the network: do it on a helper thread, not under the lock
+            threading.Thread(target=lambda: [self._close(pooled) for pooled in expired],
+                             name=f"{self.name}-pool-evict", daemon=True).start()
+
+    def close(self):
+        """Close idle connections now; checked-out ones are closed when they come back"""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self):
+        with self._condition:
+            waits = list(self._wait_ms)
+            idle = len(self._idle)
+            return {
+                'name': self.name,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'closed': self._closed,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'closed_connections': self.closed_count,
+                'discarded': self.discarded,
+                'validation_failures': self.validation_failures,
+                'wait_ms_p50': round(_percentile(waits, 50), 3),
+                'wait_ms_p99': round(_percentile(waits, 99), 3),
+                'wait_ms_max': round(max(waits), 3) if waits else 0.0,
+            }
+
+
+def pool_from_env(connect, name="snowflake"):
+    """ConnectionPool sized by the SNOWFLAKE_POOL_* environment variables"""
+    return ConnectionPool(
+        connect,
+        min_size=int(os.getenv("SNOWFLAKE_POOL_MIN", "1")),
+        max_size=int(os.getenv("SNOWFLAKE_POOL_MAX", "8")),
+        idle_timeout_s=float(os.getenv("SNOWFLAKE_POOL_IDLE_TIMEOUT", "300")),
+        checkout_timeout_s=float(os.getenv("SNOWFLAKE_POOL_CHECKOUT_TIMEOUT", "10")),
+        validate_after_s=float(os.getenv("SNOWFLAKE_POOL_VALIDATE_AFTER", "30")),
+        name=name,
+    )
@@ -0,0 +1,63 @@
+"""
+Shared fixtures for the backend tests
+
+Tests run from backend/ (python -m pytest). Modules that need the Snowflake
+connector or the other services skip when those packages are not installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(BACKEND_DIR, "aidata", "(HackMTY2025)_ConsumptionPrediction_Dataset_v1.csv")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# SnowflakeConnection validates its configuration on creation; no connection is opened
+for _field in ("ACCOUNT", "USER", "PASSWORD", "WAREHOUSE", "DATABASE"):
+    os.environ.setdefault(f"SNOWFLAKE_{_field}", "test")
+
+
+@pytest.fixture(scope="session")
+def trained_model_dir(tmp_path_factory):
+    """A small forest trained on the bundled dataset, saved like the training script does"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+
+    work_dir = tmp_path_factory.mktemp("model")
+    trainer = AirlineConsumptionPredictor(DATASET)
+    trainer.prepare_features(cache_dir=str(work_dir / "feature_cache"))
+    trainer.model = RandomForestRegressor(n_estimators=10, max_depth=8, random_state=0)
+    trainer.model.fit(trainer.df_final[trainer.feature_columns], trainer.df_final[trainer.target_column])
+    trainer._compile_engine()
+    model_dir = work_dir / "airline_consumption_model"
+    assert trainer.save_model(str(model_dir))
+    return str(model_dir)
+
+
+@pytest.fixture(scope="session")
+def simple_main(trained_model_dir):
+    """The deployed FastAPI module, serving the test model"""
+    for module in ("snowflake.connector", "dotenv", "sqlalchemy", "google.generativeai", "cryptography", "requests"):
+        pytest.importorskip(module)
+    import simple_main as module
+    from aidata.model_registry import ModelRegistry
+
+    module.model_registry.stop_watching()
+    registry = ModelRegistry(trained_model_dir, prediction_cache=module.prediction_cache)
+    assert registry.load()
+    module.model_registry = registry
+    return module
+
+
+@pytest.fixture(scope="session")
+def client(simple_main):
+    """TestClient over the app; startup and shutdown run once, shutdown closes the executors"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(simple_main.app) as test_client:
+        yield test_client
@@ -0,0 +1,60 @@
+"""
+PRODUCT_DATA in memory, behind DB-API style connections
+
+Answers the statements SnowflakeConnection sends for barcodes: the lookups
+(WHERE Barcode = %s or IN (...)) and the executemany inserts. Plug it into a
+SnowflakeConnection with ConnectionPool(table.connect, validate=None).
+"""
+
+from datetime import date
+
+
+class ProductTable:
+    def __init__(self, rows=()):
+        self.rows = list(rows)  # (Barcode, ProductID, ProductName, LotNumber, Quantity, Exp_Date)
+        self.queries = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.rowcount = -1
+        self._result = []
+
+    def execute(self, sql, params=None, **options):
+        self.table.queries.append((sql, params))
+        if "FROM PRODUCT_DATA" in sql and "WHERE Barcode" in sql:
+            wanted = set(params)
+            self._result = [row + ((date.fromisoformat(row[5]) - date.today()).days,)
+                            for row in self.table.rows if row[0] in wanted]
+        else:
+            raise NotImplementedError(sql)
+
+    def executemany(self, sql, rows, **options):
+        if not sql.startswith("INSERT INTO PRODUCT_DATA"):
+            raise NotImplementedError(sql)
+        self.table.rows.extend(tuple(row) for row in rows)
+        self.rowcount = len(rows)
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
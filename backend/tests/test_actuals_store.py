@@ -0,0 +1,46 @@
+import csv
+import fcntl
+
+from aidata import actuals_store
+from aidata.actuals_store import ActualsStore
+
+
+def record(flight_id, feedback=''):
+    return {'Flight_ID': flight_id, 'Origin': 'DOH', 'Flight_Type': 'long-haul', 'Service_Type': 'Retail',
+            'Passenger_Count': 280, 'Product_Name': 'Juice 200ml', 'Quantity_Consumed': 40,
+            'Quantity_Returned': 8, 'Unit_Cost': 0.9, 'Crew_Feedback': feedback}
+
+
+def test_count_keeps_multiline_feedback_as_one_row(tmp_path):
+    store = ActualsStore(str(tmp_path / "actuals.csv"))
+    store.append([record("QR1", "ran out early\nrestock juice"), record("QR2")])
+    assert store.count() == 2
+
+    store.append([record("QR3", "fine")])
+    assert store.count() == 3
+    assert ActualsStore(store.path).count() == 3
+
+
+def test_header_is_written_once_when_workers_race_on_an_empty_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "actuals.csv")
+    first, second = ActualsStore(path), ActualsStore(path)
+
+    class RacingFcntl:
+        LOCK_EX, LOCK_SH, LOCK_UN = fcntl.LOCK_EX, fcntl.LOCK_SH, fcntl.LOCK_UN
+        raced = False
+
+        def flock(self, f, operation):
+            # The second worker opened the file first and wins the lock second
+            if operation == fcntl.LOCK_EX and not RacingFcntl.raced:
+                RacingFcntl.raced = True
+                first.append([record("QR1")])
+            fcntl.flock(f, operation)
+
+    monkeypatch.setattr(actuals_store, "fcntl", RacingFcntl())
+    second.append([record("QR2")])
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == actuals_store.STORE_COLUMNS
+    assert [row[0] for row in rows[1:]] == ["QR1", "QR2"]
+    assert second.count() == 2
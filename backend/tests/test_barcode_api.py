@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from fake_snowflake import ProductTable
+from snowflake_pool import ConnectionPool
+
+PRODUCT = {"barcode": "7501234567890", "productID": "JUI-200", "productName": "Juice 200ml",
+           "quantity": 24, "lot": "L-0925", "expirationDate": "2099-12-31"}
+
+
+@pytest.fixture
+def table(simple_main, monkeypatch):
+    table = ProductTable()
+    monkeypatch.setattr(simple_main.sf, "pool", ConnectionPool(table.connect, validate=None))
+    monkeypatch.setattr(simple_main.elevenlabs_manager, "text_to_speech_base64", lambda text: "audio")
+    simple_main.barcode_cache.clear()
+    return table
+
+
+def test_save_product_invalidates_the_cached_lookup(client, table):
+    first = client.post("/api/check_barcode", json={"barcode": PRODUCT["barcode"]}).json()
+    cached = client.post("/api/check_barcode", json={"barcode": PRODUCT["barcode"]}).json()
+    assert first["exists"] is False and cached["exists"] is False
+    assert len(table.queries) == 1
+
+    assert client.post("/api/save_product", json=PRODUCT).json()["success"] is True
+
+    after = client.post("/api/check_barcode", json={"barcode": PRODUCT["barcode"]}).json()
+    assert after["exists"] is True
+    assert (after["productName"], after["quantity"], after["lot"]) == ("Juice 200ml", 24, "L-0925")
+    assert len(table.queries) == 2
+
+
+def test_scanner_audio_runs_off_the_event_loop_and_is_time_bounded(client, table, simple_main, monkeypatch):
+    threads = []
+
+    def slow_text_to_speech(text):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.5)
+        return "late audio"
+
+    monkeypatch.setattr(simple_main.elevenlabs_manager, "text_to_speech_base64", slow_text_to_speech)
+    monkeypatch.setattr(simple_main.tts_executor, "timeout_s", 0.05)
+
+    start = time.perf_counter()
+    response = client.post("/api/check_barcode", json={"barcode": "0000"})
+
+    assert response.status_code == 200
+    assert response.json()["audio_base64"] is None
+    assert time.perf_counter() - start < 0.5
+    assert threads and threads[0].startswith("tts")
+
+
+def test_cache_flush_requires_the_admin_token(client, table, simple_main, monkeypatch):
+    simple_main.barcode_cache.put("0001", {"exists": False, "product_info": None, "count": 0})
+
+    monkeypatch.setattr(simple_main, "ADMIN_TOKEN", None)
+    assert client.post("/api/admin/barcode-cache/flush").status_code == 403
+
+    monkeypatch.setattr(simple_main, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/admin/barcode-cache/flush").status_code == 403
+    assert client.post("/api/admin/barcode-cache/flush", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert simple_main.barcode_cache.stats()["size"] == 1
+
+    response = client.post("/api/admin/barcode-cache/flush", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json()["flushed"] == 1
@@ -0,0 +1,128 @@
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("snowflake.connector")
+pytest.importorskip("dotenv")
+pytest.importorskip("sqlalchemy")
+
+import SnowflakeFinal
+from snowflake_pool import ConnectionPool
+
+COLUMNS = ['Barcode', 'Quantity']
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.rowcount = -1
+
+    def executemany(self, sql, rows, **options):
+        if any(row[0] == 'boom' for row in rows):
+            raise RuntimeError("Numeric value 'boom' is not recognized")
+        self.log.append((sql, len(rows)))
+        self.rowcount = len(rows)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def is_closed(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class MissingDependencyError(Exception):
+    """Stands in for the connector's error when pyarrow is not installed"""
+
+
+@pytest.fixture
+def executed():
+    return []
+
+
+@pytest.fixture
+def sf(executed, monkeypatch):
+    connection = SnowflakeFinal.SnowflakeConnection()
+    connection.pool = ConnectionPool(lambda: FakeConnection(executed), validate=None)
+    monkeypatch.setattr(SnowflakeFinal, 'BULK_BATCH_ROWS', 10)
+    monkeypatch.setattr(SnowflakeFinal, 'BULK_STAGE_MIN_ROWS', 20)
+    monkeypatch.setattr(SnowflakeFinal, 'BULK_STAGE_BATCH_ROWS', 8)
+    return connection
+
+
+def install_write_pandas(monkeypatch, write_pandas):
+    module = types.ModuleType('snowflake.connector.pandas_tools')
+    module.write_pandas = write_pandas
+    monkeypatch.setitem(sys.modules, 'snowflake.connector.pandas_tools', module)
+
+
+def rows(n):
+    return [(f'75010{i:05d}', i) for i in range(n)]
+
+
+def test_small_input_uses_batched_executemany(sf, executed):
+    report = sf.bulk_insert('product_data', COLUMNS, rows(15))
+
+    assert report['method'] == 'executemany'
+    assert (report['rows'], report['inserted'], report['failed'], report['batches']) == (15, 15, 0, 2)
+    assert executed == [("INSERT INTO PRODUCT_DATA (Barcode, Quantity) VALUES (%s, %s)", 10),
+                        ("INSERT INTO PRODUCT_DATA (Barcode, Quantity) VALUES (%s, %s)", 5)]
+
+
+def test_failed_batch_is_reported_and_the_others_are_inserted(sf, executed):
+    data = rows(15)
+    data[12] = ('boom', 12)
+
+    report = sf.bulk_insert('product_data', COLUMNS, data)
+
+    assert (report['inserted'], report['failed'], report['batches']) == (10, 5, 2)
+    assert report['failed_batches'] == [{'batch': 1, 'first_row': 10, 'rows': 5,
+                                         'error': "Numeric value 'boom' is not recognized"}]
+
+
+def test_large_input_is_staged_with_write_pandas(sf, executed, monkeypatch):
+    staged = []
+
+    def write_pandas(connection, df, table, quote_identifiers=True):
+        staged.append((table, list(df.columns), len(df)))
+        return True, 1, len(df), []
+
+    install_write_pandas(monkeypatch, write_pandas)
+    report = sf.bulk_insert('product_data', COLUMNS, rows(20))
+
+    assert report['method'] == 'write_pandas'
+    assert (report['inserted'], report['failed'], report['batches']) == (20, 0, 3)
+    assert staged == [('PRODUCT_DATA', COLUMNS, 8), ('PRODUCT_DATA', COLUMNS, 8), ('PRODUCT_DATA', COLUMNS, 4)]
+    assert executed == []
+
+
+def test_missing_pyarrow_at_call_time_falls_back_to_executemany(sf, executed, monkeypatch):
+    def write_pandas(connection, df, table, quote_identifiers=True):
+        raise MissingDependencyError("Missing optional dependency: pyarrow")
+
+    install_write_pandas(monkeypatch, write_pandas)
+    report = sf.bulk_insert('product_data', COLUMNS, rows(25))
+
+    assert report['method'] == 'executemany'
+    assert (report['inserted'], report['failed'], report['batches']) == (25, 0, 3)
+    assert report['failed_batches'] == []
+    assert [batch_rows for _, batch_rows in executed] == [10, 10, 5]
+
+
+def test_write_pandas_import_error_falls_back_to_executemany(sf, executed, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'snowflake.connector.pandas_tools', None)
+    report = sf.bulk_insert('product_data', COLUMNS, rows(20))
+
+    assert report['method'] == 'executemany'
+    assert (report['inserted'], report['batches']) == (20, 2)
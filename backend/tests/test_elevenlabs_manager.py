@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("dotenv")
+requests = pytest.importorskip("requests")
+
+import elevenlabs_manager
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.content = text.encode()
+
+    def raise_for_status(self):
+        pass
+
+
+def test_audio_cache_evicts_the_least_recently_used_phrase(monkeypatch):
+    calls = []
+
+    def post(url, json, headers, timeout):
+        calls.append(json["text"])
+        return FakeResponse(json["text"])
+
+    monkeypatch.setattr(elevenlabs_manager.requests, "post", post)
+    manager = elevenlabs_manager.ElevenLabsManager()
+    manager.api_key = "key"
+    manager._audio_cache_size = 2
+
+    for text in ("found", "not found", "found", "expired", "found", "not found"):
+        manager.text_to_speech_base64(text)
+
+    assert calls == ["found", "not found", "expired", "not found"]
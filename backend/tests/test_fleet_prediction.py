@@ -0,0 +1,62 @@
+import json
+
+FLIGHTS = {
+    "QR101": ("DOH", "long-haul", "Retail", 280),
+    "AA202": ("JFK", "medium-haul", "Pick & Pack", 150),
+    "BA303": ("LHR", "short-haul", "Retail", 90),
+}
+PRODUCTS = [("Juice 200ml", 0.9), ("Still Water 500ml", 0.4)]
+
+
+def _schedule_rows():
+    for flight_id, (origin, flight_type, service_type, passengers) in FLIGHTS.items():
+        for product_name, unit_cost in PRODUCTS:
+            yield {
+                "Flight_ID": flight_id, "Origin": origin, "Flight_Type": flight_type,
+                "Service_Type": service_type, "Passenger_Count": passengers,
+                "Product_Name": product_name, "Unit_Cost": unit_cost,
+            }
+
+
+def test_ndjson_fleet_streams_every_flight_and_summary(client):
+    body = "\n".join(json.dumps(row) for row in _schedule_rows()) + "\n"
+    response = client.post("/api/predict/fleet", content=body,
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    flights, summary = records[:-1], records[-1]
+
+    assert [flight["flight_info"]["flight_id"] for flight in flights] == list(FLIGHTS)
+    for flight in flights:
+        assert [p["product_name"] for p in flight["products"]] == [name for name, _ in PRODUCTS]
+        assert all(isinstance(p["predicted_units"], int) for p in flight["products"])
+        assert flight["totals"]["total_units"] == sum(p["predicted_units"] for p in flight["products"])
+    assert summary == {"summary": {"rows": 6, "flights": 3, "distinct_rows": 6, "unknown_rows": 0, "errors": 0}}
+
+
+def test_csv_fleet_reports_bad_rows_and_keeps_going(client):
+    rows = list(_schedule_rows())
+    header = ",".join(rows[0])
+    lines = [header] + [",".join(str(value) for value in row.values()) for row in rows]
+    lines.insert(2, "broken,row")
+    response = client.post("/api/predict/fleet?format=csv", content="\n".join(lines))
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == 200
+    assert sum("error" in record for record in records) == 1
+    assert records[-1]["summary"]["flights"] == 3
+    assert records[-1]["summary"]["errors"] == 1
+
+
+def test_fleet_requests_bypass_the_prediction_cache(client):
+    rows = [dict(row, Passenger_Count=row["Passenger_Count"] + 7) for row in _schedule_rows()]
+    before = client.get("/api/predict/cache").json()
+
+    response = client.post("/api/predict/fleet", content="\n".join(json.dumps(row) for row in rows),
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+
+    after = client.get("/api/predict/cache").json()
+    assert (after["size"], after["evictions"], after["misses"]) == (before["size"], before["evictions"], before["misses"])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from aidata import forest_engine
+from aidata.forest_engine import export_forest
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(0, 6, 2000), rng.integers(80, 300, 2000), rng.uniform(0.2, 3.0, 2000)])
+    y = X[:, 1] * X[:, 2] / (1 + X[:, 0]) + rng.normal(0, 5, 2000)
+    model = RandomForestRegressor(n_estimators=12, max_depth=12, random_state=0).fit(X, y)
+    return model, export_forest(model)
+
+
+def feature_rows(n_rows, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(0, 6, n_rows), rng.integers(80, 300, n_rows), rng.uniform(0.2, 3.0, n_rows)])
+
+
+@pytest.mark.parametrize("n_rows", [1, 2, 37, forest_engine.LEVEL_WALK_MIN_ROWS + 5])
+def test_flat_forest_matches_sklearn(forest, n_rows):
+    model, flat_forest = forest
+    X = feature_rows(n_rows)
+    assert np.array_equal(flat_forest.predict(X), model.predict(X))
+
+
+def test_per_tree_walk_matches_walker_per_row(forest, monkeypatch):
+    _, flat_forest = forest
+    X = feature_rows(3000)
+    X[::7, 2] = np.nan
+    X[::11, 1] = 1e39
+    X[::13, 2] = flat_forest.threshold[~flat_forest.is_leaf][:len(X[::13])]
+    monkeypatch.setattr(forest_engine, "LEVEL_WALK_MIN_ROWS", len(X) + 1)
+    walker_per_row = flat_forest.apply(X)
+    monkeypatch.setattr(forest_engine, "LEVEL_WALK_MIN_ROWS", 1)
+    monkeypatch.setattr(forest_engine, "LEVEL_WALK_BLOCK_ROWS", 1000)
+    assert np.array_equal(flat_forest.apply(X), walker_per_row)
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference_executor import InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(max_workers=1, max_queue=1, timeout_s=2.0)
+    yield executor
+    executor.shutdown()
+
+
+def test_runs_the_call_on_a_pool_thread(executor):
+    result = asyncio.run(executor.run(lambda: threading.current_thread().name))
+
+    assert result.startswith("inference")
+    assert executor.stats()['completed'] == 1
+
+
+def test_errors_of_the_call_reach_the_caller(executor):
+    def fail():
+        raise ValueError("bad row")
+
+    with pytest.raises(ValueError, match="bad row"):
+        asyncio.run(executor.run(fail))
+    assert executor.stats()['failed'] == 1
+
+
+def test_saturated_pool_rejects_instead_of_queueing(executor):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(InferenceBusyError):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+    assert (executor.stats()['rejected'], executor.stats()['completed']) == (1, 2)
+
+
+def test_timed_out_call_keeps_its_slot_until_it_finishes(executor):
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(release.wait, timeout=0.05)
+        assert executor.stats()['in_flight'] == 1
+        release.set()
+        await asyncio.sleep(0.05)
+        assert executor.stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+    assert executor.stats()['timeouts'] == 1
+
+
+def test_explicit_zero_timeout_is_not_replaced_by_the_default(executor):
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(release.wait, timeout=0)
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+    assert time.perf_counter() - start < executor.timeout_s
+    assert executor.stats()['timeouts'] == 1
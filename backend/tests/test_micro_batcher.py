@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from aidata.category_encoding import UnknownCategoryError
+from aidata.consumption_predictor import ConsumptionPredictor
+from inference_executor import InferenceExecutor
+from micro_batcher import MicroBatcher
+
+
+@pytest.fixture(scope="module")
+def predictor(trained_model_dir):
+    return ConsumptionPredictor.load_trained_model(trained_model_dir)
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(max_workers=1, max_queue=4)
+    yield executor
+    executor.shutdown()
+
+
+def request_rows(predictor, passenger_count):
+    tables = predictor.encoding_tables
+    return dict(origin=tables['Origin'].classes[0], flight_type=tables['Flight_Type'].classes[0],
+                service_type=tables['Service_Type'].classes[0], passenger_count=passenger_count,
+                product_name=tables['Product_Name'].classes[:3], unit_cost=[0.5, 1.0, 2.0], has_issues=0)
+
+
+def expected(predictor, rows):
+    return predictor.predict_consumption_batch(**rows, unknown_policy='raise')
+
+
+def run_together(batcher, predictor, *requests):
+    async def gather():
+        return await asyncio.gather(*(batcher.predict(predictor, **rows) for rows in requests),
+                                    return_exceptions=True)
+    return asyncio.run(gather())
+
+
+def test_concurrent_requests_share_one_batch(predictor, executor):
+    batcher = MicroBatcher(executor, window_ms=20)
+    requests = [request_rows(predictor, passengers) for passengers in (90, 180, 270)]
+
+    results = run_together(batcher, predictor, *requests)
+
+    for rows, result in zip(requests, results):
+        assert np.array_equal(result, expected(predictor, rows))
+    assert (batcher.stats()['batches'], batcher.stats()['requests'], batcher.stats()['rows']) == (1, 3, 9)
+    assert not batcher._tasks
+
+
+def test_unknown_category_fails_only_its_request(predictor, executor):
+    batcher = MicroBatcher(executor, window_ms=20)
+    good = request_rows(predictor, 150)
+    unknown = dict(request_rows(predictor, 150), origin='XXX')
+
+    first, second = run_together(batcher, predictor, good, unknown)
+
+    assert np.array_equal(first, expected(predictor, good))
+    assert isinstance(second, UnknownCategoryError)
+    assert batcher.stats()['batches'] == 1
+
+
+def test_malformed_request_is_isolated_from_the_batch(predictor, executor):
+    batcher = MicroBatcher(executor, window_ms=20)
+    good = request_rows(predictor, 150)
+    malformed = request_rows(predictor, 'many')
+
+    first, second, third = run_together(batcher, predictor, good, malformed, good)
+
+    assert np.array_equal(first, expected(predictor, good))
+    assert isinstance(second, Exception)
+    assert np.array_equal(third, expected(predictor, good))
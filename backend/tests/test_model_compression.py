@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+from aidata import model_bundle, model_compression
+from aidata.consumption_predictor import ConsumptionPredictor
+from conftest import DATASET
+
+LEGACY_FILES = ("random_forest_model.pkl", "label_encoders.pkl", "model_metadata.pkl")
+build_candidates = model_compression.build_candidates
+
+
+def small_candidates(teacher, X_train, feature_columns):
+    return build_candidates(teacher, X_train, feature_columns, prune_trees=(5,), prune_depths=(6,),
+                            distill_trees=(), distill_depths=())
+
+
+def test_compress_publishes_from_a_legacy_pickle_directory(trained_model_dir, tmp_path, monkeypatch):
+    model_dir = tmp_path / "legacy_model"
+    model_dir.mkdir()
+    for name in LEGACY_FILES:
+        shutil.copy(os.path.join(trained_model_dir, name), model_dir / name)
+    monkeypatch.setattr(model_compression, "build_candidates", small_candidates)
+
+    report = model_compression.compress(str(model_dir), DATASET, tolerance=10.0,
+                                        feature_cache_dir=str(tmp_path / "feature_cache"), repeats=3)
+
+    assert report['selected'] == "prune-t5-d6"
+    full = model_bundle.load_bundle(str(model_dir / model_bundle.BUNDLE_FILENAME))
+    compact = model_bundle.load_bundle(report['published'])
+    assert compact.metadata['source_checksum'] == full.checksum
+    assert compact.metadata['feature_columns'] == full.metadata['feature_columns']
+    assert compact.encoder_classes == full.encoder_classes
+    served = ConsumptionPredictor.load_trained_model(str(model_dir), variant='compact')
+    assert served.bundle.metadata['variant'] == 'compact'
+
+
+def test_main_reports_failures_without_a_traceback(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(sys, "argv", ["model_compression", "--model-dir", str(tmp_path / "missing")])
+
+    assert model_compression.main() == 1
+    assert "Compression failed" in caplog.text
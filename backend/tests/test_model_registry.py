@@ -0,0 +1,38 @@
+import os
+import shutil
+import tracemalloc
+
+import pandas as pd
+
+from aidata.model_registry import ModelRegistry, model_signature
+from aidata.prediction_grid import GRID_FILENAME, build_grid, canonical_unit_costs
+from conftest import DATASET
+
+
+def test_load_does_not_trace_memory_unless_asked(trained_model_dir):
+    registry = ModelRegistry(trained_model_dir)
+    assert registry.load()
+
+    status = registry.status()
+    assert not tracemalloc.is_tracing()
+    assert status['format'] == 'bundle'
+    assert status['mapped_mb'] > 0
+    assert status['memory_bytes'] == 0
+
+
+def test_signature_follows_the_prediction_grid_when_it_is_served(trained_model_dir, tmp_path):
+    model_dir = str(tmp_path / "model")
+    shutil.copytree(trained_model_dir, model_dir)
+    registry = ModelRegistry(model_dir, use_prediction_grid=True)
+    assert registry.load()
+    without_grid = model_signature(model_dir, prediction_grid=True)
+
+    predictor = registry.get_predictor()
+    unit_costs = canonical_unit_costs(pd.read_csv(DATASET), predictor.encoding_tables['Product_Name'].classes.tolist())
+    build_grid(predictor, unit_costs, (80, 120), 20).save(os.path.join(model_dir, GRID_FILENAME))
+
+    assert model_signature(model_dir) == model_signature(model_dir, prediction_grid=False)
+    assert model_signature(model_dir, prediction_grid=True) != without_grid
+    assert registry.load()
+    assert registry.get_predictor().prediction_grid is not None
+    assert registry.status()['memory_bytes'] == registry.get_predictor().prediction_grid.nbytes
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from aidata.consumption_predictor import ConsumptionPredictor
+from aidata.prediction_cache import PredictionCache
+
+ROW = [1.0, 0.0, 1.0, 150.0, 3.0, 0.9, 0.0]
+
+
+def test_entries_belong_to_one_model_version():
+    cache = PredictionCache()
+    cache.set_version("v1")
+    cache.put_many([ROW], [12.5], "v1")
+
+    assert cache.get_many([ROW], "v1") == [12.5]
+    assert cache.get_many([ROW], "v0") == [None]
+    cache.put_many([ROW], [99.0], "v0")
+    assert cache.get_many([ROW], "v1") == [12.5]
+
+    cache.set_version("v2")
+    assert cache.get_many([ROW], "v2") == [None]
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(maxsize=2)
+    cache.set_version("v1")
+    rows = [ROW[:3] + [float(passengers)] + ROW[4:] for passengers in (100, 150, 200)]
+    cache.put_many(rows[:2], [1.0, 2.0], "v1")
+    cache.get_many([rows[0]], "v1")
+    cache.put_many([rows[2]], [3.0], "v1")
+
+    assert cache.get_many(rows, "v1") == [1.0, None, 3.0]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = PredictionCache(ttl_seconds=-1)
+    cache.set_version("v1")
+    cache.put_many([ROW], [12.5], "v1")
+
+    assert cache.get_many([ROW], "v1") == [None]
+    assert cache.stats()['expirations'] == 1
+
+
+@pytest.fixture
+def predictor(trained_model_dir):
+    predictor = ConsumptionPredictor.load_trained_model(trained_model_dir)
+    predictor.model_version = "test"
+    return predictor
+
+
+def test_predictor_only_sends_misses_to_the_forest(predictor, monkeypatch):
+    tables = predictor.encoding_tables
+    arguments = dict(origin=tables['Origin'].classes[0], flight_type=tables['Flight_Type'].classes[0],
+                     service_type=tables['Service_Type'].classes[0], product_name=tables['Product_Name'].classes[:2],
+                     unit_cost=[0.5, 1.0], has_issues=0)
+    uncached = predictor.predict_consumption_batch(passenger_count=150, **arguments)
+
+    predictor.prediction_cache = PredictionCache()
+    predictor.prediction_cache.set_version("test")
+    forest_rows = []
+    predict_features = predictor._predict_features
+
+    def counting(features):
+        forest_rows.append(len(features))
+        return predict_features(features)
+
+    monkeypatch.setattr(predictor, "_predict_features", counting)
+    first = predictor.predict_consumption_batch(passenger_count=150, **arguments)
+    second = predictor.predict_consumption_batch(passenger_count=150, **arguments)
+
+    assert np.array_equal(first, uncached) and np.array_equal(second, uncached)
+    assert forest_rows == [2]
+    assert predictor.prediction_cache.stats()['hits'] == 2
@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from aidata.consumption_predictor import ConsumptionPredictor
+from aidata.model_registry import ModelRegistry
+from aidata.prediction_grid import GRID_FILENAME, build_grid, canonical_unit_costs
+from aidata.Random_Forest_Regression import AirlineConsumptionPredictor
+from aidata.retrainer import publish
+from aidata.segment_models import SEGMENTS_DIRNAME
+from conftest import DATASET
+
+
+def trained(cache_dir, random_state, segments=False):
+    predictor = AirlineConsumptionPredictor(DATASET)
+    predictor.prepare_features(cache_dir=cache_dir)
+    predictor.model = RandomForestRegressor(n_estimators=5, max_depth=6, random_state=random_state)
+    predictor.model.fit(predictor.df_final[predictor.feature_columns], predictor.df_final[predictor.target_column])
+    predictor._compile_engine()
+    if segments:
+        predictor.train_segment_models(segment_by=('Service_Type',), min_rows=10, n_estimators=3, n_workers=1)
+    return predictor
+
+
+@pytest.fixture
+def segmented_model_dir(tmp_path):
+    """A served model with segment models and a prediction grid built for it"""
+    model_dir = str(tmp_path / "model")
+    assert trained(str(tmp_path / "cache"), random_state=0, segments=True).save_model(model_dir)
+    served = ConsumptionPredictor.load_trained_model(model_dir)
+    assert served.segment_router is not None
+    unit_costs = canonical_unit_costs(pd.read_csv(DATASET), served.encoding_tables['Product_Name'].classes.tolist())
+    build_grid(served, unit_costs, (80, 120), 20).save(os.path.join(model_dir, GRID_FILENAME))
+    return model_dir
+
+
+def test_publish_drops_stale_segments_and_serves_the_rebuilt_grid(segmented_model_dir, tmp_path):
+    candidate = trained(str(tmp_path / "cache"), random_state=1)
+
+    publish(candidate, segmented_model_dir, unit_cost_source=pd.read_csv(DATASET))
+
+    assert not os.path.exists(os.path.join(segmented_model_dir, SEGMENTS_DIRNAME))
+    registry = ModelRegistry(segmented_model_dir, use_prediction_grid=True)
+    assert registry.load()
+    predictor = registry.get_predictor()
+    assert predictor.segment_router is None
+    assert predictor.prediction_grid is not None
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".staging-")] == []
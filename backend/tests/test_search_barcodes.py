@@ -0,0 +1,71 @@
+import pytest
+
+pytest.importorskip("snowflake.connector")
+pytest.importorskip("dotenv")
+pytest.importorskip("sqlalchemy")
+
+import SnowflakeFinal
+from fake_snowflake import ProductTable
+from snowflake_pool import ConnectionPool
+
+ROWS = [
+    ("111", "P1", "Juice 200ml", "L-1", 10, "2099-01-01"),
+    ("222", "P2", "Still Water 500ml", "L-2", 20, "2099-01-01"),
+    ("222", "P2", "Still Water 500ml", "L-3", 5, "2099-06-01"),
+    ("333", "P3", "Pretzels", "L-4", 30, "2099-01-01"),
+]
+
+
+@pytest.fixture
+def table():
+    return ProductTable(ROWS)
+
+
+@pytest.fixture
+def sf(table, monkeypatch):
+    connection = SnowflakeFinal.SnowflakeConnection()
+    connection.pool = ConnectionPool(table.connect, validate=None)
+    monkeypatch.setattr(SnowflakeFinal, "BARCODE_LOOKUP_CHUNK", 2)
+    return connection
+
+
+def test_barcodes_are_looked_up_in_chunks_of_distinct_values(sf, table):
+    result = sf.search_barcodes(["333", "111", "999", "333", "222"])
+
+    assert [params for _, params in table.queries] == [("333", "111"), ("999", "222")]
+    assert [product["barcode"] for product in result["found"]] == ["333", "111", "333", "222"]
+    assert result["not_found"] == ["999"]
+    assert result["summary"] == {"total_searched": 5, "found_count": 4, "not_found_count": 1, "success_rate": 80.0}
+
+
+def test_a_barcode_with_several_lots_keeps_its_first_row(sf):
+    result = sf.search_barcodes("222")
+
+    assert len(result["found"]) == 1
+    assert (result["found"][0]["lot_number"], result["found"][0]["quantity"]) == ("L-2", 20)
+
+
+def test_a_failed_chunk_fails_the_search(sf, table, monkeypatch):
+    calls = []
+
+    def execute_query(sql, fetch=True, params=None, timeout=None):
+        calls.append(params)
+        return None if len(calls) == 2 else []
+
+    monkeypatch.setattr(sf, "execute_query", execute_query)
+
+    assert sf.search_barcodes(["1", "2", "3"]) is None
+
+
+def test_check_barcodes_endpoint(client, simple_main, table, monkeypatch):
+    monkeypatch.setattr(simple_main.sf, "pool", ConnectionPool(table.connect, validate=None))
+    monkeypatch.setattr(simple_main, "MAX_BARCODES_PER_REQUEST", 3)
+
+    response = client.post("/api/check_barcodes", json={"barcodes": [" 111 ", "999"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [match["productName"] for match in body["found"]] == ["Juice 200ml"]
+    assert body["not_found"] == ["999"]
+
+    assert client.post("/api/check_barcodes", json={"barcodes": ["  "]}).status_code == 400
+    assert client.post("/api/check_barcodes", json={"barcodes": ["1", "2", "3", "4"]}).status_code == 400
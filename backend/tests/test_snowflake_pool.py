@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from snowflake_pool import ConnectionPool, PoolClosedError, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def connect(opened):
+    def connect():
+        connection = FakeConnection(len(opened))
+        opened.append(connection)
+        return connection
+    return connect
+
+
+def test_checkout_times_out_when_every_connection_is_busy(connect):
+    pool = ConnectionPool(connect, min_size=0, max_size=1, validate=None)
+    with pool.connection():
+        start = time.perf_counter()
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection(timeout=0.05):
+                pass
+        assert time.perf_counter() - start >= 0.05
+
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['in_use'] == 0
+
+
+def test_waiting_checkout_gets_the_returned_connection(connect, opened):
+    pool = ConnectionPool(connect, min_size=0, max_size=1, validate=None)
+    checked_out = threading.Event()
+
+    def hold_briefly():
+        with pool.connection():
+            checked_out.set()
+            time.sleep(0.05)
+
+    holder = threading.Thread(target=hold_briefly)
+    holder.start()
+    checked_out.wait()
+    with pool.connection(timeout=2) as connection:
+        assert connection is opened[0]
+    holder.join()
+
+    assert (pool.stats()['waits'], pool.stats()['created']) == (1, 1)
+
+
+def test_connection_with_a_session_error_is_discarded(connect, opened):
+    pool = ConnectionPool(connect, min_size=1, max_size=2, validate=None)
+    pool.prefill()
+
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("390114: Authentication token has expired")
+    with pool.connection() as connection:
+        assert connection is opened[1]
+
+    assert opened[0].closed
+    stats = pool.stats()
+    assert (stats['discarded'], stats['created'], stats['size']) == (1, 2, 1)
+
+
+def test_other_errors_return_the_connection(connect, opened):
+    pool = ConnectionPool(connect, min_size=0, max_size=2, validate=None)
+
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("SQL compilation error")
+    with pool.connection() as connection:
+        assert connection is opened[0]
+
+    assert pool.stats()['discarded'] == 0
+
+
+def test_closed_idle_connection_is_replaced_on_checkout(connect, opened):
+    pool = ConnectionPool(connect, min_size=1, max_size=2, validate=None)
+    pool.prefill()
+    opened[0].closed = True
+
+    with pool.connection() as connection:
+        assert connection is opened[1]
+
+    assert pool.stats()['validation_failures'] == 1
+
+
+def test_closed_pool_refuses_checkouts(connect):
+    pool = ConnectionPool(connect, min_size=1, max_size=1, validate=None)
+    pool.prefill()
+    pool.close()
+
+    with pytest.raises(PoolClosedError):
+        with pool.connection():
+            pass